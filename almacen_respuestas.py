@@ -0,0 +1,438 @@
+"""
+Almacén de respuestas de la encuesta.
+
+Las respuestas se agregan a una base SQLite en modo WAL: cada guardado es un
+INSERT de una fila (costo constante, sin releer el historial) y SQLite
+serializa las escrituras concurrentes, tanto entre hilos como entre procesos.
+El Numero de cada usuario es el rowid de la fila, asignado de forma atómica
+dentro de la misma transacción, por lo que no se repite ni deja huecos.
+
+Respuestas.xlsx pasa a ser un archivo de exportación que se genera bajo
+demanda (ver exportar_respuestas.py para CSV, Parquet y filtros):
+
+    python almacen_respuestas.py [Respuestas.xlsx]
+
+Para no bloquear la interfaz, la aplicación no escribe directamente en la
+base: entrega cada envío a EscritorRespuestas, que lo anota en un archivo de
+pendientes (con fsync) y lo guarda en segundo plano junto con los demás
+envíos que se hayan acumulado, en una sola transacción. Cada proceso usa su
+propio archivo de pendientes (respuestas_pendientes.<pid>.jsonl), así
+ninguno vacía lo que otro anotó y aún no guardó; al arrancar, un proceso
+recupera los archivos de los procesos que ya no existen.
+"""
+import glob
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+from metricas import medir, registrar_colector
+
+RUTA_DB = "respuestas.db"
+RUTA_PENDIENTES = "respuestas_pendientes.jsonl"
+ARCHIVO_EXCEL = "Respuestas.xlsx"
+
+# Mismas columnas, y en el mismo orden, que el registro de guardar_datos_usuario_excel.
+# Detalle_Torneos es un JSON {version: [[[planos mostrados], [planos elegidos]], ...]}
+# con cada grupo, final o lista de planos en que se eligió (lo usa analitica_votos.py).
+# Asignacion_Grupos es un JSON {version: {'composicion': 'fija'|'adaptativa', 'grupos':
+# [[planos], ...]}} con los grupos de la primera ronda que recibió el encuestado (ver torneo.py).
+COLUMNAS = [
+    'Timestamp', 'Numero', 'Nombre_completo', 'Profesion', 'Anos_experiencia',
+    'Institucion', 'Correo_electronico', 'Telefono', 'V1', 'V2', 'V3', 'V4', 'V5',
+    'Detalle_Torneos', 'Asignacion_Grupos'
+]
+_COLUMNAS_DATOS = [c for c in COLUMNAS if c != 'Numero']
+
+_SQL_CREAR = f"""
+CREATE TABLE IF NOT EXISTS respuestas (
+    Numero INTEGER PRIMARY KEY,
+    {', '.join(_COLUMNAS_DATOS)}
+)
+"""
+_SQL_CREAR_ENVIOS = """
+CREATE TABLE IF NOT EXISTS envios (
+    clave TEXT PRIMARY KEY,
+    Numero INTEGER NOT NULL
+)
+"""
+_SQL_INSERTAR = (
+    f"INSERT INTO respuestas ({', '.join(_COLUMNAS_DATOS)}) "
+    f"VALUES ({', '.join('?' for _ in _COLUMNAS_DATOS)})"
+)
+
+
+class AlmacenRespuestas:
+    """Registro de respuestas de solo agregado sobre SQLite (una conexión por hilo)"""
+
+    def __init__(self, ruta=RUTA_DB, excel_previo=ARCHIVO_EXCEL):
+        self.ruta = ruta
+        self._local = threading.local()
+        conexion = self._conexion()
+        with conexion:
+            conexion.execute(_SQL_CREAR)
+            conexion.execute(_SQL_CREAR_ENVIOS)
+            # Bases creadas antes de que existieran algunas columnas
+            existentes = {fila[1] for fila in conexion.execute("PRAGMA table_info(respuestas)")}
+            for columna in _COLUMNAS_DATOS:
+                if columna not in existentes:
+                    conexion.execute(f"ALTER TABLE respuestas ADD COLUMN {columna}")
+        if excel_previo and self.contar() == 0 and os.path.exists(excel_previo):
+            self._importar_excel(excel_previo)
+
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=FULL")
+            conexion.row_factory = sqlite3.Row
+            self._local.conexion = conexion
+        return conexion
+
+    def _importar_excel(self, ruta_excel):
+        """Migra al almacén las filas de un Respuestas.xlsx anterior"""
+        import pandas as pd
+        df = pd.read_excel(ruta_excel)
+        if df.empty:
+            return
+        df = df.astype(object).where(df.notna(), None)
+        filas = [[fila.get(c) for c in _COLUMNAS_DATOS] for fila in df.to_dict('records')]
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            if self.contar() == 0:
+                conexion.executemany(_SQL_INSERTAR, filas)
+            conexion.execute("COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
+
+    def agregar(self, registro):
+        """Agrega un registro y devuelve el Numero asignado"""
+        valores = [registro.get(c) for c in _COLUMNAS_DATOS]
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            numero = conexion.execute(_SQL_INSERTAR, valores).lastrowid
+            conexion.execute("COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
+        return numero
+
+    def agregar_lote(self, envios):
+        """
+        Agrega en una sola transacción una lista de (clave, registro).
+
+        La clave de idempotencia evita duplicados: si ya se guardó un envío con
+        esa clave se devuelve su Numero sin volver a insertarlo. Devuelve
+        {clave: Numero}.
+        """
+        conexion = self._conexion()
+        numeros = {}
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            for clave, registro in envios:
+                if clave in numeros:
+                    continue
+                fila = conexion.execute("SELECT Numero FROM envios WHERE clave = ?", (clave,)).fetchone()
+                if fila is None:
+                    valores = [registro.get(c) for c in _COLUMNAS_DATOS]
+                    numero = conexion.execute(_SQL_INSERTAR, valores).lastrowid
+                    conexion.execute("INSERT INTO envios (clave, Numero) VALUES (?, ?)", (clave, numero))
+                else:
+                    numero = fila[0]
+                numeros[clave] = numero
+            conexion.execute("COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
+        return numeros
+
+    def numero_envio(self, clave):
+        """Numero asignado al envío con esa clave, o None si aún no se guardó"""
+        fila = self._conexion().execute("SELECT Numero FROM envios WHERE clave = ?", (clave,)).fetchone()
+        return None if fila is None else fila[0]
+
+    def contar(self):
+        """Cantidad de respuestas guardadas"""
+        return self._conexion().execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+
+    def iterar(self, desde_numero=0, lote=500, desde_fecha=None, hasta_fecha=None):
+        """
+        Recorre las respuestas en orden de Numero, leyendo por lotes.
+        Con desde_fecha/hasta_fecha ("AAAA-MM-DD[ HH:MM:SS]") solo las de
+        Timestamp >= desde_fecha y < hasta_fecha.
+        """
+        conexion = self._conexion()
+        condiciones, parametros = ["Numero > ?"], []
+        if desde_fecha is not None:
+            condiciones.append("Timestamp >= ?")
+            parametros.append(desde_fecha)
+        if hasta_fecha is not None:
+            condiciones.append("Timestamp < ?")
+            parametros.append(hasta_fecha)
+        consulta = (f"SELECT {', '.join(COLUMNAS)} FROM respuestas WHERE {' AND '.join(condiciones)} "
+                    f"ORDER BY Numero LIMIT ?")
+        while True:
+            filas = conexion.execute(consulta, (desde_numero, *parametros, lote)).fetchall()
+            if not filas:
+                return
+            for fila in filas:
+                yield dict(fila)
+            desde_numero = filas[-1]['Numero']
+
+    def exportar_excel(self, ruta=ARCHIVO_EXCEL):
+        """Genera un Excel con todas las respuestas y devuelve la cantidad exportada"""
+        from exportar_respuestas import exportar
+        return exportar(ruta, 'xlsx', almacen=self)
+
+
+def archivo_de_proceso(ruta_pendientes, pid=None):
+    """Archivo de pendientes del proceso `pid` (por defecto, el actual) para la ruta base"""
+    base, extension = os.path.splitext(ruta_pendientes)
+    return f"{base}.{os.getpid() if pid is None else pid}{extension}"
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def archivos_huerfanos(ruta_pendientes):
+    """
+    Archivos de pendientes de la ruta base que no pertenecen a otro proceso
+    vivo: los de procesos terminados (también los que quedaron a medio
+    recuperar), los propios que quedaron a medio recuperar y el archivo común
+    de versiones anteriores
+    """
+    base, extension = os.path.splitext(ruta_pendientes)
+    huerfanos = [ruta_pendientes] if os.path.exists(ruta_pendientes) else []
+    for ruta in glob.glob(f"{glob.escape(base)}.*{extension}*"):
+        pid, _, resto = ruta[len(base) + 1:].partition('.')
+        propio = pid == str(os.getpid())
+        if not pid.isdigit() or (propio and resto == extension.lstrip('.')):
+            continue
+        if resto == extension.lstrip('.') or resto.endswith('.recuperado'):
+            if propio or not _proceso_vivo(int(pid)):
+                huerfanos.append(ruta)
+    return huerfanos
+
+
+class EscritorRespuestas:
+    """
+    Cola de escritura en segundo plano para los envíos finales.
+
+    `encolar` anota el envío en el archivo de pendientes del proceso (ver
+    archivo_de_proceso, con fsync) y vuelve de inmediato: desde ese momento el
+    envío sobrevive a un reinicio, porque al arrancar se reencolan los
+    pendientes que no estén en la base, tanto los propios como los de procesos
+    que ya terminaron. Un único hilo por proceso vacía la cola por lotes y
+    reintenta con espera creciente si la base falla.
+    """
+
+    def __init__(self, almacen, ruta_pendientes=RUTA_PENDIENTES, lote_maximo=200):
+        self.almacen = almacen
+        self.ruta_base = ruta_pendientes
+        self.ruta_pendientes = archivo_de_proceso(ruta_pendientes)
+        self.lote_maximo = lote_maximo
+        self._cola = queue.Queue()
+        self._lock = threading.Lock()
+        self._pendientes = {}  # {clave: registro} aún no confirmados en la base
+        self._guardados = {}   # {clave: Numero} confirmados por este proceso
+        self.lotes = 0
+        self.reintentos = 0
+        self.ultimo_flush_ms = None
+        self._flush_ms_total = 0.0
+        self.ultimo_error = None
+
+        self._recuperar_pendientes()
+        self._hilo = threading.Thread(target=self._bucle, name="escritor-respuestas", daemon=True)
+        self._hilo.start()
+
+    def _recuperar_pendientes(self):
+        lineas = []
+        for ruta in [self.ruta_pendientes] + archivos_huerfanos(self.ruta_base):
+            if ruta != self.ruta_pendientes:
+                # Se toma el archivo con un rename: si dos procesos arrancan a la vez, solo uno lo recupera
+                tomado = f"{self.ruta_pendientes}.{time.time_ns()}.recuperado"
+                try:
+                    os.replace(ruta, tomado)
+                except OSError:
+                    continue
+                ruta = tomado
+            try:
+                with open(ruta, encoding='utf-8') as f:
+                    lineas.extend(f.readlines())
+            except OSError:
+                continue
+        tomados = [r for r in archivos_huerfanos(self.ruta_base) if r.startswith(self.ruta_pendientes + '.')]
+        recuperadas = []
+        for linea in lineas:
+            try:
+                envio = json.loads(linea)
+            except ValueError:
+                continue  # Línea incompleta de un cierre abrupto
+            clave = envio['clave']
+            if clave not in self._pendientes and self.almacen.numero_envio(clave) is None:
+                self._pendientes[clave] = envio['registro']
+                recuperadas.append(linea if linea.endswith("\n") else linea + "\n")
+                self._cola.put(clave)
+
+        # Los recuperados pasan al archivo propio antes de borrar los tomados
+        temporal = f"{self.ruta_pendientes}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.writelines(recuperadas)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.ruta_pendientes)
+        for tomado in tomados:
+            os.remove(tomado)
+
+    def encolar(self, clave, registro):
+        """
+        Registra un envío de forma duradera y devuelve su estado.
+
+        Si la clave ya se encoló o guardó, no se vuelve a escribir.
+        """
+        with self._lock:
+            if clave in self._pendientes:
+                return {'estado': 'pendiente', 'numero': None}
+            numero = self._guardados.get(clave)
+            if numero is None:
+                numero = self.almacen.numero_envio(clave)
+            if numero is not None:
+                return {'estado': 'guardado', 'numero': numero}
+
+            linea = json.dumps({'clave': clave, 'registro': registro}, ensure_ascii=False, default=str)
+            with open(self.ruta_pendientes, 'a', encoding='utf-8') as f:
+                f.write(linea + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._pendientes[clave] = registro
+        self._cola.put(clave)
+        return {'estado': 'pendiente', 'numero': None}
+
+    def estado_envio(self, clave):
+        """Estado de un envío: 'pendiente', 'guardado' (con Numero) o 'desconocido'"""
+        with self._lock:
+            if clave in self._pendientes:
+                return {'estado': 'pendiente', 'numero': None}
+            numero = self._guardados.get(clave)
+        if numero is None:
+            numero = self.almacen.numero_envio(clave)
+        if numero is None:
+            return {'estado': 'desconocido', 'numero': None}
+        return {'estado': 'guardado', 'numero': numero}
+
+    def estado(self):
+        """Profundidad de la cola y latencias de vaciado"""
+        with self._lock:
+            return {
+                'en_cola': len(self._pendientes),
+                'lotes': self.lotes,
+                'reintentos': self.reintentos,
+                'ultimo_flush_ms': self.ultimo_flush_ms,
+                'flush_ms_promedio': self._flush_ms_total / self.lotes if self.lotes else None,
+                'ultimo_error': self.ultimo_error
+            }
+
+    def esperar(self, timeout=None):
+        """Espera a que la cola quede vacía; devuelve True si lo logró"""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._pendientes:
+                    return True
+            if limite is not None and time.monotonic() >= limite:
+                return False
+            time.sleep(0.01)
+
+    def _bucle(self):
+        while True:
+            claves = [self._cola.get()]
+            while len(claves) < self.lote_maximo:
+                try:
+                    claves.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            with self._lock:
+                lote = [(c, self._pendientes[c]) for c in dict.fromkeys(claves) if c in self._pendientes]
+            if lote:
+                self._guardar_lote(lote)
+
+    def _guardar_lote(self, lote):
+        espera = 0.1
+        while True:
+            inicio = time.perf_counter()
+            try:
+                with medir("guardar_lote_respuestas", "Transacción que guarda un lote de envíos en la base"):
+                    numeros = self.almacen.agregar_lote(lote)
+                break
+            except Exception as e:
+                with self._lock:
+                    self.reintentos += 1
+                    self.ultimo_error = str(e)
+                time.sleep(espera)
+                espera = min(espera * 2, 30)
+
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+        with self._lock:
+            for clave, numero in numeros.items():
+                self._pendientes.pop(clave, None)
+                self._guardados[clave] = numero
+            self.lotes += 1
+            self.ultimo_flush_ms = duracion_ms
+            self._flush_ms_total += duracion_ms
+            self.ultimo_error = None
+            if not self._pendientes:
+                # Todo lo que anotó este proceso ya está en la base: se puede vaciar su archivo
+                open(self.ruta_pendientes, 'w').close()
+
+
+_lock = threading.Lock()
+_almacenes = {}
+_escritores = {}
+
+
+def obtener_almacen(ruta=RUTA_DB):
+    """Almacén compartido por todo el proceso para `ruta`"""
+    clave = os.path.abspath(ruta)
+    almacen = _almacenes.get(clave)
+    if almacen is None:
+        with _lock:
+            almacen = _almacenes.get(clave)
+            if almacen is None:
+                almacen = AlmacenRespuestas(ruta)
+                _almacenes[clave] = almacen
+    return almacen
+
+
+def obtener_escritor(ruta=RUTA_DB, ruta_pendientes=RUTA_PENDIENTES):
+    """Escritor en segundo plano compartido por todo el proceso para `ruta`"""
+    clave = os.path.abspath(ruta)
+    escritor = _escritores.get(clave)
+    if escritor is None:
+        almacen = obtener_almacen(ruta)
+        with _lock:
+            escritor = _escritores.get(clave)
+            if escritor is None:
+                escritor = EscritorRespuestas(almacen, ruta_pendientes)
+                _escritores[clave] = escritor
+                registrar_colector("escritor_respuestas", escritor.estado)
+    return escritor
+
+
+if __name__ == "__main__":
+    destino = sys.argv[1] if len(sys.argv) > 1 else ARCHIVO_EXCEL
+    total = obtener_almacen().exportar_excel(destino)
+    print(f"{total} respuestas exportadas a {destino}")
@@ -0,0 +1,290 @@
+"""
+Analítica incremental de las preferencias de los encuestados.
+
+Cada respuesta guarda en Detalle_Torneos qué planos se mostraron juntos y
+cuáles se eligieron (cada grupo, la final y la lista de las versiones sin
+torneo). Elegir un plano en un grupo de 4 equivale a tres comparaciones
+ganadas, así que de cada respuesta salen muchas comparaciones por pares.
+
+AnaliticaVotos lee del almacén solo las respuestas con Numero mayor que la
+última procesada y acumula por versión:
+
+- veces que cada plano fue el ganador de la versión (columna V1-V5);
+- veces que fue elegido y veces que se mostró (tasa de victoria en grupos);
+- comparaciones ganadas por cada par de planos.
+
+Con los pares se ajusta un modelo de Bradley-Terry (algoritmo MM) que solo
+se recalcula cuando llegan respuestas nuevas. El agregado se guarda en
+analitica_votos.json, de modo que al reiniciar no se relee todo el historial.
+
+El agregado que entrega obtener_analitica se actualiza en un hilo en segundo
+plano cada INTERVALO_ACTUALIZACION segundos; las peticiones solo leen la
+última instantánea publicada (estadisticas) y nunca consultan la base.
+
+    python analitica_votos.py   # actualiza el agregado e imprime el ranking
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from almacen_respuestas import obtener_almacen
+
+RUTA_AGREGADO = "analitica_votos.json"
+VERSIONES = ['v1', 'v2', 'v3', 'v4', 'v5']
+# Victorias y derrotas ficticias de cada plano contra un rival de fuerza 1:
+# evita fuerzas nulas o infinitas con pocos datos
+PREVIA_BT = 0.5
+ITERACIONES_BT = 500
+TOLERANCIA_BT = 1e-8
+INTERVALO_ACTUALIZACION = 5
+
+
+def bradley_terry(pares, planos, inicial=None, previa=PREVIA_BT):
+    """
+    Fuerzas de Bradley-Terry {plano: fuerza} a partir de {(ganador, perdedor): veces}.
+
+    La probabilidad de que i gane a j es f_i / (f_i + f_j). Las fuerzas se
+    devuelven normalizadas para sumar 1.
+    """
+    if not planos:
+        return {}
+    indice = {p: i for i, p in enumerate(planos)}
+    n = len(planos)
+    victorias = np.zeros((n, n))
+    for (ganador, perdedor), veces in pares.items():
+        if ganador in indice and perdedor in indice:
+            victorias[indice[ganador], indice[perdedor]] += veces
+    comparaciones = victorias + victorias.T
+    ganadas = victorias.sum(axis=1) + previa
+
+    fuerza = np.ones(n)
+    if inicial:
+        fuerza = np.array([inicial.get(p, 1.0) for p in planos], dtype=float)
+        fuerza = fuerza / np.exp(np.log(fuerza).mean())
+    for _ in range(ITERACIONES_BT):
+        denominador = (comparaciones / (fuerza[:, None] + fuerza[None, :])).sum(axis=1) + 2 * previa / (fuerza + 1)
+        nueva = ganadas / denominador
+        cambio = np.max(np.abs(np.log(nueva) - np.log(fuerza)))
+        fuerza = nueva
+        if cambio < TOLERANCIA_BT:
+            break
+    fuerza = fuerza / fuerza.sum()
+    return {p: float(f) for p, f in zip(planos, fuerza)}
+
+
+class AgregadoVersion:
+    """Conteos acumulados de una versión"""
+
+    def __init__(self):
+        self.ganadores = Counter()
+        self.elecciones = Counter()
+        self.apariciones = Counter()
+        self.pares = Counter()  # {(ganador, perdedor): veces}
+        self.fuerzas = {}
+        self._fuerzas_vigentes = True
+
+    def registrar_ganador(self, plano):
+        self.ganadores[plano] += 1
+
+    def registrar_enfrentamiento(self, mostrados, elegidos):
+        for plano in mostrados:
+            self.apariciones[plano] += 1
+        for ganador in elegidos:
+            self.elecciones[ganador] += 1
+            for perdedor in mostrados:
+                if perdedor not in elegidos:
+                    self.pares[(ganador, perdedor)] += 1
+        self._fuerzas_vigentes = False
+
+    def actualizar_fuerzas(self):
+        if not self._fuerzas_vigentes:
+            planos = sorted(set(self.apariciones) | set(self.ganadores), key=str)
+            self.fuerzas = bradley_terry(self.pares, planos, self.fuerzas)
+            self._fuerzas_vigentes = True
+        return self.fuerzas
+
+    def filas(self):
+        """Una fila por plano, ordenadas por fuerza de Bradley-Terry"""
+        fuerzas = self.actualizar_fuerzas()
+        planos = set(self.apariciones) | set(self.ganadores)
+        filas = [{
+            'Plano_ID': plano,
+            'Ganador': self.ganadores[plano],
+            'Elegido': self.elecciones[plano],
+            'Mostrado': self.apariciones[plano],
+            'Tasa_Victoria': self.elecciones[plano] / self.apariciones[plano] if self.apariciones[plano] else None,
+            'Fuerza_BT': fuerzas.get(plano)
+        } for plano in planos]
+        filas.sort(key=lambda f: (-(f['Fuerza_BT'] or 0), -f['Ganador'], str(f['Plano_ID'])))
+        return filas
+
+    def a_dict(self):
+        return {
+            'ganadores': [[p, n] for p, n in self.ganadores.items()],
+            'elecciones': [[p, n] for p, n in self.elecciones.items()],
+            'apariciones': [[p, n] for p, n in self.apariciones.items()],
+            'pares': [[g, p, n] for (g, p), n in self.pares.items()],
+            'fuerzas': [[p, f] for p, f in self.fuerzas.items()]
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        agregado = cls()
+        agregado.ganadores.update({p: n for p, n in datos['ganadores']})
+        agregado.elecciones.update({p: n for p, n in datos['elecciones']})
+        agregado.apariciones.update({p: n for p, n in datos['apariciones']})
+        agregado.pares.update({(g, p): n for g, p, n in datos['pares']})
+        agregado.fuerzas = {p: f for p, f in datos.get('fuerzas', [])}
+        agregado._fuerzas_vigentes = 'fuerzas' in datos
+        return agregado
+
+
+class AnaliticaVotos:
+    """Agregado de preferencias que se actualiza con las respuestas nuevas del almacén"""
+
+    def __init__(self, almacen, ruta=RUTA_AGREGADO):
+        self.almacen = almacen
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._ultima_actualizacion = 0.0
+        self.ultimo_numero = 0
+        self.versiones = {}
+        self._instantaneas = {}  # {version: estadisticas}, se reemplaza entera al actualizar
+        self._hilo = None
+        self._cargar()
+        self._publicar()
+
+    def _cargar(self):
+        try:
+            with open(self.ruta, encoding='utf-8') as f:
+                datos = json.load(f)
+            self.ultimo_numero = datos['ultimo_numero']
+            self.versiones = {v: AgregadoVersion.desde_dict(d) for v, d in datos['versiones'].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            self.ultimo_numero, self.versiones = 0, {}
+
+    def _guardar(self):
+        temporal = f"{self.ruta}.{os.getpid()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({'ultimo_numero': self.ultimo_numero,
+                       'versiones': {v: a.a_dict() for v, a in self.versiones.items()}}, f)
+        os.replace(temporal, self.ruta)
+
+    def _publicar(self):
+        """Copia de los conteos de cada versión para leer sin tomar el lock"""
+        self._instantaneas = {
+            version: {'apariciones': dict(agregado.apariciones), 'pares': dict(agregado.pares),
+                      'fuerzas': dict(agregado.actualizar_fuerzas())}
+            for version, agregado in self.versiones.items()
+        }
+
+    def _version(self, version):
+        if version not in self.versiones:
+            self.versiones[version] = AgregadoVersion()
+        return self.versiones[version]
+
+    def procesar(self, fila):
+        """Incorpora una respuesta (diccionario con las columnas del almacén)"""
+        for version in VERSIONES:
+            ganador = fila.get(version.upper())
+            if ganador not in (None, '', 'No seleccionado'):
+                self._version(version).registrar_ganador(ganador)
+        try:
+            detalle = json.loads(fila.get('Detalle_Torneos') or '{}')
+        except (TypeError, ValueError):
+            detalle = {}
+        for version, enfrentamientos in detalle.items():
+            for mostrados, elegidos in enfrentamientos:
+                self._version(version).registrar_enfrentamiento(mostrados, elegidos)
+
+    def actualizar(self, forzar=False):
+        """
+        Procesa las respuestas nuevas del almacén; devuelve cuántas. Sin
+        `forzar`, no consulta la base más de una vez cada INTERVALO_ACTUALIZACION s.
+        """
+        with self._lock:
+            if not forzar and time.monotonic() - self._ultima_actualizacion < INTERVALO_ACTUALIZACION:
+                return 0
+            self._ultima_actualizacion = time.monotonic()
+            reiniciada = self.almacen.contar() < self.ultimo_numero
+            if reiniciada:
+                # La base se reemplazó: se recalcula desde cero
+                self.ultimo_numero, self.versiones = 0, {}
+            nuevas = 0
+            for fila in self.almacen.iterar(desde_numero=self.ultimo_numero):
+                self.procesar(fila)
+                self.ultimo_numero = fila['Numero']
+                nuevas += 1
+            if nuevas or reiniciada:
+                self._publicar()  # Ajusta las fuerzas, que también se guardan
+            if nuevas:
+                self._guardar()
+            return nuevas
+
+    def _actualizar_periodicamente(self):
+        while True:
+            try:
+                self.actualizar(forzar=True)
+            except Exception:
+                pass  # Base ocupada o no disponible: se sigue con la última instantánea
+            time.sleep(INTERVALO_ACTUALIZACION)
+
+    def iniciar_actualizacion(self):
+        """Lanza (una sola vez) el hilo que actualiza el agregado en segundo plano"""
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._actualizar_periodicamente,
+                                              name="actualizar-analitica", daemon=True)
+                self._hilo.start()
+
+    def resultados(self, version):
+        """Filas del ranking de una versión (ver AgregadoVersion.filas)"""
+        with self._lock:
+            agregado = self.versiones.get(version)
+            return agregado.filas() if agregado else []
+
+    def estadisticas(self, version):
+        """
+        Conteos de una versión en la última actualización, para componer grupos
+        ({'apariciones', 'pares', 'fuerzas'}; ver torneo.componer_grupos). No
+        toma el lock ni consulta la base; el diccionario es compartido y no
+        debe modificarse.
+        """
+        return self._instantaneas.get(version, {})
+
+    def total_respuestas(self):
+        return self.ultimo_numero
+
+
+_lock = threading.Lock()
+_analiticas = {}
+
+
+def obtener_analitica(ruta=RUTA_AGREGADO):
+    """Agregado compartido por todo el proceso para `ruta`, actualizado en segundo plano"""
+    clave = os.path.abspath(ruta)
+    analitica = _analiticas.get(clave)
+    if analitica is None:
+        with _lock:
+            analitica = _analiticas.get(clave)
+            if analitica is None:
+                analitica = AnaliticaVotos(obtener_almacen(), ruta)
+                analitica.iniciar_actualizacion()
+                _analiticas[clave] = analitica
+    return analitica
+
+
+if __name__ == "__main__":
+    analitica = obtener_analitica()
+    nuevas = analitica.actualizar(forzar=True)
+    print(f"{nuevas} respuestas nuevas procesadas ({analitica.total_respuestas()} en total)")
+    for version in sorted(analitica.versiones):
+        print(f"\n{version.upper()}")
+        for fila in analitica.resultados(version):
+            tasa = "-" if fila['Tasa_Victoria'] is None else f"{fila['Tasa_Victoria']:.0%}"
+            print(f"  Plano {fila['Plano_ID']!s:>4}  fuerza {fila['Fuerza_BT']:.3f}  "
+                  f"ganador {fila['Ganador']:>3}  elegido {fila['Elegido']:>3}/{fila['Mostrado']:<3} ({tasa})")
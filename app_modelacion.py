@@ -1,31 +1,104 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.patches import Polygon
+from streamlit.errors import StreamlitAPIException
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import hmac
 import json
-import numpy as np
 import os
+import uuid
 from datetime import datetime
+from almacen_respuestas import obtener_escritor
+from exportar_respuestas import FORMATOS as FORMATOS_EXPORTACION, VERSIONES as VERSIONES_EXPORTACION, ExportacionTemporal
+import metricas
+from metricas import contar, medir
+from plano_vectorial import mostrar_plano_vectorial
+import precarga
+from progreso_sesiones import obtener_progreso
+from render_planos import AJUSTES_MINIATURA, descartar_planos, imagen_plano, prefetch_render
+from sesiones import registro_sesiones
+from torneo import CONFIG_TORNEOS, Torneo, nuevo_estado
 
 # IMPORTANTE: st.set_page_config debe estar al inicio
 st.set_page_config(page_title="Visualizador de Planos", layout="wide")
 
+# Claves de st.session_state que se anotan en el registro de progreso (además de cada torneo)
+CLAVES_PROGRESO = ('pagina', 'datos_usuario', 'planos_seleccionados', 'firma_catalogo', 'clave_envio',
+                   'version_actual', 'paginas_grilla')
+
+def estado_progreso():
+    """Parte del estado de la sesión que permite retomarla, como {clave: valor}"""
+    estado = {clave: st.session_state[clave] for clave in CLAVES_PROGRESO if clave in st.session_state}
+    for version, torneo in st.session_state.get('torneos', {}).items():
+        estado[f"torneos/{version}"] = torneo
+    return estado
+
+def guardar_progreso():
+    """Anota en el registro de progreso solo las claves que cambiaron desde la última vez"""
+    if st.session_state.get('evaluacion_finalizada'):
+        return  # Su progreso ya se borró al entregar las respuestas
+    actual = {clave: json.dumps(valor, sort_keys=True, default=str) for clave, valor in estado_progreso().items()}
+    previo = st.session_state.get('progreso_guardado', {})
+    cambios = {clave: json.loads(valor) for clave, valor in actual.items() if previo.get(clave) != valor}
+    cambios.update({clave: None for clave in previo if clave not in actual})
+    if not cambios:
+        return
+    try:
+        obtener_progreso().guardar(st.session_state.id_sesion, cambios)
+    except Exception:
+        return  # El progreso es una ayuda: si falla, la encuesta sigue
+    st.session_state.progreso_guardado = actual
+
+def restaurar_progreso(token):
+    """Reconstruye la sesión `token` desde el registro de progreso; devuelve True si existía"""
+    try:
+        estado = obtener_progreso().cargar(token)
+    except Exception:
+        return False
+    if not estado:
+        return False
+    if estado.get('clave_envio') and obtener_escritor().estado_envio(estado['clave_envio'])['estado'] != 'desconocido':
+        # La evaluación ya se entregó: la URL no la retoma (ni permite reenviarla)
+        obtener_progreso().borrar(token)
+        return False
+    st.session_state.torneos = {}
+    for clave, valor in estado.items():
+        if clave.startswith("torneos/"):
+            st.session_state.torneos[clave.split("/", 1)[1]] = valor
+        else:
+            st.session_state[clave] = valor
+    st.session_state.id_sesion = token
+    st.session_state.progreso_guardado = {clave: json.dumps(valor, sort_keys=True, default=str)
+                                          for clave, valor in estado.items()}
+    return True
+
+# El token de la sesión va en la URL (?sesion=...): al reconectarse se retoma el progreso
+if 'id_sesion' not in st.session_state:
+    token = st.query_params.get("sesion", "")
+    if not (len(token) == 32 and token.isalnum() and restaurar_progreso(token)):
+        st.session_state.id_sesion = uuid.uuid4().hex
+    st.query_params["sesion"] = st.session_state.id_sesion
+
 if 'pagina' not in st.session_state:
     st.session_state.pagina = 'bienvenida'
 if 'planos_seleccionados' not in st.session_state:
     st.session_state.planos_seleccionados = {}
-if 'v3_grupo_actual' not in st.session_state:
-    st.session_state.v3_grupo_actual = 1  # Grupo 1, 2, 3, o 4 (final)
-if 'v3_seleccionados_por_grupo' not in st.session_state:
-    st.session_state.v3_seleccionados_por_grupo = {}  # {grupo: plano_id}
-if 'v4_grupo_actual' not in st.session_state:
-    st.session_state.v4_grupo_actual = 1  # Grupo 1, 2, 3, o 4 (final)
-if 'v4_seleccionados_por_grupo' not in st.session_state:
-    st.session_state.v4_seleccionados_por_grupo = {}  # {grupo: plano_id}
-if 'v5_grupo_actual' not in st.session_state:
-    st.session_state.v5_grupo_actual = 1  # Grupo 1, 2, 3, 4, 5, 6, o 7 (final)
-if 'v5_seleccionados_por_grupo' not in st.session_state:
-    st.session_state.v5_seleccionados_por_grupo = {}  # {grupo: plano_id}
+if 'torneos' not in st.session_state:
+    st.session_state.torneos = {}  # {version: estado del torneo por grupos (ver torneo.py)}
+if 'paginas_grilla' not in st.session_state:
+    st.session_state.paginas_grilla = {}  # {version: página de la grilla de versiones sin torneo}
+
+# El estado de la sesión guarda solo IDs de planos; los datos se leen del catálogo compartido.
+# Se anota la actividad para que el proceso pueda desalojar las sesiones inactivas
+# (las que ya entregaron sus respuestas dejan de contar, ver finalizar_evaluacion).
+if not st.session_state.get('evaluacion_finalizada'):
+    _contexto = get_script_run_ctx()
+    registro_sesiones.tocar(st.session_state.id_sesion, st.session_state,
+                            _contexto.session_id if _contexto else None)
+
+# Archivo de métricas para Prometheus (solo si se definió MODELACION_METRICAS_ARCHIVO)
+metricas.iniciar_exportacion()
+
+# Lo que cambió en el rerun anterior (p. ej. tras st.rerun) queda anotado antes de dibujar
+guardar_progreso()
 
 def mostrar_bienvenida():
     st.markdown("""<div style='text-align: center; padding: 2rem 0;'>
@@ -62,6 +135,8 @@ def mostrar_bienvenida():
                 st.rerun()
             else:
                 st.error("Por favor, complete todos los campos requeridos.")
+    # Con el formulario ya enviado al navegador, el visualizador se prepara mientras se completa
+    precarga.iniciar(EXCEL_PATH)
 
 def mostrar_info_usuario():
     """Mostrar información del usuario en la parte superior"""
@@ -81,10 +156,24 @@ def mostrar_info_usuario():
 
 EXCEL_PATH = "planos_ploteo.xlsx"
 
+# "imagen": PNG rasterizado en el servidor (con caché)
+# "vectorial": geometría en JSON dibujada por el navegador (componente_plano/)
+MODO_RENDER = "imagen"
+
+# Planos por página en las versiones sin torneo: cada rerun dibuja a lo sumo
+# una página, sin importar cuántos planos tenga la versión
+PLANOS_POR_PAGINA = 12
+
+@medir("cargar_datos_excel", "Obtención del catálogo en cada rerun")
 def cargar_datos_excel():
+    """Devuelve el catálogo de planos compartido (la generación que ve la sesión)"""
     if os.path.exists(EXCEL_PATH):
         try:
-            return pd.read_excel(EXCEL_PATH)
+            # pandas y el catálogo se importan aquí: la página de bienvenida no los necesita
+            from catalogo_planos import al_descartar_planos, obtener_catalogo
+            al_descartar_planos("render", descartar_planos)
+            # La sesión sigue con la generación del catálogo con la que empezó mientras se conserve
+            return obtener_catalogo(EXCEL_PATH, st.session_state.get('firma_catalogo'))
         except Exception as e:
             st.error(f"Error al leer el archivo {EXCEL_PATH}: {e}")
             return None
@@ -92,249 +181,175 @@ def cargar_datos_excel():
         st.error(f"No se encontró el archivo {EXCEL_PATH}. Asegúrate de que esté en el mismo directorio que la aplicación.")
         return None
 
+@medir("buscar_plano", "Búsqueda de un plano en el catálogo")
+def buscar_plano(catalogo, version, plano_id):
+    """Datos de un plano del catálogo, o None si no existe"""
+    return catalogo.obtener(version, plano_id)
+
 def get_safe(data, key, default="N/A"):
     """Función helper para obtener datos de forma segura"""
     try:
-        if key in data and pd.notna(data[key]):
+        # valor == valor descarta NaN
+        if key in data and data[key] is not None and data[key] == data[key]:
             return f"{data[key]:.2f} m"
         return default
     except:
         return default
 
-def visualizar_plano(datos_plano, titulo, version):
+@medir("visualizar_plano", "Muestra de un plano en su tarjeta (imagen o dibujo vectorial)")
+def mostrar_imagen_plano(datos_plano, version, miniatura=False):
     """
-    Visualiza un plano a partir de sus datos, con dimensiones específicas según la versión
+    Muestra el plano según MODO_RENDER: imagen desde la caché de renders o dibujo en el navegador.
+    Con `miniatura` (grillas) se usa la imagen de poco detalle y un botón abre el plano completo.
     """
-    try:
-        # Establecer dimensiones según la versión
-        if version == "v1":
-            largo_casa = 2.440 * 2
-            ancho_casa = 2.440 * 3
-        elif version == "v2":
-            largo_casa = 2 * 2.440
-            ancho_casa = 4 * 2.440
-        elif version == "v3":
-            largo_casa = 2.440 * 2
-            ancho_casa = 2.440 * 6
-        elif version == "v4":
-            largo_casa = 2.440 * 3
-            ancho_casa = 2.440 * 6
-        elif version == "v5":
-            largo_casa = 2.440 * 4
-            ancho_casa = 2.440 * 6
-        else:
-            # Si no coincide con ninguna versión conocida, usar valores del Excel o valores por defecto
-            ancho_casa = datos_plano.get('Ancho_Casa', datos_plano.get('ancho_casa', 7.32))
-            largo_casa = datos_plano.get('Largo_Casa', datos_plano.get('largo_casa', 4.88))
-        
-        # Extraer información de habitaciones (como JSON)
-        habitaciones_json = datos_plano.get('Datos_Habitaciones', '[]')
-        habitaciones = json.loads(habitaciones_json)
-        
-        # Crear figura con tamaño reducido
-        fig, ax = plt.subplots(figsize=(5, 4))  # Tamaño más reducido para v3/v4/v5 con más columnas
-        
-        # Colores para diferentes tipos de habitaciones
-        colores = {
-            'Baño': 'lightblue',
-            'Dor': 'lightgreen',
-            'Cocina - Comedor': 'lightyellow',
-            'Estar': 'lightyellow',
-            'Recibidor': 'lightyellow',
-            'Cocina': 'lightyellow',
-            'Comedor': 'lightyellow'
-        }
-        
-        # Añadir cada habitación al plano
-        for hab in habitaciones:
-            nombre = hab.get('Nombre', 'Sin nombre')
-            tipo = hab.get('Tipo_Funcional', 'Desconocido')
-            vertices = hab.get('Vertices', [])
-            
-            # Si no hay vértices, continuar al siguiente
-            if not vertices:
-                continue
-                
-            # Obtener color según el tipo funcional o usar un color por defecto
-            color = colores.get(tipo, 'lightgray')
-            
-            # Crear polígono para la habitación
-            poligono = Polygon(vertices, closed=True, fill=True, facecolor=color, 
-                              edgecolor='black', linewidth=1.5, alpha=0.7)
-            ax.add_patch(poligono)
-            
-            # Calcular centro para el texto
-            vertices_array = np.array(vertices)
-            cx = np.mean(vertices_array[:, 0])
-            cy = np.mean(vertices_array[:, 1])
-            
-            # Añadir etiqueta con nombre y tipo (fuente más pequeña)
-            # Ajustar tamaño de fuente según la versión
-            font_size = 6 if version in ["v3", "v4", "v5"] else 8
-            ax.text(cx, cy, f"{nombre}\n{tipo}", ha='center', va='center', 
-                   fontsize=font_size, fontweight='bold')
-
-        # Configurar límites y aspecto
-        if version == "v1":
-            ax.set_xlim(0, largo_casa)
-            ax.set_ylim(0, ancho_casa)
-        elif version == "v2":
-            ax.set_xlim(0, largo_casa)
-            ax.set_ylim(0, ancho_casa)
-        elif version == "v3":
-            ax.set_xlim(0, largo_casa)
-            ax.set_ylim(0, ancho_casa)
-        elif version == "v4":
-            ax.set_xlim(-2.440, 2.440*2)
-            ax.set_ylim(0, ancho_casa)
-        elif version == "v5":
-            ax.set_xlim(-2.440*2, 2.440*2)
-            ax.set_ylim(0, ancho_casa)
-       
-        ax.set_aspect('equal')
-        ax.set_xlabel('Largo (m)', fontsize=8)
-        ax.set_ylabel('Ancho (m)', fontsize=8)
-        ax.grid(True, linestyle='--', alpha=0.5)
-        plt.tight_layout()
-        
-        return fig
-    except Exception as e:
-        st.error(f"Error al visualizar el plano: {e}")
+    if MODO_RENDER == "vectorial":
+        try:
+            with medir("emitir_plano_vectorial", "Envío de un plano al componente vectorial"):
+                mostrar_plano_vectorial(datos_plano, version,
+                                        key=f"vec_{version}_{datos_plano.get('Plano_ID')}_{'m' if miniatura else 'c'}")
+        except Exception as e:
+            st.error(f"Error al visualizar el plano: {e}")
+            return
+    else:
+        try:
+            with medir("imagen_plano", "Obtención de la imagen de un plano (caché o rasterización)"):
+                imagen = imagen_plano(datos_plano, version, AJUSTES_MINIATURA if miniatura else None)
+        except Exception as e:
+            st.error(f"Error al visualizar el plano: {e}")
+            return
+        with medir("emitir_imagen", "Envío de la imagen de un plano al navegador"):
+            st.image(imagen, use_container_width=True)
+        contar("bytes_imagen_emitidos", len(imagen), "Bytes de imágenes de planos enviados")
+    mostrar_areas_plano(datos_plano)
+    if miniatura and st.button("🔍 Ver detalle", key=f"detalle_{version}_{datos_plano.get('Plano_ID')}"):
+        ver_detalle_plano(datos_plano, version)
+
+@st.dialog("Plano en detalle", width="large")
+def ver_detalle_plano(datos_plano, version):
+    """Plano completo (etiquetas, ejes y alta resolución), que solo se dibuja al pedirlo"""
+    st.write(f"### Plano {datos_plano.get('Plano_ID')} ({version.upper()})")
+    mostrar_imagen_plano(datos_plano, version)
+
+def mostrar_areas_plano(datos_plano):
+    """Muestra el área total del plano y su reparto por tipo (precalculados por el catálogo)"""
+    area_total = datos_plano.get('Area_Total')
+    if not area_total:
+        return
+    por_tipo = " · ".join(f"{tipo} {area:.1f}" for tipo, area in datos_plano.get('Areas_Por_Tipo', {}).items())
+    st.caption(f"Área: {area_total:.2f} m²" + (f" ({por_tipo})" if por_tipo else ""))
+
+def obtener_torneo(catalogo, version):
+    """Torneo por grupos de la versión y su estado en la sesión (se crea la primera vez)"""
+    torneo = Torneo(catalogo.planos_ids(version), CONFIG_TORNEOS.get(version))
+    if version not in st.session_state.torneos:
+        st.session_state.torneos[version] = torneo.iniciar(nuevo_estado(), estadisticas_votos(torneo, version))
+    return torneo, st.session_state.torneos[version]
+
+def estadisticas_votos(torneo, version):
+    """Conteos acumulados de la versión para la composición adaptativa de grupos (None si no aplica)"""
+    if torneo.config['composicion'] != 'adaptativa':
         return None
+    try:
+        from analitica_votos import obtener_analitica
+        # Solo la instantánea: el agregado se actualiza en su propio hilo
+        return obtener_analitica().estadisticas(version)
+    except Exception:
+        return None  # Sin estadísticas los grupos se arman al azar
 
-def seleccionar_plano_v3(plano_id, datos_plano, grupo):
-    """Función especial para manejar la selección de planos v3 con sistema de grupos"""
-    if grupo <= 3:  # Grupos 1, 2, 3
-        st.session_state.v3_seleccionados_por_grupo[grupo] = {
-            'plano_id': plano_id,
-            'datos': datos_plano
-        }
-        st.success(f"Plano {plano_id} seleccionado del Grupo {grupo}")
-        
-        # Avanzar al siguiente grupo automáticamente
-        if grupo < 3:
-            st.session_state.v3_grupo_actual = grupo + 1
-            st.info(f"Pasando al Grupo {grupo + 1}")
-        else:
-            st.session_state.v3_grupo_actual = 4  # Ir a la ronda final
-            st.info("¡Todos los grupos completados! Ahora elige el plano ganador.")
-    
-    elif grupo == 4:  # Ronda final
-        st.session_state.planos_seleccionados['v3'] = {
-            'plano_id': plano_id,
-            'datos': datos_plano
-        }
-        st.success(f"¡Plano {plano_id} seleccionado como ganador de v3!")
-
-def seleccionar_plano_v4(plano_id, datos_plano, grupo):
-    """Función especial para manejar la selección de planos v4 con sistema de grupos"""
-    if grupo <= 3:  # Grupos 1, 2, 3
-        st.session_state.v4_seleccionados_por_grupo[grupo] = {
-            'plano_id': plano_id,
-            'datos': datos_plano
-        }
-        st.success(f"Plano {plano_id} seleccionado del Grupo {grupo}")
-        
-        # Avanzar al siguiente grupo automáticamente
-        if grupo < 3:
-            st.session_state.v4_grupo_actual = grupo + 1
-            st.info(f"Pasando al Grupo {grupo + 1}")
-        else:
-            st.session_state.v4_grupo_actual = 4  # Ir a la ronda final
-            st.info("¡Todos los grupos completados! Ahora elige el plano ganador.")
-    
-    elif grupo == 4:  # Ronda final
-        st.session_state.planos_seleccionados['v4'] = {
-            'plano_id': plano_id,
-            'datos': datos_plano
-        }
-        st.success(f"¡Plano {plano_id} seleccionado como ganador de v4!")
-
-def seleccionar_plano_v5(plano_id, datos_plano, grupo):
-    """Función especial para manejar la selección de planos v5 con sistema de grupos"""
-    if grupo <= 6:  # Grupos 1, 2, 3, 4, 5, 6
-        st.session_state.v5_seleccionados_por_grupo[grupo] = {
-            'plano_id': plano_id,
-            'datos': datos_plano
-        }
-        st.success(f"Plano {plano_id} seleccionado del Grupo {grupo}")
-        
-        # Avanzar al siguiente grupo automáticamente
-        if grupo < 6:
-            st.session_state.v5_grupo_actual = grupo + 1
-            st.info(f"Pasando al Grupo {grupo + 1}")
-        else:
-            st.session_state.v5_grupo_actual = 7  # Ir a la ronda final
-            st.info("¡Todos los grupos completados! Ahora elige el plano ganador.")
-    
-    elif grupo == 7:  # Ronda final
-        st.session_state.planos_seleccionados['v5'] = {
-            'plano_id': plano_id,
-            'datos': datos_plano
-        }
-        st.success(f"¡Plano {plano_id} seleccionado como ganador de v5!")
-
-def reiniciar_seleccion_v3():
-    """Reiniciar la selección de v3 para empezar de nuevo"""
-    st.session_state.v3_grupo_actual = 1
-    st.session_state.v3_seleccionados_por_grupo = {}
-    if 'v3' in st.session_state.planos_seleccionados:
-        del st.session_state.planos_seleccionados['v3']
-
-def reiniciar_seleccion_v4():
-    """Reiniciar la selección de v4 para empezar de nuevo"""
-    st.session_state.v4_grupo_actual = 1
-    st.session_state.v4_seleccionados_por_grupo = {}
-    if 'v4' in st.session_state.planos_seleccionados:
-        del st.session_state.planos_seleccionados['v4']
-
-def reiniciar_seleccion_v5():
-    """Reiniciar la selección de v5 para empezar de nuevo"""
-    st.session_state.v5_grupo_actual = 1
-    st.session_state.v5_seleccionados_por_grupo = {}
-    if 'v5' in st.session_state.planos_seleccionados:
-        del st.session_state.planos_seleccionados['v5']
-
-def ir_grupo_anterior_v3():
-    """Ir al grupo anterior en v3"""
-    if st.session_state.v3_grupo_actual > 1:
-        st.session_state.v3_grupo_actual -= 1
-        # Si volvemos de la ronda final, no eliminar las selecciones previas
-        if st.session_state.v3_grupo_actual == 3:
-            # Solo eliminar la selección final si existe
-            if 'v3' in st.session_state.planos_seleccionados:
-                del st.session_state.planos_seleccionados['v3']
-
-def ir_grupo_anterior_v4():
-    """Ir al grupo anterior en v4"""
-    if st.session_state.v4_grupo_actual > 1:
-        st.session_state.v4_grupo_actual -= 1
-        # Si volvemos de la ronda final, no eliminar las selecciones previas
-        if st.session_state.v4_grupo_actual == 3:
-            # Solo eliminar la selección final si existe
-            if 'v4' in st.session_state.planos_seleccionados:
-                del st.session_state.planos_seleccionados['v4']
-
-def ir_grupo_anterior_v5():
-    """Ir al grupo anterior en v5"""
-    if st.session_state.v5_grupo_actual > 1:
-        st.session_state.v5_grupo_actual -= 1
-        # Si volvemos de la ronda final, no eliminar las selecciones previas
-        if st.session_state.v5_grupo_actual == 6:
-            # Solo eliminar la selección final si existe
-            if 'v5' in st.session_state.planos_seleccionados:
-                del st.session_state.planos_seleccionados['v5']
-
-def seleccionar_plano(version, plano_id, datos_plano):
-    """Función para manejar la selección de un plano (para versiones diferentes a v3)"""
-    # Guardar el plano seleccionado para esta versión
+def seleccionar_plano_torneo(torneo, version, plano_id):
+    """
+    Elige un plano del grupo actual; en la ronda final lo registra como ganador de la versión.
+    Devuelve True si cambió el ganador de la versión.
+    """
+    estado = st.session_state.torneos[version]
+    if torneo.seleccionar(estado, plano_id):
+        st.session_state.planos_seleccionados[version] = {'plano_id': plano_id}
+        return True
+    return False
+
+def quitar_seleccion_torneo(torneo, version, plano_id):
+    """
+    Deshace la elección de un plano en el grupo actual (y lo que dependía de ella).
+    Devuelve True si con ello se descartó el ganador de la versión.
+    """
+    torneo.quitar(st.session_state.torneos[version], plano_id)
+    return st.session_state.planos_seleccionados.pop(version, None) is not None
+
+def seleccionar_plano(version, plano_id, mostrados):
+    """Función para manejar la selección de un plano (para versiones sin torneo por grupos)"""
+    # Guardar el plano seleccionado para esta versión (su ID y los IDs de los
+    # planos entre los que se eligió)
     st.session_state.planos_seleccionados[version] = {
         'plano_id': plano_id,
-        'datos': datos_plano
+        'mostrados': list(mostrados)
     }
     st.success(f"Plano {plano_id} de la versión {version} seleccionado correctamente")
 
 
+def sincronizar_con_catalogo(catalogo):
+    """
+    Si el catálogo cambió desde la última visita de la sesión, descarta las
+    selecciones y los torneos que mencionan planos que ya no existen.
+    """
+    if st.session_state.get('firma_catalogo') == catalogo.firma:
+        return
+    for version, estado in list(st.session_state.torneos.items()):
+        ids = set(catalogo.planos_ids(version))
+        mencionados = {p for candidatos in estado['candidatos'] for p in candidatos} | set(estado.get('orden', []))
+        mencionados |= {p for grupos in estado['elegidos'] for grupo in grupos if grupo for p in grupo}
+        if estado['ganador'] is not None:
+            mencionados.add(estado['ganador'])
+        if not mencionados <= ids:
+            del st.session_state.torneos[version]
+            st.session_state.planos_seleccionados.pop(version, None)
+    for version, seleccion in list(st.session_state.planos_seleccionados.items()):
+        if catalogo.obtener(version, seleccion['plano_id']) is None:
+            del st.session_state.planos_seleccionados[version]
+    st.session_state.firma_catalogo = catalogo.firma
+
+def prefetch_siguiente_grupo(catalogo, torneo, estado, version):
+    """Renderiza en segundo plano los planos que se verán tras elegir en el grupo actual"""
+    if MODO_RENDER != "imagen":
+        return
+    planos = [(buscar_plano(catalogo, version, plano_id), version) for plano_id in torneo.planos_siguientes(estado)]
+    prefetch_render.programar(st.session_state.id_sesion, [(d, v) for d, v in planos if d is not None],
+                              AJUSTES_MINIATURA)
+
+def refrescar(cambio_ganador):
+    """
+    Vuelve a ejecutar solo el fragmento actual, o toda la página si cambió el
+    ganador de alguna versión (el panel de estado debe reflejarlo).
+    """
+    guardar_progreso()
+    if not cambio_ganador:
+        try:
+            st.rerun(scope="fragment")
+        except StreamlitAPIException:
+            # Solo se puede acotar al fragmento durante una re-ejecución del fragmento
+            pass
+    st.rerun()
+
+def enfrentamientos_sesion(catalogo):
+    """
+    Planos mostrados y elegidos en cada grupo, final o lista de planos de la
+    sesión: {version: [[mostrados, elegidos], ...]} (ver analitica_votos.py)
+    """
+    detalle = {}
+    for version, seleccion in st.session_state.planos_seleccionados.items():
+        if version in st.session_state.torneos and catalogo is not None:
+            torneo = Torneo(catalogo.planos_ids(version), CONFIG_TORNEOS.get(version))
+            detalle[version] = torneo.enfrentamientos(st.session_state.torneos[version])
+        elif seleccion.get('mostrados'):
+            detalle[version] = [[seleccion['mostrados'], [seleccion['plano_id']]]]
+    return detalle
+
+def asignaciones_sesion(catalogo):
+    """Grupos de la primera ronda que recibió la sesión en cada versión con torneo: {version: asignación}"""
+    if catalogo is None:
+        return {}
+    return {version: Torneo(catalogo.planos_ids(version), CONFIG_TORNEOS.get(version)).asignacion(estado)
+            for version, estado in st.session_state.torneos.items()}
+
 def verificar_selecciones_completas():
     """Verifica si el usuario ha seleccionado planos de todas las versiones disponibles"""
     versiones_requeridas = ['v1', 'v2', 'v3', 'v4', 'v5']
@@ -348,30 +363,22 @@ def verificar_selecciones_completas():
     
     return selecciones_completas, versiones_faltantes
 
-def guardar_datos_usuario_excel(datos_usuario, selecciones):
+@medir("guardar_datos_usuario_excel", "Entrega de las respuestas finales al almacén")
+def guardar_datos_usuario_excel(datos_usuario, selecciones, clave_envio=None, enfrentamientos=None, asignaciones=None):
     """
-    Guarda los datos del usuario y sus selecciones en un archivo Excel llamado 'Respuestas.xlsx'.
-    Crea el archivo si no existe, o agrega los datos si ya existe.
+    Guarda los datos del usuario y sus selecciones en el almacén de respuestas.
+    El envío queda anotado de forma duradera y se escribe en segundo plano;
+    la misma clave_envio nunca se guarda dos veces (p. ej. ante un doble clic).
+    'Respuestas.xlsx' se genera bajo demanda con almacen_respuestas.py.
     """
-    archivo_resultados = "Respuestas.xlsx"
-    
     try:
         # Obtener timestamp para el registro
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # Obtener el siguiente número de usuario
-        numero_usuario = 1
-        if os.path.exists(archivo_resultados):
-            try:
-                df_existente = pd.read_excel(archivo_resultados)
-                numero_usuario = len(df_existente) + 1
-            except:
-                numero_usuario = 1
-        
         # Crear el registro del usuario según el formato solicitado
+        # (el Numero lo asigna el almacén de forma atómica)
         registro = {
             'Timestamp': timestamp,
-            'Numero': numero_usuario,
             'Nombre_completo': datos_usuario.get('nombre', ''),
             'Profesion': datos_usuario.get('profesion', ''),
             'Anos_experiencia': datos_usuario.get('experiencia', 0),
@@ -382,36 +389,28 @@ def guardar_datos_usuario_excel(datos_usuario, selecciones):
             'V2': selecciones.get('v2', {}).get('plano_id', 'No seleccionado'),
             'V3': selecciones.get('v3', {}).get('plano_id', 'No seleccionado'),
             'V4': selecciones.get('v4', {}).get('plano_id', 'No seleccionado'),
-            'V5': selecciones.get('v5', {}).get('plano_id', 'No seleccionado')
+            'V5': selecciones.get('v5', {}).get('plano_id', 'No seleccionado'),
+            'Detalle_Torneos': json.dumps(enfrentamientos or {}),
+            'Asignacion_Grupos': json.dumps(asignaciones or {})
         }
         
-        # Convertir a DataFrame
-        df_nuevo = pd.DataFrame([registro])
-        
-        # Verificar si el archivo ya existe
-        if os.path.exists(archivo_resultados):
-            # Leer el archivo existente y agregar los nuevos datos
-            try:
-                df_existente = pd.read_excel(archivo_resultados)
-                df_final = pd.concat([df_existente, df_nuevo], ignore_index=True)
-            except Exception as e:
-                # Si hay error leyendo el archivo existente, crear uno nuevo
-                st.warning(f"Error leyendo archivo existente: {e}. Creando archivo nuevo.")
-                df_final = df_nuevo
-        else:
-            # Crear archivo nuevo
-            df_final = df_nuevo
+        if clave_envio is None:
+            clave_envio = uuid.uuid4().hex
+        resultado = obtener_escritor().encolar(clave_envio, registro)
         
-        # Guardar el archivo (corregir la línea problemática)
-        df_final.to_excel(archivo_resultados, index=False)
-        
-        return True, f"Datos guardados exitosamente. Usuario #{numero_usuario} registrado."
+        if resultado['estado'] == 'guardado':
+            return True, f"Datos guardados exitosamente. Usuario #{resultado['numero']} registrado."
+        return True, "Respuestas recibidas correctamente. Se están guardando en segundo plano."
         
     except Exception as e:
         return False, f"Error al guardar los datos: {str(e)}"
 
+@st.fragment
 def mostrar_boton_finalizar():
-    """Muestra el botón finalizar si todas las versiones han sido seleccionadas"""
+    """
+    Muestra el botón finalizar si todas las versiones han sido seleccionadas.
+    Es un fragmento: pulsar FINALIZAR no vuelve a dibujar los planos.
+    """
     selecciones_completas, versiones_faltantes = verificar_selecciones_completas()
     
     st.markdown("---")
@@ -435,7 +434,7 @@ def mostrar_boton_finalizar():
         st.info("Completa todas las selecciones para poder finalizar.")
     
     # Mostrar botón finalizar solo si están completas todas las selecciones
-    if selecciones_completas:
+    if selecciones_completas and not st.session_state.get('evaluacion_finalizada'):
         # Centrar el botón finalizar
         col1, col2, col3 = st.columns([2, 1, 2])
         with col2:
@@ -446,30 +445,23 @@ def mostrar_boton_finalizar():
                 
                 # Verificar que tenemos los datos del usuario
                 if 'datos_usuario' in st.session_state:
+                    # Una clave por evaluación: un doble clic no genera dos registros
+                    if 'clave_envio' not in st.session_state:
+                        st.session_state.clave_envio = uuid.uuid4().hex
+                        guardar_progreso()
                     with st.spinner("Guardando respuestas..."):
+                        catalogo = cargar_datos_excel()
                         exito, mensaje = guardar_datos_usuario_excel(
                             st.session_state.datos_usuario, 
-                            st.session_state.planos_seleccionados
+                            st.session_state.planos_seleccionados,
+                            st.session_state.clave_envio,
+                            enfrentamientos_sesion(catalogo),
+                            asignaciones_sesion(catalogo)
                         )
                         
                         if exito:
-                            st.success("✅ " + mensaje)
+                            finalizar_evaluacion(mensaje)
                             st.balloons()
-                            
-                            # Mostrar resumen final
-                            st.markdown("### 📊 Resumen de tus selecciones:")
-                            for version in ['v1', 'v2', 'v3', 'v4', 'v5']:
-                                if version in st.session_state.planos_seleccionados:
-                                    plano_id = st.session_state.planos_seleccionados[version]['plano_id']
-                                    st.write(f"- **{version.upper()}**: Plano {plano_id}")
-                            
-                            st.info("¡Gracias por tu participación! Puedes cerrar la aplicación.")
-                            
-                            # Opcional: Limpiar session state para una nueva sesión
-                            if st.button("Iniciar Nueva Evaluación"):
-                                for key in list(st.session_state.keys()):
-                                    del st.session_state[key]
-                                st.rerun()
                         else:
                             st.error("❌ " + mensaje)
                             st.error("No se pudieron guardar los datos. Intenta nuevamente.")
@@ -477,27 +469,39 @@ def mostrar_boton_finalizar():
                     st.error("❌ Error: No se encontraron los datos del usuario.")
                     st.error("Por favor, regresa a la página de bienvenida y completa la información.")
 
-def guardar_backup_json(datos_usuario, selecciones):
-    """Guardar backup detallado en JSON (opcional)"""
-    try:
-        backup_data = {
-            'timestamp': datetime.now().isoformat(),
-            'usuario': datos_usuario,
-            'selecciones_finales': selecciones,
-            'proceso_v3': st.session_state.get('v3_seleccionados_por_grupo', {}),
-            'proceso_v4': st.session_state.get('v4_seleccionados_por_grupo', {}),
-            'proceso_v5': st.session_state.get('v5_seleccionados_por_grupo', {})
-        }
+    if st.session_state.get('evaluacion_finalizada'):
+        st.success("✅ " + st.session_state.evaluacion_finalizada)
+        
+        # Mostrar resumen final
+        st.markdown("### 📊 Resumen de tus selecciones:")
+        for version in ['v1', 'v2', 'v3', 'v4', 'v5']:
+            if version in st.session_state.planos_seleccionados:
+                plano_id = st.session_state.planos_seleccionados[version]['plano_id']
+                st.write(f"- **{version.upper()}**: Plano {plano_id}")
         
-        timestamp_file = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"backup_usuario_{timestamp_file}.json"
+        st.info("¡Gracias por tu participación! Puedes cerrar la aplicación.")
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(backup_data, f, indent=2, ensure_ascii=False)
-            
-        return True, f"Backup guardado en {filename}"
-    except Exception as e:
-        return False, f"Error en backup: {str(e)}"
+        # Limpiar session state para una nueva sesión (con un token y una clave de envío nuevos)
+        if st.button("Iniciar Nueva Evaluación"):
+            st.query_params.clear()
+            for key in list(st.session_state.keys()):
+                del st.session_state[key]
+            st.rerun()
+
+def finalizar_evaluacion(mensaje):
+    """
+    Marca la evaluación como terminada tras entregar las respuestas: se borra su
+    progreso (la URL ya no la retoma), la sesión no vuelve a anotar cambios y
+    deja de contar para el presupuesto de memoria de las sesiones
+    """
+    st.session_state.evaluacion_finalizada = mensaje
+    registro_sesiones.olvidar(st.session_state.id_sesion)
+    prefetch_render.cancelar(st.session_state.id_sesion)
+    try:
+        obtener_progreso().borrar(st.session_state.id_sesion)
+    except Exception:
+        pass  # Si falla, al retomarla se detecta que su clave de envío ya se guardó
+    st.session_state.progreso_guardado = {}
 
 def mostrar_visualizador():
     """Página principal del visualizador de planos"""
@@ -507,29 +511,32 @@ def mostrar_visualizador():
     mostrar_info_usuario()
     
     # Cargar los datos
-    df = cargar_datos_excel()
+    catalogo = cargar_datos_excel()
     
-    if df is not None:
+    if catalogo is not None:
+        sincronizar_con_catalogo(catalogo)
+        
         # Extraer versiones disponibles
-        if 'Version' in df.columns:
-            versiones = sorted(df['Version'].unique())
+        if 'Version' in catalogo.columnas:
+            versiones = catalogo.versiones
             
             # Selector de versión
-            version_seleccionada = st.selectbox("📐 Seleccionar versión:", versiones)
+            # Al retomar una sesión se vuelve a la versión en la que estaba
+            version_previa = st.session_state.get('version_actual')
+            version_seleccionada = st.selectbox("📐 Seleccionar versión:", versiones,
+                                                index=versiones.index(version_previa) if version_previa in versiones else 0)
             
-            # Filtrar datos para la versión seleccionada
-            df_filtrado = df[df['Version'] == version_seleccionada]
+            # Al cambiar de versión ya no sirven los renders anticipados de la anterior
+            if st.session_state.get('version_actual') != version_seleccionada:
+                prefetch_render.cancelar(st.session_state.id_sesion)
+                st.session_state.version_actual = version_seleccionada
             
-            # Lógica especial para v3 con sistema de rondas
-            if version_seleccionada == "v3":
-                mostrar_seleccion_v3(df_filtrado)
-            elif version_seleccionada == "v4":
-                mostrar_seleccion_v4(df_filtrado)
-            elif version_seleccionada == "v5":
-                mostrar_seleccion_v5(df_filtrado)
+            # Versiones con torneo por grupos (ver CONFIG_TORNEOS)
+            if version_seleccionada in CONFIG_TORNEOS:
+                mostrar_seleccion_torneo(catalogo, version_seleccionada)
             else:
                 # Lógica normal para otras versiones
-                mostrar_seleccion_normal(df_filtrado, version_seleccionada)
+                mostrar_seleccion_normal(catalogo, version_seleccionada)
         else:
             st.error("El Excel no contiene una columna 'Version'. Asegúrate de que el formato sea correcto.")
     else:
@@ -542,285 +549,93 @@ def mostrar_visualizador():
     # Mostrar el botón finalizar al final de la página
     mostrar_boton_finalizar()
 
-def mostrar_seleccion_v3(df_filtrado):
-    """Lógica especial para v3 con sistema de grupos"""
-    planos_ids = sorted(df_filtrado['Plano_ID'].unique())
-    grupo_actual = st.session_state.v3_grupo_actual
-    
-    # Dividir los 12 planos en 3 grupos de 4
-    grupos_planos = {
-        1: planos_ids[0:4],   # Planos 1-4
-        2: planos_ids[4:8],   # Planos 5-8
-        3: planos_ids[8:12]   # Planos 9-12
-    }
+@st.fragment
+def mostrar_seleccion_torneo(catalogo, version):
+    """
+    Selección por grupos: un grupo a la vez y, al final, la ronda final entre los ganadores.
+    Es un fragmento: elegir dentro de un grupo solo vuelve a ejecutar esta sección.
+    """
+    torneo, estado = obtener_torneo(catalogo, version)
     
-    if grupo_actual <= 3:
-        # Mostrar grupo actual (1, 2, o 3)
-        st.subheader(f"Grupo {grupo_actual}: Selecciona 1 plano de este grupo")
-        st.info(f"Planos del Grupo {grupo_actual}: {len(grupos_planos[grupo_actual])} planos")
+    if not estado['final']:
+        ronda, grupo = estado['ronda'], estado['grupo']
+        nombre_grupo = f"Grupo {grupo + 1}" if ronda == 0 else f"Ronda {ronda + 1} - Grupo {grupo + 1}"
+        requeridos = torneo.requeridos(estado)
+        planos_grupo = torneo.planos_grupo(estado)
+        st.subheader(f"{nombre_grupo}: Selecciona {requeridos} plano{'s' if requeridos > 1 else ''} de este grupo")
+        st.info(f"Planos del {nombre_grupo} (de {torneo.numero_grupos(estado)}): {len(planos_grupo)} planos")
         
-        # Mostrar los 4 planos del grupo actual
-        planos_grupo = grupos_planos[grupo_actual]
-        cols = st.columns(4)
+        elegidos = torneo.elegidos_grupo(estado)
+        cols = st.columns(torneo.config['tamano_grupo'])
         
         for i, plano_id in enumerate(planos_grupo):
-            datos_plano = df_filtrado[df_filtrado['Plano_ID'] == plano_id].iloc[0]
+            datos_plano = buscar_plano(catalogo, version, plano_id)
             
             with cols[i]:
                 st.write(f"### Plano {plano_id}")
                 
                 # Visualizar plano
-                titulo = f"Plano {plano_id}"
-                fig = visualizar_plano(datos_plano, titulo, "v3")
-                if fig:
-                    st.pyplot(fig, use_container_width=True)
-                
-                # Verificar si este plano está seleccionado para este grupo
-                plano_seleccionado = st.session_state.v3_seleccionados_por_grupo.get(grupo_actual, {}).get('plano_id')
-                is_selected = plano_seleccionado == plano_id
+                mostrar_imagen_plano(datos_plano, version, miniatura=True)
                 
-                if is_selected:
+                if plano_id in elegidos:
                     st.success("✅ SELECCIONADO")
-                    if st.button(f"Cambiar Selección", key=f"change_v3_g{grupo_actual}_{plano_id}"):
-                        # Eliminar la selección actual
-                        if grupo_actual in st.session_state.v3_seleccionados_por_grupo:
-                            del st.session_state.v3_seleccionados_por_grupo[grupo_actual]
-                        st.rerun()
+                    if st.button(f"Cambiar Selección", key=f"change_{version}_r{ronda}_g{grupo}_{plano_id}"):
+                        refrescar(quitar_seleccion_torneo(torneo, version, plano_id))
                 else:
-                    # Solo permitir seleccionar si no hay otro plano seleccionado en este grupo
-                    puede_seleccionar = grupo_actual not in st.session_state.v3_seleccionados_por_grupo
+                    # Solo permitir seleccionar si aún faltan planos por elegir en este grupo
+                    puede_seleccionar = not torneo.grupo_completo(estado)
                     
                     if st.button(f"Seleccionar", 
-                                key=f"select_v3_g{grupo_actual}_{plano_id}",
+                                key=f"select_{version}_r{ronda}_g{grupo}_{plano_id}",
                                 disabled=not puede_seleccionar):
-                        seleccionar_plano_v3(plano_id, datos_plano.to_dict(), grupo_actual)
-                        st.rerun()
-    
-    else:  # grupo_actual == 4 (Ronda final)
-        # Mostrar los 3 planos seleccionados
-        planos_finalistas = []
-        for grupo in [1, 2, 3]:
-            if grupo in st.session_state.v3_seleccionados_por_grupo:
-                plano_info = st.session_state.v3_seleccionados_por_grupo[grupo]
-                planos_finalistas.append(f"Plano {plano_info['plano_id']} (Grupo {grupo})")
-        
-        # Mostrar los 3 planos finalistas
-        cols = st.columns(3)
+                        refrescar(seleccionar_plano_torneo(torneo, version, plano_id))
         
-        for i, grupo in enumerate([1, 2, 3]):
-            if grupo in st.session_state.v3_seleccionados_por_grupo:
-                plano_info = st.session_state.v3_seleccionados_por_grupo[grupo]
-                plano_id = plano_info['plano_id']
-                datos_plano = df_filtrado[df_filtrado['Plano_ID'] == plano_id].iloc[0]
-                
-                with cols[i]:
-                    st.write(f"### Plano {plano_id}")
-                    
-                    # Visualizar plano
-                    titulo = f"Plano {plano_id}"
-                    fig = visualizar_plano(datos_plano, titulo, "v3")
-                    if fig:
-                        st.pyplot(fig, use_container_width=True)
-                    
-                    # Verificar si es el ganador final
-                    is_winner = ('v3' in st.session_state.planos_seleccionados and 
-                               st.session_state.planos_seleccionados['v3']['plano_id'] == plano_id)
-                    
-                    if is_winner:
-                        st.success("✅ SELECCIONADO")
-                    else:
-                        if st.button(f"Seleccionar", key=f"select_v3_final_{plano_id}"):
-                            seleccionar_plano_v3(plano_id, datos_plano.to_dict(), 4)
-                            st.rerun()
-
-def mostrar_seleccion_v4(df_filtrado):
-    """Lógica especial para v4 con sistema de grupos"""
-    planos_ids = sorted(df_filtrado['Plano_ID'].unique())
-    grupo_actual = st.session_state.v4_grupo_actual
+        # Mientras el usuario mira este grupo, preparar las imágenes del siguiente
+        prefetch_siguiente_grupo(catalogo, torneo, estado, version)
     
-    # Dividir los 12 planos en 3 grupos de 4
-    grupos_planos = {
-        1: planos_ids[0:4],   # Planos 1-4
-        2: planos_ids[4:8],   # Planos 5-8
-        3: planos_ids[8:12]   # Planos 9-12
-    }
-    
-    if grupo_actual <= 3:
-        # Mostrar grupo actual (1, 2, o 3)
-        st.subheader(f"Grupo {grupo_actual}: Selecciona 1 plano de este grupo")
-        
-        # Mostrar los 4 planos del grupo actual
-        planos_grupo = grupos_planos[grupo_actual]
-        cols = st.columns(4)
+    else:  # Ronda final
+        st.subheader("Ronda final: Selecciona el plano ganador")
+        finalistas = torneo.planos_grupo(estado)
         
-        for i, plano_id in enumerate(planos_grupo):
-            datos_plano = df_filtrado[df_filtrado['Plano_ID'] == plano_id].iloc[0]
-            
-            with cols[i]:
-                st.write(f"### Plano {plano_id}")
-                
-                # Visualizar plano
-                titulo = f"Plano {plano_id}"
-                fig = visualizar_plano(datos_plano, titulo, "v4")
-                if fig:
-                    st.pyplot(fig, use_container_width=True)
-                
-                # Verificar si este plano está seleccionado para este grupo
-                plano_seleccionado = st.session_state.v4_seleccionados_por_grupo.get(grupo_actual, {}).get('plano_id')
-                is_selected = plano_seleccionado == plano_id
-                
-                if is_selected:
-                    st.success("✅ SELECCIONADO")
-                    if st.button(f"Cambiar Selección", key=f"change_v4_g{grupo_actual}_{plano_id}"):
-                        # Eliminar la selección actual
-                        if grupo_actual in st.session_state.v4_seleccionados_por_grupo:
-                            del st.session_state.v4_seleccionados_por_grupo[grupo_actual]
-                        st.rerun()
-                else:
-                    # Solo permitir seleccionar si no hay otro plano seleccionado en este grupo
-                    puede_seleccionar = grupo_actual not in st.session_state.v4_seleccionados_por_grupo
-                    
-                    if st.button(f"Seleccionar", 
-                                key=f"select_v4_g{grupo_actual}_{plano_id}",
-                                disabled=not puede_seleccionar):
-                        seleccionar_plano_v4(plano_id, datos_plano.to_dict(), grupo_actual)
-                        st.rerun()
-    
-    else:  # grupo_actual == 4 (Ronda final)
-        # Mostrar los 3 planos finalistas
-        cols = st.columns(3)
-        
-        for i, grupo in enumerate([1, 2, 3]):
-            if grupo in st.session_state.v4_seleccionados_por_grupo:
-                plano_info = st.session_state.v4_seleccionados_por_grupo[grupo]
-                plano_id = plano_info['plano_id']
-                datos_plano = df_filtrado[df_filtrado['Plano_ID'] == plano_id].iloc[0]
+        # Mostrar los finalistas en filas de 3
+        for inicio in range(0, len(finalistas), 3):
+            cols = st.columns(3)
+            for col, plano_id in zip(cols, finalistas[inicio:inicio + 3]):
+                datos_plano = buscar_plano(catalogo, version, plano_id)
                 
-                with cols[i]:
+                with col:
                     st.write(f"### Plano {plano_id}")
                     
                     # Visualizar plano
-                    titulo = f"Plano {plano_id}"
-                    fig = visualizar_plano(datos_plano, titulo, "v4")
-                    if fig:
-                        st.pyplot(fig, use_container_width=True)
+                    mostrar_imagen_plano(datos_plano, version, miniatura=True)
                     
                     # Verificar si es el ganador final
-                    is_winner = ('v4' in st.session_state.planos_seleccionados and 
-                               st.session_state.planos_seleccionados['v4']['plano_id'] == plano_id)
+                    is_winner = estado['ganador'] == plano_id
                     
                     if is_winner:
                         st.success("✅ SELECCIONADO")
                     else:
-                        if st.button(f"Seleccionar", key=f"select_v4_final_{plano_id}"):
-                            seleccionar_plano_v4(plano_id, datos_plano.to_dict(), 4)
-                            st.rerun()
-
-def mostrar_seleccion_v5(df_filtrado):
-    """Lógica especial para v5 con sistema de grupos"""
-    planos_ids = sorted(df_filtrado['Plano_ID'].unique())
-    grupo_actual = st.session_state.v5_grupo_actual
-    
-    # Dividir los 24 planos en 6 grupos de 4
-    grupos_planos = {
-        1: planos_ids[0:4],   # Planos 1-4
-        2: planos_ids[4:8],   # Planos 5-8
-        3: planos_ids[8:12],  # Planos 9-12
-        4: planos_ids[12:16], # Planos 13-16
-        5: planos_ids[16:20], # Planos 17-20
-        6: planos_ids[20:24]  # Planos 21-24
-    }
-    
-    if grupo_actual <= 6:
-        # Mostrar grupo actual (1, 2, 3, 4, 5, o 6)
-        st.subheader(f"Grupo {grupo_actual}: Selecciona 1 plano de este grupo")
-        
-        # Mostrar los 4 planos del grupo actual
-        planos_grupo = grupos_planos[grupo_actual]
-        cols = st.columns(4)
-        
-        for i, plano_id in enumerate(planos_grupo):
-            datos_plano = df_filtrado[df_filtrado['Plano_ID'] == plano_id].iloc[0]
-            
-            with cols[i]:
-                st.write(f"### Plano {plano_id}")
-                
-                # Visualizar plano
-                titulo = f"Plano {plano_id}"
-                fig = visualizar_plano(datos_plano, titulo, "v5")
-                if fig:
-                    st.pyplot(fig, use_container_width=True)
-                
-                # Verificar si este plano está seleccionado para este grupo
-                plano_seleccionado = st.session_state.v5_seleccionados_por_grupo.get(grupo_actual, {}).get('plano_id')
-                is_selected = plano_seleccionado == plano_id
-                
-                if is_selected:
-                    st.success("✅ SELECCIONADO")
-                    if st.button(f"Cambiar Selección", key=f"change_v5_g{grupo_actual}_{plano_id}"):
-                        # Eliminar la selección actual
-                        if grupo_actual in st.session_state.v5_seleccionados_por_grupo:
-                            del st.session_state.v5_seleccionados_por_grupo[grupo_actual]
-                        st.rerun()
-                else:
-                    # Solo permitir seleccionar si no hay otro plano seleccionado en este grupo
-                    puede_seleccionar = grupo_actual not in st.session_state.v5_seleccionados_por_grupo
-                    
-                    if st.button(f"Seleccionar", 
-                                key=f"select_v5_g{grupo_actual}_{plano_id}",
-                                disabled=not puede_seleccionar):
-                        seleccionar_plano_v5(plano_id, datos_plano.to_dict(), grupo_actual)
-                        st.rerun()
-    
-    else:  # grupo_actual == 7 (Ronda final)
-        # Mostrar los 6 planos finalistas en 2 filas de 3
-        for fila in range(2):
-            cols = st.columns(3)
-            for col in range(3):
-                grupo_idx = fila * 3 + col + 1
-                if grupo_idx <= 6 and grupo_idx in st.session_state.v5_seleccionados_por_grupo:
-                    plano_info = st.session_state.v5_seleccionados_por_grupo[grupo_idx]
-                    plano_id = plano_info['plano_id']
-                    datos_plano = df_filtrado[df_filtrado['Plano_ID'] == plano_id].iloc[0]
-                    
-                    with cols[col]:
-                        st.write(f"### Plano {plano_id}")
-                        
-                        # Visualizar plano
-                        titulo = f"Plano {plano_id}"
-                        fig = visualizar_plano(datos_plano, titulo, "v5")
-                        if fig:
-                            st.pyplot(fig, use_container_width=True)
-                        
-                        # Verificar si es el ganador final
-                        is_winner = ('v5' in st.session_state.planos_seleccionados and 
-                                   st.session_state.planos_seleccionados['v5']['plano_id'] == plano_id)
-                        
-                        if is_winner:
-                            st.success("✅ SELECCIONADO")
-                        else:
-                            if st.button(f"Seleccionar", key=f"select_v5_final_{plano_id}"):
-                                seleccionar_plano_v5(plano_id, datos_plano.to_dict(), 7)
-                                st.rerun()
+                        if st.button(f"Seleccionar", key=f"select_{version}_final_{plano_id}"):
+                            refrescar(seleccionar_plano_torneo(torneo, version, plano_id))
 
-def mostrar_seleccion_normal(df_filtrado, version_seleccionada):
-    """Lógica normal para versiones diferentes a v3, v4 y v5"""
+@st.fragment
+def mostrar_seleccion_normal(catalogo, version_seleccionada):
+    """
+    Lógica normal para versiones sin torneo por grupos.
+    Es un fragmento, aunque elegir un plano cambia el ganador y refresca toda la página.
+    """
     st.subheader(f"Todos los planos de la versión {version_seleccionada}")
     
     # Obtener todos los planos de esta versión
-    planos_ids = sorted(df_filtrado['Plano_ID'].unique())
+    planos_ids = catalogo.planos_ids(version_seleccionada)
     total_planos = len(planos_ids)
     
     # Determinar el número de columnas basado en la versión
-    if version_seleccionada == "v1":
-        num_columnas = 4
-        num_filas = 1  # Una fila para v1
-    elif version_seleccionada == "v2":
-        num_columnas = 4
-        num_filas = 3  # 3 filas para v2 (12 planos)
-    else:
-        num_columnas = 2
-        num_filas = (total_planos + num_columnas - 1) // num_columnas
+    num_columnas = 4 if version_seleccionada in ("v1", "v2") else 2
+    
+    # Solo se dibuja la página actual; la selección vive en planos_seleccionados y no depende de ella
+    visibles, siguientes = mostrar_paginacion(planos_ids, version_seleccionada, num_columnas)
+    num_filas = (len(visibles) + num_columnas - 1) // num_columnas
     
     # Mostrar los planos
     for fila in range(num_filas):
@@ -829,19 +644,16 @@ def mostrar_seleccion_normal(df_filtrado, version_seleccionada):
         for col in range(num_columnas):
             idx_plano = fila * num_columnas + col
             
-            if idx_plano < total_planos:
-                plano_id = planos_ids[idx_plano]
-                datos_plano = df_filtrado[df_filtrado['Plano_ID'] == plano_id].iloc[0]
+            if idx_plano < len(visibles):
+                plano_id = visibles[idx_plano]
+                datos_plano = buscar_plano(catalogo, version_seleccionada, plano_id)
                 
                 with cols[col]:
                     # Para versiones con muchos planos, hacer encabezados más compactos
                     st.write(f"### Plano {plano_id}")
                     
                     # Visualizar plano
-                    titulo = f"Plano {plano_id}"
-                    fig = visualizar_plano(datos_plano, titulo, version_seleccionada)
-                    if fig:
-                        st.pyplot(fig, use_container_width=True)
+                    mostrar_imagen_plano(datos_plano, version_seleccionada, miniatura=True)
                     
                     # Resaltar si este plano está seleccionado
                     is_selected = (version_seleccionada in st.session_state.planos_seleccionados and 
@@ -852,11 +664,146 @@ def mostrar_seleccion_normal(df_filtrado, version_seleccionada):
                         st.success("✅ SELECCIONADO")
                     else:
                         if st.button(f"Seleccionar", key=f"select_{version_seleccionada}_{plano_id}"):
-                            seleccionar_plano(version_seleccionada, plano_id, datos_plano.to_dict())
-                            st.rerun()
+                            seleccionar_plano(version_seleccionada, plano_id, visibles)
+                            refrescar(True)
+    
+    # Mientras el usuario mira esta página, preparar las miniaturas de la siguiente
+    if MODO_RENDER == "imagen" and siguientes:
+        planos = [buscar_plano(catalogo, version_seleccionada, plano_id) for plano_id in siguientes]
+        prefetch_render.programar(st.session_state.id_sesion,
+                                  [(d, version_seleccionada) for d in planos if d is not None], AJUSTES_MINIATURA)
+
+def mostrar_paginacion(planos_ids, version, num_columnas):
+    """
+    Controles de página de la grilla. Devuelve los IDs de la página actual y
+    los de la siguiente (vacía si es la última). La primera vez se abre la
+    página que contiene el plano ya seleccionado.
+    """
+    por_pagina = max(num_columnas, PLANOS_POR_PAGINA // num_columnas * num_columnas)
+    total_paginas = max(1, (len(planos_ids) + por_pagina - 1) // por_pagina)
+    paginas = st.session_state.paginas_grilla
+    if version not in paginas:
+        seleccion = st.session_state.planos_seleccionados.get(version)
+        indice = planos_ids.index(seleccion['plano_id']) if seleccion and seleccion['plano_id'] in planos_ids else 0
+        paginas[version] = indice // por_pagina
+    pagina = min(max(paginas[version], 0), total_paginas - 1)
+    paginas[version] = pagina
+
+    if total_paginas > 1:
+        col_anterior, col_estado, col_siguiente = st.columns([1, 3, 1])
+        with col_anterior:
+            if st.button("◀ Anterior", key=f"pagina_anterior_{version}", disabled=pagina == 0):
+                paginas[version] = pagina - 1
+                refrescar(False)
+        with col_estado:
+            fin = min((pagina + 1) * por_pagina, len(planos_ids))
+            st.caption(f"Página {pagina + 1} de {total_paginas} · planos {pagina * por_pagina + 1}-{fin} "
+                       f"de {len(planos_ids)}")
+        with col_siguiente:
+            if st.button("Siguiente ▶", key=f"pagina_siguiente_{version}", disabled=pagina == total_paginas - 1):
+                paginas[version] = pagina + 1
+                refrescar(False)
+
+    inicio = pagina * por_pagina
+    return planos_ids[inicio:inicio + por_pagina], planos_ids[inicio + por_pagina:inicio + 2 * por_pagina]
+
+def es_administrador():
+    """Indica si la URL trae el token de administración (?admin=...) definido en MODELACION_ADMIN_TOKEN"""
+    token = os.environ.get("MODELACION_ADMIN_TOKEN")
+    return bool(token) and hmac.compare_digest(st.query_params.get("admin", ""), token)
+
+def mostrar_administracion():
+    """Página de administración: resultados, exportación de respuestas y métricas del proceso"""
+    st.title("Administración")
+    st.button("Actualizar")
+    pestana_resultados, pestana_exportar, pestana_metricas = st.tabs(["Resultados", "Exportar", "Métricas"])
+    with pestana_resultados:
+        mostrar_resultados()
+    with pestana_exportar:
+        mostrar_exportacion()
+    with pestana_metricas:
+        mostrar_metricas()
+
+def mostrar_resultados():
+    """Ranking de planos por versión a partir de las comparaciones de todos los encuestados"""
+    import pandas as pd
+    from analitica_votos import obtener_analitica
+    analitica = obtener_analitica()
+    st.caption(f"{analitica.total_respuestas()} respuestas procesadas · la fuerza es el ajuste de "
+               "Bradley-Terry sobre las comparaciones de cada grupo, final y lista de planos")
+    versiones = sorted(analitica.versiones)
+    if not versiones:
+        st.info("Aún no hay respuestas.")
+        return
+    for version, pestana in zip(versiones, st.tabs([v.upper() for v in versiones])):
+        with pestana:
+            st.dataframe(pd.DataFrame(analitica.resultados(version)), hide_index=True, use_container_width=True,
+                         column_config={
+                             'Tasa_Victoria': st.column_config.NumberColumn(format="percent"),
+                             'Fuerza_BT': st.column_config.ProgressColumn(min_value=0.0, max_value=1.0, format="%.3f")
+                         })
+
+def mostrar_exportacion():
+    """Descarga de las respuestas (XLSX, CSV o Parquet), filtradas por fechas y versiones"""
+    formato = st.selectbox("Formato", FORMATOS_EXPORTACION)
+    fechas = st.date_input("Fechas (vacío = todas)", value=())
+    versiones = st.multiselect("Versiones (vacío = todas)", VERSIONES_EXPORTACION,
+                               format_func=lambda v: v.upper())
+
+    if st.button("Preparar exportación"):
+        anterior = st.session_state.pop('exportacion', None)
+        if anterior:
+            anterior['archivo'].borrar()
+        desde = fechas[0] if len(fechas) > 0 else None
+        hasta = fechas[1] if len(fechas) > 1 else desde
+        with st.spinner("Exportando respuestas..."):
+            archivo = ExportacionTemporal(formato, desde, hasta, versiones)
+        # La sesión guarda solo el archivo temporal (se borra al cerrarse la sesión)
+        st.session_state.exportacion = {
+            'archivo': archivo,
+            'nombre': f"Respuestas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+        }
+
+    exportacion = st.session_state.get('exportacion')
+    if exportacion:
+        st.caption(f"{exportacion['archivo'].total} respuestas exportadas")
+        # Los bytes se leen del disco solo cuando se pide la descarga
+        st.download_button("Descargar", exportacion['archivo'].lector(), file_name=exportacion['nombre'])
+
+def mostrar_metricas():
+    """Métricas de tiempo de este proceso"""
+    import pandas as pd
+    st.subheader("Métricas del proceso")
+    st.caption(f"PID {os.getpid()} · los tiempos son acumulados desde que arrancó el proceso")
+
+    filas = []
+    for nombre, histograma in sorted(metricas.registro.histogramas.items()):
+        _, suma, total = histograma.instantanea()
+        filas.append({
+            'Métrica': nombre,
+            'Llamadas': total,
+            'Total (s)': round(suma, 3),
+            'Promedio (ms)': round(suma / total * 1000, 2) if total else None,
+            'p50 ≤ (ms)': histograma.cuantil(0.5) * 1000 if total else None,
+            'p95 ≤ (ms)': histograma.cuantil(0.95) * 1000 if total else None
+        })
+    st.dataframe(pd.DataFrame(filas), hide_index=True, use_container_width=True)
+
+    valores = {f"{n}_total": c.valor for n, c in metricas.registro.contadores.items()}
+    valores.update(metricas.registro.valores_colectores())
+    if valores:
+        st.dataframe(pd.DataFrame({'Métrica': list(valores), 'Valor': list(valores.values())}),
+                     hide_index=True, use_container_width=True)
+
+    texto = metricas.texto_prometheus()
+    st.download_button("Descargar métricas (Prometheus)", texto, file_name="metricas.prom", mime="text/plain")
+    with st.expander("Formato de texto de Prometheus"):
+        st.code(texto, language=None)
 
 # Control de flujo principal
-if st.session_state.pagina == 'bienvenida':
+if es_administrador():
+    mostrar_administracion()
+elif st.session_state.pagina == 'bienvenida':
     mostrar_bienvenida()
 else:
     mostrar_visualizador()
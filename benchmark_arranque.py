@@ -0,0 +1,130 @@
+"""
+Benchmark del arranque en frío: tiempo hasta la página de bienvenida.
+
+Cada repetición es un proceso nuevo que, igual que un contenedor recién
+levantado, importa Streamlit y ejecuta app_modelacion.py una vez con el
+arnés de pruebas (AppTest). Se mide:
+
+- import_streamlit: importar streamlit;
+- primer_pintado: la primera ejecución del script, hasta tener la página de
+  bienvenida (incluye importar los módulos de la aplicación);
+- pesados_cargados: cuáles de pandas, numpy, matplotlib y pyarrow quedaron
+  importados tras el primer pintado;
+- precarga: cuánto tarda en terminar la precarga en segundo plano (ver
+  precarga.py) contada desde el primer pintado.
+
+El primer pintado se mide con la precarga desactivada (MODELACION_PRECARGA=0)
+para que el hilo no adelante imports que luego se atribuyan al script; la
+precarga se mide en otra repetición con la precarga activa.
+
+    python benchmark_arranque.py [--repeticiones 5] [--salida resultado.json]
+    python -X importtime benchmark_arranque.py --hijo 2> importtime.txt
+
+Se ejecuta en un directorio temporal con una copia de planos_ploteo.xlsx.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(DIRECTORIO, "app_modelacion.py")
+EXCEL = os.path.join(DIRECTORIO, "planos_ploteo.xlsx")
+PESADOS = ('pandas', 'numpy', 'matplotlib', 'pyarrow')
+
+
+def hijo():
+    """Un arranque medido; imprime el resultado como JSON"""
+    sys.path.insert(0, DIRECTORIO)
+    inicio = time.perf_counter()
+    import streamlit  # noqa: F401
+    from streamlit.testing.v1 import AppTest
+    import_streamlit = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    app = AppTest.from_file(SCRIPT, default_timeout=120)
+    app.run()
+    primer_pintado = time.perf_counter() - inicio
+    resultado = {
+        'import_streamlit': import_streamlit,
+        'primer_pintado': primer_pintado,
+        'bienvenida': any(b.label == "Continuar" for b in app.button),
+        'excepcion': [str(e.value) for e in app.exception],
+        'pesados_cargados': [m for m in PESADOS if m in sys.modules]
+    }
+    try:
+        import precarga
+    except ImportError:
+        precarga = None
+    if precarga is not None and precarga.ACTIVA:
+        inicio = time.perf_counter()
+        precarga.esperar()
+        resultado['precarga'] = time.perf_counter() - inicio
+    print(json.dumps(resultado))
+
+
+def ejecutar_hijo(directorio, precarga):
+    entorno = dict(os.environ, MODELACION_PRECARGA="1" if precarga else "0")
+    salida = subprocess.run([sys.executable, os.path.abspath(__file__), "--hijo"], cwd=directorio,
+                            env=entorno, capture_output=True, text=True, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def mediana(valores):
+    valores = sorted(valores)
+    if not valores:
+        return None
+    medio = len(valores) // 2
+    return valores[medio] if len(valores) % 2 else (valores[medio - 1] + valores[medio]) / 2
+
+
+def benchmark(repeticiones=5):
+    directorio = tempfile.mkdtemp(prefix="benchmark_arranque_")
+    try:
+        shutil.copy(EXCEL, directorio)
+        # Un arranque descartado para que el sistema de archivos tenga los módulos en caché
+        ejecutar_hijo(directorio, False)
+        frios = [ejecutar_hijo(directorio, False) for _ in range(repeticiones)]
+        con_precarga = [ejecutar_hijo(directorio, True) for _ in range(repeticiones)]
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    return {
+        'python': sys.version.split()[0],
+        'repeticiones': repeticiones,
+        'import_streamlit_mediana': mediana([r['import_streamlit'] for r in frios]),
+        'primer_pintado_mediana': mediana([r['primer_pintado'] for r in frios]),
+        'primer_pintado_con_precarga_mediana': mediana([r['primer_pintado'] for r in con_precarga]),
+        'precarga_mediana': mediana([r['precarga'] for r in con_precarga if 'precarga' in r]),
+        'pesados_cargados': frios[0]['pesados_cargados'],
+        'bienvenida': all(r['bienvenida'] for r in frios + con_precarga),
+        'excepciones': sorted({e for r in frios + con_precarga for e in r['excepcion']}),
+        'ejecuciones': {'sin_precarga': frios, 'con_precarga': con_precarga}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del arranque en frío de la aplicación")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Procesos nuevos a medir por caso")
+    parser.add_argument("--salida", help="Archivo JSON de resultados (por defecto, salida estándar)")
+    parser.add_argument("--hijo", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        hijo()
+        return
+    resultado = benchmark(args.repeticiones)
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Simulación de la composición de grupos de los torneos: fija vs adaptativa.
+
+Cada plano de la versión recibe una fuerza "verdadera" al azar (log-normal)
+y cada encuestado simulado juega el torneo de la versión eligiendo en cada
+grupo según el modelo de Bradley-Terry con esas fuerzas. Sus enfrentamientos
+se acumulan como en analitica_votos.py y, con composición adaptativa, los
+grupos del encuestado siguiente se arman con esos conteos (igual que
+estadisticas_votos en la aplicación).
+
+Tras cada encuestado se compara el ranking estimado con el verdadero
+(tau de Kendall sobre todos los planos de la versión) y se informa cuántos
+encuestados hicieron falta para llegar a --objetivo, y el tau alcanzado con
+--encuestados. Los planos que ningún encuestado vio quedan con fuerza 0 en
+el ranking estimado.
+
+    python benchmark_composicion.py [--version v3 ...] [--encuestados 200] [--semillas 10]
+                                    [--objetivo 0.8] [--salida resultado.json]
+"""
+import argparse
+import json
+import random
+
+from analitica_votos import AgregadoVersion
+from torneo import CONFIG_TORNEOS, Torneo, nuevo_estado
+
+COMPOSICIONES = ('fija', 'adaptativa')
+
+
+def tau_kendall(estimadas, verdaderas):
+    """Tau-b de Kendall entre dos {plano: valor} sobre los planos de `verdaderas`"""
+    planos = list(verdaderas)
+    concordantes = discordantes = empates_a = empates_b = 0
+    for i, a in enumerate(planos):
+        for b in planos[i + 1:]:
+            x = estimadas.get(a, 0) - estimadas.get(b, 0)
+            y = verdaderas[a] - verdaderas[b]
+            if x == 0 and y == 0:
+                continue
+            if x == 0:
+                empates_a += 1
+            elif y == 0:
+                empates_b += 1
+            elif (x > 0) == (y > 0):
+                concordantes += 1
+            else:
+                discordantes += 1
+    total = concordantes + discordantes
+    denominador = ((total + empates_a) * (total + empates_b)) ** 0.5
+    return (concordantes - discordantes) / denominador if denominador else 0.0
+
+
+def elegir(planos, cantidad, fuerzas, azar):
+    """Elige `cantidad` planos sin reemplazo con probabilidad proporcional a su fuerza"""
+    restantes, elegidos = list(planos), []
+    for _ in range(cantidad):
+        ganador = azar.choices(restantes, weights=[fuerzas[p] for p in restantes])[0]
+        restantes.remove(ganador)
+        elegidos.append(ganador)
+    return elegidos
+
+
+def simular(planos_ids, config, composicion, encuestados, semilla):
+    """Tau de Kendall tras cada encuestado"""
+    azar = random.Random(semilla)
+    verdaderas = {p: azar.lognormvariate(0, 1) for p in planos_ids}
+    torneo = Torneo(planos_ids, dict(config, composicion=composicion))
+    agregado = AgregadoVersion()
+    taus = []
+    for _ in range(encuestados):
+        estadisticas = {'apariciones': dict(agregado.apariciones), 'pares': dict(agregado.pares),
+                        'fuerzas': dict(agregado.fuerzas)}
+        estado = torneo.iniciar(nuevo_estado(), estadisticas, azar)
+        while estado['ganador'] is None:
+            grupo = torneo.planos_grupo(estado)
+            cantidad = 1 if estado['final'] else torneo.requeridos(estado)
+            for plano in elegir(grupo, cantidad, verdaderas, azar):
+                torneo.seleccionar(estado, plano)
+        for mostrados, elegidos in torneo.enfrentamientos(estado):
+            agregado.registrar_enfrentamiento(mostrados, elegidos)
+        agregado.registrar_ganador(estado['ganador'])
+        taus.append(tau_kendall(agregado.actualizar_fuerzas(), verdaderas))
+    return taus
+
+
+def primer_alcance(taus, objetivo):
+    """Encuestados necesarios para que el tau llegue al objetivo y no vuelva a bajar de él (None si no llega)"""
+    for i in range(len(taus)):
+        if all(t >= objetivo for t in taus[i:]):
+            return i + 1
+    return None
+
+
+def mediana(valores):
+    valores = sorted(valores)
+    if not valores:
+        return None
+    medio = len(valores) // 2
+    return valores[medio] if len(valores) % 2 else (valores[medio - 1] + valores[medio]) / 2
+
+
+def benchmark(versiones=None, encuestados=200, semillas=10, objetivo=0.8):
+    from catalogo_planos import obtener_catalogo
+    catalogo = obtener_catalogo()
+    resultado = {'encuestados': encuestados, 'semillas': semillas, 'objetivo': objetivo, 'versiones': {}}
+    for version in versiones or sorted(CONFIG_TORNEOS):
+        planos_ids = catalogo.planos_ids(version)
+        por_composicion = {}
+        for composicion in COMPOSICIONES:
+            corridas = [simular(planos_ids, CONFIG_TORNEOS[version], composicion, encuestados, semilla)
+                        for semilla in range(semillas)]
+            alcances = [primer_alcance(taus, objetivo) for taus in corridas]
+            por_composicion[composicion] = {
+                'tau_final_mediana': mediana([taus[-1] for taus in corridas]),
+                'encuestados_hasta_objetivo_mediana': mediana([a for a in alcances if a is not None]),
+                'corridas_sin_objetivo': sum(a is None for a in alcances)
+            }
+        resultado['versiones'][version] = {'planos': len(planos_ids), **por_composicion}
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simula la composición de grupos fija y adaptativa")
+    parser.add_argument("--version", dest="versiones", nargs="+", choices=sorted(CONFIG_TORNEOS),
+                        help="Versiones con torneo a simular (por defecto, todas)")
+    parser.add_argument("--encuestados", type=int, default=200, help="Encuestados simulados por corrida")
+    parser.add_argument("--semillas", type=int, default=10, help="Corridas por versión y composición")
+    parser.add_argument("--objetivo", type=float, default=0.8, help="Tau de Kendall buscado")
+    parser.add_argument("--salida", help="Archivo JSON de resultados (por defecto, salida estándar)")
+    args = parser.parse_args()
+
+    resultado = benchmark(args.versiones, args.encuestados, args.semillas, args.objetivo)
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
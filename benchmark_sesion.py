@@ -0,0 +1,345 @@
+"""
+Benchmark de una sesión completa de la encuesta, sin navegador.
+
+Recorre app_modelacion.py con el arnés de pruebas de Streamlit (AppTest)
+igual que lo haría un encuestado: formulario de bienvenida, todas las
+versiones con cada grupo y la final de los torneos, y FINALIZAR.
+
+    python benchmark_sesion.py [--sesiones 3] [--salida resultado.json] [--comparar anterior.json]
+
+Se ejecuta en un directorio temporal con una copia de planos_ploteo.xlsx, así
+que la primera sesión parte con la caché de imágenes y la base de respuestas
+vacías y las siguientes miden el caso con caché caliente.
+
+Por cada rerun se registra el tiempo total y el tiempo dentro de
+cargar_datos_excel, visualizar_plano y guardar_datos_usuario_excel. Como el
+script se vuelve a definir en cada rerun, se mide la función de módulo a la
+que cada una delega (obtener_catalogo, ServicioRender.renderizar y
+EscritorRespuestas.encolar). Como la rasterización ocurre en el pool de
+procesos del servicio de render, para los planos se mide la espera de cada
+imagen que no estaba en caché. Los pedidos de los hilos de prefetch se
+cuentan aparte. Además se guarda el pico de memoria residente y la cantidad de
+figuras de matplotlib vivas.
+
+El resultado es un JSON; con --comparar se contrasta con el de otra revisión
+y el proceso termina con código 1 si algún total empeora más que la
+tolerancia.
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+import matplotlib.pyplot as plt
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(DIRECTORIO, "app_modelacion.py")
+EXCEL = os.path.join(DIRECTORIO, "planos_ploteo.xlsx")
+
+DATOS_ENCUESTADO = ["Encuestado Benchmark", "Arquitecto", "Universidad", "benchmark@ejemplo.com"]
+MAX_SELECCIONES_VERSION = 100
+
+
+class Medidor:
+    """Acumula llamadas y segundos por función envuelta, separando el hilo del script de los de prefetch"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._originales = []
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.funciones = {}
+            self.segundo_plano = {}
+
+    def _registrar(self, etiqueta, segundos):
+        destino = self.segundo_plano if threading.current_thread().name.startswith("prefetch-planos") else self.funciones
+        with self._lock:
+            actual = destino.setdefault(etiqueta, {'llamadas': 0, 'segundos': 0.0})
+            actual['llamadas'] += 1
+            actual['segundos'] += segundos
+
+    def envolver(self, objeto, atributo, etiqueta):
+        """Reemplaza objeto.atributo por una versión que mide su duración"""
+        original = getattr(objeto, atributo)
+        medidor = self
+
+        def medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                medidor._registrar(etiqueta, time.perf_counter() - inicio)
+
+        setattr(objeto, atributo, medida)
+        self._originales.append((objeto, atributo, original))
+
+    def restaurar(self):
+        for objeto, atributo, original in reversed(self._originales):
+            setattr(objeto, atributo, original)
+        self._originales.clear()
+
+    def tomar(self):
+        """Devuelve lo acumulado desde la última toma y vuelve a cero"""
+        with self._lock:
+            funciones, segundo_plano = self.funciones, self.segundo_plano
+            self.funciones, self.segundo_plano = {}, {}
+        return funciones, segundo_plano
+
+
+def rss_pico_mb():
+    """Pico de memoria residente del proceso en MB (None si la plataforma no lo informa)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB; macOS, bytes
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def contar_figuras():
+    """Figuras de pyplot abiertas y figuras de matplotlib vivas en total"""
+    gc.collect()
+    vivas = sum(1 for o in gc.get_objects() if isinstance(o, Figure))
+    return {'pyplot': len(plt.get_fignums()), 'vivas': vivas}
+
+
+def revision_git():
+    """Commit actual del repositorio (None si no se puede obtener)"""
+    try:
+        salida = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=DIRECTORIO,
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return salida.stdout.strip() or None
+
+
+class Sesion:
+    """Un encuestado recorriendo la aplicación, con un registro por rerun"""
+
+    def __init__(self, numero, medidor, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.numero = numero
+        self.medidor = medidor
+        self.reruns = []
+        self.app = AppTest.from_file(SCRIPT, default_timeout=timeout)
+
+    def ejecutar(self, paso, accion=None):
+        """Aplica `accion` (si hay) y mide el rerun resultante"""
+        self.medidor.tomar()
+        inicio = time.perf_counter()
+        if accion is None:
+            self.app.run()
+        else:
+            accion().run()
+        segundos = time.perf_counter() - inicio
+        funciones, segundo_plano = (
+            {nombre: dict(datos, segundos=round(datos['segundos'], 6)) for nombre, datos in medidas.items()}
+            for medidas in self.medidor.tomar())
+        if self.app.exception:
+            raise RuntimeError(f"Excepción en el paso '{paso}': {self.app.exception[0].value}")
+        self.reruns.append({
+            'sesion': self.numero,
+            'paso': paso,
+            'segundos': round(segundos, 6),
+            'funciones': funciones,
+            'segundo_plano': segundo_plano,
+            'rss_pico_mb': rss_pico_mb()
+        })
+
+    def boton(self, etiqueta):
+        for boton in self.app.button:
+            if boton.label == etiqueta and not boton.disabled:
+                return boton
+        return None
+
+    def seleccionados(self):
+        return self.app.session_state['planos_seleccionados']
+
+    def describir_paso(self, version):
+        torneos = self.app.session_state['torneos'] if 'torneos' in self.app.session_state else {}
+        estado = torneos.get(version)
+        if estado is None:
+            return f"{version}: seleccionar"
+        if estado['final']:
+            return f"{version}: final"
+        return f"{version}: ronda {estado['ronda'] + 1}, grupo {estado['grupo'] + 1}"
+
+    def recorrer(self):
+        self.ejecutar("bienvenida")
+        for campo, valor in zip(self.app.text_input, DATOS_ENCUESTADO):
+            campo.set_value(valor)
+        self.ejecutar("formulario")
+        self.ejecutar("continuar", self.boton("Continuar").click)
+
+        versiones = list(self.app.selectbox[0].options)
+        for version in versiones:
+            self.ejecutar(f"{version}: abrir", lambda: self.app.selectbox[0].select(version))
+            for _ in range(MAX_SELECCIONES_VERSION):
+                if version in self.seleccionados():
+                    break
+                boton = self.boton("Seleccionar")
+                if boton is None:
+                    raise RuntimeError(f"No hay planos para seleccionar en {version}")
+                self.ejecutar(self.describir_paso(version), boton.click)
+            else:
+                raise RuntimeError(f"{version} no terminó tras {MAX_SELECCIONES_VERSION} selecciones")
+
+        boton = self.boton("FINALIZAR")
+        if boton is None:
+            raise RuntimeError("El botón FINALIZAR no está disponible")
+        self.ejecutar("finalizar", boton.click)
+
+
+def resumir(reruns):
+    """Totales y percentiles de un conjunto de reruns"""
+    tiempos = sorted(r['segundos'] for r in reruns)
+    if not tiempos:
+        return {}
+
+    def percentil(p):
+        return round(tiempos[min(len(tiempos) - 1, int(round(p / 100 * (len(tiempos) - 1))))], 6)
+
+    funciones = {}
+    for r in reruns:
+        for nombre, datos in r['funciones'].items():
+            total = funciones.setdefault(nombre, {'llamadas': 0, 'segundos': 0.0})
+            total['llamadas'] += datos['llamadas']
+            total['segundos'] += datos['segundos']
+    for datos in funciones.values():
+        datos['segundos'] = round(datos['segundos'], 6)
+
+    return {
+        'reruns': len(tiempos),
+        'segundos_total': round(sum(tiempos), 6),
+        'segundos_p50': percentil(50),
+        'segundos_p95': percentil(95),
+        'segundos_max': tiempos[-1],
+        'funciones': funciones
+    }
+
+
+def benchmark(sesiones=3, timeout=120):
+    """Recorre `sesiones` sesiones completas y devuelve el resultado como diccionario"""
+    import almacen_respuestas
+    import catalogo_planos
+    import render_planos
+
+    directorio_original = os.getcwd()
+    temporal = tempfile.mkdtemp(prefix="benchmark_planos_")
+    shutil.copy(EXCEL, temporal)
+    os.chdir(temporal)
+
+    medidor = Medidor()
+    medidor.envolver(catalogo_planos, 'obtener_catalogo', 'cargar_datos_excel')
+    medidor.envolver(render_planos.ServicioRender, 'renderizar', 'visualizar_plano')
+    medidor.envolver(almacen_respuestas.EscritorRespuestas, 'encolar', 'guardar_datos_usuario_excel')
+
+    reruns, por_sesion = [], []
+    try:
+        for numero in range(1, sesiones + 1):
+            sesion = Sesion(numero, medidor, timeout)
+            inicio = time.perf_counter()
+            sesion.recorrer()
+            segundos = time.perf_counter() - inicio
+
+            # Tiempo hasta que el escritor en segundo plano deja la respuesta en la base
+            inicio_guardado = time.perf_counter()
+            guardado = almacen_respuestas.obtener_escritor().esperar(timeout)
+            resumen = resumir(sesion.reruns)
+            resumen.update({
+                'sesion': numero,
+                'segundos_sesion': round(segundos, 6),
+                'segundos_persistencia': round(time.perf_counter() - inicio_guardado, 6),
+                'persistida': bool(guardado),
+                'rss_pico_mb': rss_pico_mb(),
+                'figuras': contar_figuras()
+            })
+            por_sesion.append(resumen)
+            reruns.extend(sesion.reruns)
+            render_planos.prefetch_render.cancelar(sesion.app.session_state['id_sesion'])
+    finally:
+        medidor.restaurar()
+        os.chdir(directorio_original)
+        shutil.rmtree(temporal, ignore_errors=True)
+
+    import streamlit
+    return {
+        'revision': revision_git(),
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'streamlit': streamlit.__version__,
+        'sesiones': por_sesion,
+        'total': resumir(reruns),
+        'rss_pico_mb': rss_pico_mb(),
+        'figuras': contar_figuras(),
+        'cache_render': render_planos.cache_render.estadisticas(),
+        'reruns': reruns
+    }
+
+
+def comparar(actual, anterior, tolerancia):
+    """Líneas con la variación de los totales respecto de `anterior` y si alguna supera la tolerancia"""
+    lineas, empeoro = [], False
+    metricas = [('segundos_total', actual['total'], anterior['total']),
+                ('segundos_p95', actual['total'], anterior['total'])]
+    for nombre in sorted(set(actual['total'].get('funciones', {})) | set(anterior['total'].get('funciones', {}))):
+        metricas.append((f"{nombre}.segundos",
+                         actual['total'].get('funciones', {}).get(nombre, {}),
+                         anterior['total'].get('funciones', {}).get(nombre, {})))
+
+    for nombre, nuevo, viejo in metricas:
+        clave = nombre.split('.')[-1]
+        valor, referencia = nuevo.get(clave, 0.0), viejo.get(clave, 0.0)
+        variacion = (valor - referencia) / referencia if referencia else 0.0
+        marca = ""
+        if variacion > tolerancia:
+            marca, empeoro = "  <-- empeora", True
+        lineas.append(f"{nombre:45s} {referencia:10.3f} -> {valor:10.3f}  ({variacion:+.1%}){marca}")
+    return lineas, empeoro
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sin navegador de una sesión completa de la encuesta")
+    parser.add_argument("--sesiones", type=int, default=3, help="Sesiones completas a recorrer (la primera, en frío)")
+    parser.add_argument("--salida", help="Archivo JSON de resultados (por defecto, salida estándar)")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior con el que comparar los totales")
+    parser.add_argument("--tolerancia", type=float, default=0.10,
+                        help="Empeoramiento relativo permitido al comparar (por defecto 0.10)")
+    parser.add_argument("--timeout", type=float, default=120, help="Segundos máximos por rerun")
+    args = parser.parse_args()
+
+    resultado = benchmark(args.sesiones, args.timeout)
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)
+        lineas, empeoro = comparar(resultado, anterior, args.tolerancia)
+        print(f"Comparación con {anterior.get('revision')} ({anterior.get('fecha')}):", file=sys.stderr)
+        for linea in lineas:
+            print(linea, file=sys.stderr)
+        if empeoro:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Prueba de carga y verificación del almacén de respuestas.
+
+Simula muchos encuestados que pulsan FINALIZAR a la vez: cada sesión es un
+hilo que arma un registro con selecciones al azar del catálogo y lo entrega
+por el mismo camino que guardar_datos_usuario_excel (EscritorRespuestas.encolar),
+y luego espera a que quede confirmado en la base.
+
+    python carga_respuestas.py [--sesiones 50] [--procesos 1] [--reenvios 0.1] [--salida resultado.json]
+
+Con --procesos > 1 las sesiones se reparten entre varios procesos que
+escriben en la misma base, como varias instancias de la aplicación. Cada
+proceso usa su propio archivo de pendientes. Una fracción --reenvios de las
+sesiones envía dos veces con la misma clave (un doble clic).
+
+Se informan el rendimiento (envíos confirmados por segundo) y las latencias
+p50/p99 de encolar (lo que espera la interfaz) y de confirmación en la base.
+Al terminar se revisa la base: ninguna sesión perdida ni duplicada, cada
+clave apunta a la fila con su registro y los Numero son únicos y sin huecos.
+El proceso termina con código 1 si alguna verificación falla.
+
+Por defecto trabaja sobre una base nueva en un directorio temporal; --db
+permite apuntar a otra (nunca usar la base de producción).
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from almacen_respuestas import COLUMNAS, AlmacenRespuestas, EscritorRespuestas
+
+VERSIONES = ['v1', 'v2', 'v3', 'v4', 'v5']
+ESPERA_CONSULTA = 0.002
+
+
+def planos_por_version(ruta_excel):
+    """IDs de planos de cada versión del catálogo (IDs ficticios si no se puede leer)"""
+    try:
+        from catalogo_planos import obtener_catalogo
+        catalogo = obtener_catalogo(ruta_excel)
+        return {v: list(catalogo.planos_ids(v)) or [1] for v in VERSIONES}
+    except Exception:
+        return {v: list(range(1, 25)) for v in VERSIONES}
+
+
+def generar_envios(sesiones, reenvios, planos, semilla, prefijo):
+    """Lista de (clave, registro, veces que se envía) con selecciones al azar"""
+    azar = random.Random(semilla)
+    envios = []
+    for i in range(sesiones):
+        registro = {
+            'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'Nombre_completo': f"{prefijo}-{i:05d}",
+            'Profesion': azar.choice(['Arquitecto', 'Ingeniero Civil', 'Constructor', 'Estudiante']),
+            'Anos_experiencia': azar.randint(0, 40),
+            'Institucion': azar.choice(['Universidad', 'Empresa', 'Municipalidad']),
+            'Correo_electronico': f"{prefijo}-{i:05d}@ejemplo.com",
+            'Telefono': '',
+        }
+        for version in VERSIONES:
+            registro[version.upper()] = azar.choice(planos[version])
+        envios.append((uuid.uuid4().hex, registro, 2 if azar.random() < reenvios else 1))
+    return envios
+
+
+def ejecutar_sesiones(ruta_db, ruta_pendientes, envios, inicio, timeout):
+    """
+    Trabajo de un proceso: lanza un hilo por sesión, todos a la vez en
+    `inicio` (time.time()), y devuelve las mediciones de cada envío.
+    """
+    escritor = EscritorRespuestas(AlmacenRespuestas(ruta_db, excel_previo=None), ruta_pendientes)
+    resultados = [None] * len(envios)
+
+    def sesion(indice, clave, registro, veces):
+        time.sleep(max(0.0, inicio - time.time()))
+        t0 = time.perf_counter()
+        for _ in range(veces):
+            escritor.encolar(clave, registro)
+        t_encolado = time.perf_counter()
+
+        limite = t0 + timeout
+        estado = escritor.estado_envio(clave)
+        while estado['estado'] != 'guardado' and time.perf_counter() < limite:
+            time.sleep(ESPERA_CONSULTA)
+            estado = escritor.estado_envio(clave)
+        t_guardado = time.perf_counter()
+
+        resultados[indice] = {
+            'clave': clave,
+            'numero': estado['numero'],
+            'encolar_ms': (t_encolado - t0) * 1000,
+            'guardado_ms': (t_guardado - t0) * 1000 if estado['estado'] == 'guardado' else None,
+            'fin': time.time()
+        }
+
+    hilos = [threading.Thread(target=sesion, args=(i, *envio)) for i, envio in enumerate(envios)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return resultados, escritor.estado()
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    valores = sorted(valores)
+    return round(valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))], 3)
+
+
+def verificar(ruta_db, envios, resultados, prefijo):
+    """Revisa la base tras la carga; devuelve la lista de problemas encontrados"""
+    problemas = []
+    conexion = sqlite3.connect(ruta_db)
+    conexion.row_factory = sqlite3.Row
+    try:
+        filas = {f['Numero']: dict(f) for f in conexion.execute(f"SELECT {', '.join(COLUMNAS)} FROM respuestas")}
+        claves = dict(conexion.execute("SELECT clave, Numero FROM envios").fetchall())
+    finally:
+        conexion.close()
+
+    # Numero únicos (clave primaria) y sin huecos en toda la tabla
+    numeros = sorted(filas)
+    if numeros and numeros != list(range(numeros[0], numeros[0] + len(numeros))):
+        faltantes = sorted(set(range(numeros[0], numeros[-1] + 1)) - set(numeros))
+        problemas.append(f"Numero con huecos: faltan {faltantes[:20]}")
+
+    # Cada sesión de esta carga aparece exactamente una vez
+    propias = [f for f in filas.values() if str(f['Nombre_completo']).startswith(f"{prefijo}-")]
+    por_nombre = {}
+    for fila in propias:
+        por_nombre.setdefault(fila['Nombre_completo'], []).append(fila['Numero'])
+    duplicadas = {n: v for n, v in por_nombre.items() if len(v) > 1}
+    if duplicadas:
+        problemas.append(f"{len(duplicadas)} sesiones duplicadas, p. ej. {list(duplicadas.items())[:5]}")
+
+    numero_informado = {r['clave']: r['numero'] for r in resultados}
+    perdidas = 0
+    for clave, registro, _ in envios:
+        numero = claves.get(clave)
+        if numero is None or registro['Nombre_completo'] not in por_nombre:
+            perdidas += 1
+            continue
+        fila = filas.get(numero)
+        if fila is None or any(str(fila[c]) != str(registro[c]) for c in registro):
+            problemas.append(f"La clave {clave} apunta al Numero {numero}, que no tiene su registro")
+        if numero_informado.get(clave) != numero:
+            problemas.append(f"La clave {clave} se informó con Numero {numero_informado.get(clave)} "
+                             f"pero está guardada con {numero}")
+    if perdidas:
+        problemas.append(f"{perdidas} sesiones perdidas")
+    if len(propias) != len(envios):
+        problemas.append(f"Se esperaban {len(envios)} filas de esta carga y hay {len(propias)}")
+    return problemas
+
+
+def cargar(sesiones=50, procesos=1, reenvios=0.1, ruta_db=None, excel="planos_ploteo.xlsx",
+           semilla=None, timeout=120):
+    """Ejecuta la carga y la verificación; devuelve el resultado como diccionario"""
+    temporal = None
+    if ruta_db is None:
+        temporal = tempfile.mkdtemp(prefix="carga_respuestas_")
+        ruta_db = os.path.join(temporal, "respuestas.db")
+    prefijo = f"carga-{uuid.uuid4().hex[:8]}"
+    semilla = random.randrange(1 << 30) if semilla is None else semilla
+
+    try:
+        AlmacenRespuestas(ruta_db, excel_previo=None)  # crea las tablas antes de que compitan los procesos
+        envios = generar_envios(sesiones, reenvios, planos_por_version(excel), semilla, prefijo)
+        partes = [envios[i::procesos] for i in range(procesos)]
+        directorio = os.path.dirname(os.path.abspath(ruta_db))
+        inicio = time.time() + 0.5 + 0.2 * procesos
+
+        if procesos == 1:
+            medidas = [ejecutar_sesiones(ruta_db, os.path.join(directorio, f"{prefijo}-0.jsonl"),
+                                         partes[0], inicio, timeout)]
+        else:
+            with ProcessPoolExecutor(max_workers=procesos) as pool:
+                futuros = [pool.submit(ejecutar_sesiones, ruta_db, os.path.join(directorio, f"{prefijo}-{i}.jsonl"),
+                                       parte, inicio, timeout)
+                           for i, parte in enumerate(partes)]
+                medidas = [f.result() for f in futuros]
+
+        resultados = [r for parte, _ in medidas for r in parte]
+        problemas = verificar(ruta_db, envios, resultados, prefijo)
+    finally:
+        if temporal is not None:
+            shutil.rmtree(temporal, ignore_errors=True)
+        else:
+            # Cada escritor usa su archivo por proceso (almacen_respuestas.archivo_de_proceso)
+            for i in range(procesos):
+                patron = os.path.join(os.path.dirname(os.path.abspath(ruta_db)), f"{prefijo}-{i}.*.jsonl")
+                for ruta in glob.glob(patron):
+                    if os.path.getsize(ruta) == 0:
+                        os.remove(ruta)
+
+    guardados = [r['guardado_ms'] for r in resultados if r['guardado_ms'] is not None]
+    duracion = max(r['fin'] for r in resultados) - inicio if resultados else 0.0
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'sesiones': sesiones,
+        'procesos': procesos,
+        'reenvios': sum(1 for _, _, veces in envios if veces > 1),
+        'semilla': semilla,
+        'confirmados': len(guardados),
+        'segundos': round(duracion, 3),
+        'envios_por_segundo': round(len(guardados) / duracion, 1) if duracion > 0 else None,
+        'encolar_ms': {'p50': percentil([r['encolar_ms'] for r in resultados], 50),
+                       'p99': percentil([r['encolar_ms'] for r in resultados], 99)},
+        'guardado_ms': {'p50': percentil(guardados, 50), 'p99': percentil(guardados, 99)},
+        'escritores': [estado for _, estado in medidas],
+        'problemas': problemas,
+        'correcto': not problemas
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga concurrente del almacén de respuestas")
+    parser.add_argument("--sesiones", type=int, default=50, help="Sesiones que pulsan FINALIZAR a la vez")
+    parser.add_argument("--procesos", type=int, default=1, help="Procesos entre los que se reparten las sesiones")
+    parser.add_argument("--reenvios", type=float, default=0.1,
+                        help="Fracción de sesiones que envían dos veces la misma clave")
+    parser.add_argument("--db", help="Base a usar (por defecto, una nueva en un directorio temporal)")
+    parser.add_argument("--excel", default="planos_ploteo.xlsx", help="Catálogo del que salen las selecciones")
+    parser.add_argument("--semilla", type=int, help="Semilla para repetir las mismas selecciones")
+    parser.add_argument("--timeout", type=float, default=120, help="Segundos máximos de espera por envío")
+    parser.add_argument("--salida", help="Archivo JSON de resultados (por defecto, salida estándar)")
+    args = parser.parse_args()
+
+    resultado = cargar(args.sesiones, max(1, args.procesos), args.reenvios, args.db, args.excel,
+                       args.semilla, args.timeout)
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+    for problema in resultado['problemas']:
+        print(f"ERROR: {problema}", file=sys.stderr)
+    if not resultado['correcto']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
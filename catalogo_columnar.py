@@ -0,0 +1,280 @@
+"""
+Catálogo de planos compilado a un formato binario columnar.
+
+planos_ploteo.xlsx sigue siendo la fuente que se edita, pero abrirlo con
+pandas/openpyxl y decodificar un JSON por celda es lento. Este módulo lo
+compila a un único archivo binario:
+
+    python catalogo_columnar.py [planos_ploteo.xlsx] [planos_ploteo.planos]
+
+El archivo contiene una cabecera JSON (tablas de textos, metadatos y hash de
+fila por plano y ubicación de cada arreglo) seguida de arreglos NumPy alineados:
+
+    vertices           float64 (V, 2)  vértices de todas las habitaciones
+    hab_offsets        int64   (H + 1) primer vértice de cada habitación
+    plano_offsets      int64   (P + 1) primera habitación de cada plano
+    hab_nombre         int32   (H)     índice en la tabla de nombres
+    hab_tipo           int32   (H)     índice en la tabla de Tipo_Funcional
+    hab_ancho          float64 (H)
+    hab_altura         float64 (H)
+    plano_version      int32   (P)     índice en la tabla de versiones
+    plano_id           int64   (P)
+    plano_num_hab      int64   (P)     columna Num_Habitaciones (-1 si falta)
+
+CatalogoColumnar lo abre con mmap de solo lectura, así que varios procesos
+que sirven la aplicación comparten las mismas páginas en memoria.
+"""
+import json
+import mmap
+import os
+import sys
+
+import numpy as np
+
+from catalogo_planos import EXCEL_PATH, CatalogoPlanos, hash_archivo
+from geometria_planos import GeometriaCatalogo
+
+MAGIA = b"PLANOS01"
+EXTENSION = ".planos"
+_ALINEACION = 64
+_COLUMNAS_BASE = {'Version', 'Plano_ID', 'Num_Habitaciones', 'Datos_Habitaciones', 'Habitaciones',
+                  'Area_Total', 'Areas_Por_Tipo', 'Caja', 'Centroides'}
+
+
+def ruta_compilada(ruta_excel=EXCEL_PATH):
+    """Ruta del archivo compilado que corresponde a un Excel"""
+    return os.path.splitext(ruta_excel)[0] + EXTENSION
+
+
+def _internar(tabla, indices, valor):
+    if valor not in indices:
+        indices[valor] = len(tabla)
+        tabla.append(valor)
+    return indices[valor]
+
+
+def _numero(valor, defecto):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return defecto
+
+
+def compilar(ruta_excel=EXCEL_PATH, ruta_salida=None, catalogo=None):
+    """Compila el Excel al formato columnar y devuelve la ruta escrita"""
+    import pandas as pd
+
+    ruta_salida = ruta_salida or ruta_compilada(ruta_excel)
+    if catalogo is None:
+        catalogo = CatalogoPlanos(pd.read_excel(ruta_excel), hash_archivo(ruta_excel), ruta_excel)
+
+    versiones, indices_version = [], {}
+    nombres, indices_nombre = [], {}
+    tipos, indices_tipo = [], {}
+    vertices, hab_offsets, plano_offsets = [], [0], [0]
+    hab_nombre, hab_tipo, hab_ancho, hab_altura = [], [], [], []
+    plano_version, plano_id, plano_num_hab = [], [], []
+    metadatos, invalidos, hashes = [], {}, []
+
+    for version in catalogo.versiones:
+        for pid in catalogo.planos_ids(version):
+            plano = catalogo.obtener(version, pid)
+            indice = len(plano_id)
+            plano_version.append(_internar(versiones, indices_version, version))
+            plano_id.append(int(pid))
+            num_hab = plano.get('Num_Habitaciones')
+            plano_num_hab.append(-1 if num_hab is None else int(num_hab))
+            metadatos.append({k: v for k, v in plano.items() if k not in _COLUMNAS_BASE})
+            hashes.append(catalogo.hash_plano(version, pid))
+
+            habitaciones = plano['Habitaciones']
+            if habitaciones is None:
+                # JSON inválido: se conserva el texto para reproducir el error al dibujar
+                invalidos[str(indice)] = plano.get('Datos_Habitaciones')
+                habitaciones = []
+
+            for hab in habitaciones:
+                hab_nombre.append(_internar(nombres, indices_nombre, hab.get('Nombre', 'Sin nombre')))
+                hab_tipo.append(_internar(tipos, indices_tipo, hab.get('Tipo_Funcional', 'Desconocido')))
+                hab_ancho.append(_numero(hab.get('Ancho'), np.nan))
+                hab_altura.append(_numero(hab.get('Altura'), np.nan))
+                vertices.extend(hab.get('Vertices', []) or [])
+                hab_offsets.append(len(vertices))
+            plano_offsets.append(len(hab_nombre))
+
+    arreglos = {
+        'vertices': np.asarray(vertices, dtype=np.float64).reshape(-1, 2),
+        'hab_offsets': np.asarray(hab_offsets, dtype=np.int64),
+        'plano_offsets': np.asarray(plano_offsets, dtype=np.int64),
+        'hab_nombre': np.asarray(hab_nombre, dtype=np.int32),
+        'hab_tipo': np.asarray(hab_tipo, dtype=np.int32),
+        'hab_ancho': np.asarray(hab_ancho, dtype=np.float64),
+        'hab_altura': np.asarray(hab_altura, dtype=np.float64),
+        'plano_version': np.asarray(plano_version, dtype=np.int32),
+        'plano_id': np.asarray(plano_id, dtype=np.int64),
+        'plano_num_hab': np.asarray(plano_num_hab, dtype=np.int64),
+    }
+
+    # Primero se calculan los desplazamientos relativos al inicio de los datos
+    ubicacion, desplazamiento = {}, 0
+    for nombre, arreglo in arreglos.items():
+        desplazamiento = -(-desplazamiento // _ALINEACION) * _ALINEACION
+        ubicacion[nombre] = [arreglo.dtype.str, list(arreglo.shape), desplazamiento]
+        desplazamiento += arreglo.nbytes
+
+    cabecera = json.dumps({
+        'firma': catalogo.firma,
+        'columnas': catalogo.columnas,
+        'versiones': versiones,
+        'nombres': nombres,
+        'tipos': tipos,
+        'metadatos': metadatos,
+        'invalidos': invalidos,
+        'hashes': hashes,
+        'arreglos': ubicacion
+    }, ensure_ascii=False, default=str).encode('utf-8')
+    inicio_datos = -(-(len(MAGIA) + 8 + len(cabecera)) // _ALINEACION) * _ALINEACION
+
+    temporal = f"{ruta_salida}.{os.getpid()}.tmp"
+    with open(temporal, 'wb') as f:
+        f.write(MAGIA)
+        f.write(len(cabecera).to_bytes(8, 'little'))
+        f.write(cabecera)
+        for nombre, arreglo in arreglos.items():
+            f.seek(inicio_datos + ubicacion[nombre][2])
+            f.write(np.ascontiguousarray(arreglo).tobytes())
+        f.truncate(inicio_datos + desplazamiento)
+    os.replace(temporal, ruta_salida)
+    return ruta_salida
+
+
+class CatalogoColumnar:
+    """
+    Catálogo de solo lectura sobre un archivo compilado, con la misma interfaz
+    que CatalogoPlanos. Los arreglos son vistas sobre el mmap; los
+    diccionarios de cada plano se arman la primera vez que se piden.
+    """
+
+    def __init__(self, ruta, ruta_excel=EXCEL_PATH):
+        self.ruta = ruta_excel
+        self.ruta_compilada = ruta
+        with open(ruta, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIA)] != MAGIA:
+            raise ValueError(f"{ruta} no es un catálogo de planos compilado")
+        largo = int.from_bytes(self._mmap[len(MAGIA):len(MAGIA) + 8], 'little')
+        inicio = len(MAGIA) + 8
+        cabecera = json.loads(self._mmap[inicio:inicio + largo].decode('utf-8'))
+        inicio_datos = -(-(inicio + largo) // _ALINEACION) * _ALINEACION
+
+        self.firma = cabecera['firma']
+        self.columnas = cabecera['columnas']
+        self.nombres = cabecera['nombres']
+        self.tipos = cabecera['tipos']
+        self._tabla_versiones = cabecera['versiones']
+        self._metadatos = cabecera['metadatos']
+        self._invalidos = cabecera['invalidos']
+        # Archivos compilados antes de que se guardaran los hashes de fila: sin reutilización al recargar
+        self._hashes = cabecera.get('hashes') or [None] * len(cabecera['metadatos'])
+
+        for nombre, (dtype, forma, desplazamiento) in cabecera['arreglos'].items():
+            cantidad = int(np.prod(forma)) if forma else 1
+            arreglo = np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=cantidad,
+                                    offset=inicio_datos + desplazamiento).reshape(forma)
+            setattr(self, nombre, arreglo)
+
+        self._indice = {}
+        self._ids_por_version = {}
+        for i, (v, pid) in enumerate(zip(self.plano_version.tolist(), self.plano_id.tolist())):
+            version = self._tabla_versiones[v]
+            self._indice[(version, pid)] = i
+            self._ids_por_version.setdefault(version, []).append(pid)
+        self.versiones = sorted(self._ids_por_version)
+        self._planos = {}
+        self.geometria = GeometriaCatalogo(self.vertices, self.hab_offsets, self.plano_offsets,
+                                           self.hab_tipo, self.tipos)
+
+    def __len__(self):
+        return len(self._indice)
+
+    def planos_ids(self, version):
+        """IDs ordenados de los planos de una versión"""
+        return self._ids_por_version.get(version, [])
+
+    def indice(self, version, plano_id):
+        """Posición del plano en los arreglos, o None si no existe"""
+        return self._indice.get((version, plano_id))
+
+    def vertices_plano(self, indice):
+        """Vértices del plano y desplazamientos de sus habitaciones dentro de ellos (vistas, sin copia)"""
+        h0, h1 = self.plano_offsets[indice], self.plano_offsets[indice + 1]
+        offsets = self.hab_offsets[h0:h1 + 1]
+        return self.vertices[offsets[0]:offsets[-1]], offsets - offsets[0]
+
+    def _armar_plano(self, indice):
+        h0, h1 = int(self.plano_offsets[indice]), int(self.plano_offsets[indice + 1])
+        habitaciones = []
+        for h in range(h0, h1):
+            v0, v1 = int(self.hab_offsets[h]), int(self.hab_offsets[h + 1])
+            hab = {
+                'Nombre': self.nombres[self.hab_nombre[h]],
+                'Tipo_Funcional': self.tipos[self.hab_tipo[h]],
+                'Vertices': self.vertices[v0:v1].tolist()
+            }
+            if not np.isnan(self.hab_ancho[h]):
+                hab['Ancho'] = float(self.hab_ancho[h])
+            if not np.isnan(self.hab_altura[h]):
+                hab['Altura'] = float(self.hab_altura[h])
+            habitaciones.append(hab)
+
+        num_hab = int(self.plano_num_hab[indice])
+        plano = {
+            'Version': self._tabla_versiones[self.plano_version[indice]],
+            'Plano_ID': int(self.plano_id[indice]),
+            'Num_Habitaciones': None if num_hab < 0 else num_hab,
+            'Habitaciones': habitaciones
+        }
+        plano.update(self._metadatos[indice])
+        plano.update(self.geometria.resumen(indice))
+        if str(indice) in self._invalidos:
+            plano['Habitaciones'] = None
+            plano['Datos_Habitaciones'] = self._invalidos[str(indice)]
+        return plano
+
+    def obtener(self, version, plano_id):
+        """Datos de un plano, o None si no existe"""
+        indice = self._indice.get((version, plano_id))
+        if indice is None:
+            return None
+        plano = self._planos.get(indice)
+        if plano is None:
+            plano = self._planos.setdefault(indice, self._armar_plano(indice))
+        return plano
+
+    def hash_plano(self, version, plano_id):
+        """Hash de la fila del plano en el Excel (ver catalogo_planos.hash_fila), o None"""
+        indice = self._indice.get((version, plano_id))
+        return None if indice is None else self._hashes[indice]
+
+    def __iter__(self):
+        for version in self.versiones:
+            for plano_id in self.planos_ids(version):
+                yield self.obtener(version, plano_id)
+
+
+def abrir_si_vigente(ruta_excel, firma):
+    """Abre el catálogo compilado del Excel si existe y corresponde a `firma`; si no, None"""
+    ruta = ruta_compilada(ruta_excel)
+    if not os.path.exists(ruta):
+        return None
+    try:
+        catalogo = CatalogoColumnar(ruta, ruta_excel)
+    except (OSError, ValueError):
+        return None
+    return catalogo if catalogo.firma == firma else None
+
+
+if __name__ == "__main__":
+    excel = sys.argv[1] if len(sys.argv) > 1 else EXCEL_PATH
+    salida = sys.argv[2] if len(sys.argv) > 2 else None
+    print(f"Catálogo compilado en {compilar(excel, salida)}")
@@ -0,0 +1,280 @@
+"""
+Catálogo de planos compartido por todo el proceso.
+
+Streamlit vuelve a ejecutar app_modelacion.py en cada interacción, pero los
+módulos importados se conservan en memoria. Por eso el catálogo vive aquí:
+se lee planos_ploteo.xlsx una sola vez por proceso y solo se vuelve a leer
+cuando cambia el archivo (fecha de modificación y, si esta cambió, su hash).
+
+Un hilo vigilante por archivo revisa cada INTERVALO_VIGILANCIA segundos si
+cambió y, en ese caso, arma en segundo plano una generación nueva del
+catálogo y la publica de una sola vez: las peticiones nunca esperan la
+lectura del Excel. La generación nueva reutiliza los planos cuyo hash de
+fila (hash_plano, que también guarda el catálogo compilado) no cambió, con
+su JSON ya decodificado y su geometría ya calculada, y solo procesa los
+nuevos o modificados.
+
+Se conservan las últimas GENERACIONES_RETENIDAS generaciones: una sesión que
+empezó con una puede seguir pidiéndola por su firma y ver siempre el mismo
+catálogo. Cuando una generación se descarta, los planos cuyo hash ya no está
+en ninguna de las conservadas se avisan a las funciones registradas con
+al_descartar_planos (p. ej. para borrar sus imágenes renderizadas).
+
+    MODELACION_VIGILAR_CATALOGO=0   sin hilo vigilante (se revisa con os.stat en cada acceso)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from geometria_planos import GeometriaCatalogo, aplanar
+from metricas import contar, medir
+
+EXCEL_PATH = "planos_ploteo.xlsx"
+VIGILAR = os.environ.get("MODELACION_VIGILAR_CATALOGO", "1") != "0"
+INTERVALO_VIGILANCIA = 2.0
+GENERACIONES_RETENIDAS = 3
+
+
+def _valor_nativo(valor):
+    """Convierte escalares de numpy/pandas a tipos nativos de Python"""
+    try:
+        if pd.isna(valor):
+            return None
+    except (TypeError, ValueError):
+        return valor
+    if hasattr(valor, 'item'):
+        return valor.item()
+    return valor
+
+
+def hash_archivo(ruta):
+    """Hash SHA-256 del contenido de un archivo, leído por bloques"""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def hash_fila(fila):
+    """Hash del contenido de una fila del Excel (ya con valores nativos)"""
+    texto = json.dumps(fila, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+class CatalogoPlanos:
+    """
+    Catálogo de solo lectura indexado por (Version, Plano_ID).
+
+    Cada plano es un diccionario con las columnas del Excel y, además, la clave
+    'Habitaciones' con Datos_Habitaciones ya decodificado (None si el JSON es
+    inválido) y las claves de GeometriaCatalogo.resumen (áreas, caja y
+    centroides). Nadie debe modificar estos diccionarios: se comparten entre
+    todas las sesiones y entre generaciones del catálogo.
+
+    Con `anterior` (otra generación del mismo archivo, de cualquiera de los dos
+    tipos de catálogo) se reutilizan los planos cuya fila tiene el mismo hash;
+    `geometria` cubre entonces solo los planos procesados en esta generación.
+    """
+
+    def __init__(self, df, firma, ruta=EXCEL_PATH, anterior=None):
+        self.firma = firma
+        self.ruta = ruta
+        self.columnas = list(df.columns)
+        self._planos = {}
+        self._ids_por_version = {}
+        self._hashes = {}  # {(Version, Plano_ID): hash de la fila}
+        nuevos = []
+
+        if 'Version' in self.columnas and 'Plano_ID' in self.columnas:
+            for fila in df.to_dict('records'):
+                fila = {k: _valor_nativo(v) for k, v in fila.items()}
+                clave = (fila['Version'], fila['Plano_ID'])
+                # Igual que .iloc[0]: ante IDs repetidos gana la primera fila
+                if clave in self._planos:
+                    continue
+                contenido = hash_fila(fila)
+                if anterior is not None and anterior.hash_plano(*clave) == contenido:
+                    plano = anterior.obtener(*clave)
+                else:
+                    plano = fila
+                    try:
+                        with medir("decodificar_habitaciones", "Decodificación del JSON de habitaciones de un plano"):
+                            plano['Habitaciones'] = json.loads(plano.get('Datos_Habitaciones') or '[]')
+                    except (TypeError, ValueError):
+                        plano['Habitaciones'] = None
+                    nuevos.append(plano)
+                self._planos[clave] = plano
+                self._hashes[clave] = contenido
+                self._ids_por_version.setdefault(plano['Version'], []).append(plano['Plano_ID'])
+
+        for ids in self._ids_por_version.values():
+            ids.sort()
+        self.versiones = sorted(self._ids_por_version)
+        self.reutilizados = len(self._planos) - len(nuevos)
+
+        # Áreas, centroides y cajas de los planos nuevos en una sola pasada
+        self.geometria = GeometriaCatalogo(*aplanar(nuevos))
+        for indice, plano in enumerate(nuevos):
+            plano.update(self.geometria.resumen(indice))
+
+    def __len__(self):
+        return len(self._planos)
+
+    def planos_ids(self, version):
+        """IDs ordenados de los planos de una versión"""
+        return self._ids_por_version.get(version, [])
+
+    def obtener(self, version, plano_id):
+        """Datos de un plano, o None si no existe"""
+        return self._planos.get((version, plano_id))
+
+    def __iter__(self):
+        return iter(self._planos.values())
+
+    def hash_plano(self, version, plano_id):
+        """Hash de la fila del plano en el Excel (ver hash_fila), o None si no existe"""
+        return self._hashes.get((version, plano_id))
+
+
+_lock = threading.Lock()
+_cargados = {}      # {ruta absoluta: (marca de stat, catalogo vigente)}
+_generaciones = {}  # {ruta absoluta: OrderedDict(firma: catalogo)}, la vigente al final
+_vigilantes = {}    # {ruta absoluta: hilo}
+_al_descartar = {}  # {nombre: funcion(planos)}
+
+
+def al_descartar_planos(nombre, funcion):
+    """
+    Registra `funcion(planos)`, que se llama con los planos (diccionarios) que
+    dejan de estar en todas las generaciones conservadas del catálogo
+    """
+    _al_descartar[nombre] = funcion
+
+
+def _avisar_descartados(planos):
+    for funcion in list(_al_descartar.values()):
+        try:
+            funcion(planos)
+        except Exception:
+            pass
+
+
+def _descartados(viejo, conservados):
+    """
+    Planos de `viejo` cuyo hash no está en ninguno de los catálogos
+    `conservados` (sin hash, por ejemplo de un compilado anterior, se
+    comparan por identidad)
+    """
+    descartados = []
+    for version in viejo.versiones:
+        for plano_id in viejo.planos_ids(version):
+            contenido = viejo.hash_plano(version, plano_id)
+            if contenido is not None:
+                if any(c.hash_plano(version, plano_id) == contenido for c in conservados):
+                    continue
+            else:
+                plano = viejo.obtener(version, plano_id)
+                if any(c.obtener(version, plano_id) is plano for c in conservados):
+                    continue
+            descartados.append(viejo.obtener(version, plano_id))
+    return descartados
+
+
+def _marca(clave):
+    stat = os.stat(clave)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _revisar(clave, ruta):
+    """Publica una generación nueva si el archivo cambió; devuelve la vigente"""
+    marca = _marca(clave)
+    actual = _cargados.get(clave)
+    if actual is not None and actual[0] == marca:
+        return actual[1]
+
+    descartados = []
+    with _lock:
+        actual = _cargados.get(clave)
+        if actual is not None and actual[0] == marca:
+            return actual[1]
+
+        firma = hash_archivo(clave)
+        if actual is not None and actual[1].firma == firma:
+            # Se tocó el archivo pero el contenido es el mismo
+            _cargados[clave] = (marca, actual[1])
+            return actual[1]
+
+        # Si hay una versión compilada del mismo contenido, se mapea en lugar de leer el Excel
+        from catalogo_columnar import abrir_si_vigente
+        with medir("cargar_catalogo", "Lectura del catálogo tras un cambio del archivo"):
+            catalogo = abrir_si_vigente(ruta, firma)
+            if catalogo is None:
+                anterior = actual[1] if actual is not None else None
+                catalogo = CatalogoPlanos(pd.read_excel(clave), firma, ruta, anterior)
+        contar("recargas_catalogo", ayuda="Veces que se publicó una generación nueva del catálogo")
+        contar("planos_recargados", len(catalogo) - getattr(catalogo, 'reutilizados', 0),
+               ayuda="Planos nuevos o modificados procesados al recargar el catálogo")
+
+        generaciones = _generaciones.setdefault(clave, OrderedDict())
+        generaciones.pop(firma, None)
+        generaciones[firma] = catalogo
+        viejas = []
+        while len(generaciones) > GENERACIONES_RETENIDAS:
+            viejas.append(generaciones.popitem(last=False)[1])
+        for vieja in viejas:
+            descartados.extend(_descartados(vieja, list(generaciones.values())))
+        # Publicación atómica: las peticiones ven la generación anterior o la nueva completa
+        _cargados[clave] = (marca, catalogo)
+
+    if descartados:
+        _avisar_descartados(descartados)
+    return catalogo
+
+
+def _vigilar(clave, ruta):
+    while True:
+        time.sleep(INTERVALO_VIGILANCIA)
+        try:
+            _revisar(clave, ruta)
+        except Exception:
+            # Archivo a medio escribir o borrado: se sigue con la generación vigente
+            pass
+
+
+def _iniciar_vigilante(clave, ruta):
+    if not VIGILAR or clave in _vigilantes:
+        return
+    with _lock:
+        if clave not in _vigilantes:
+            hilo = threading.Thread(target=_vigilar, args=(clave, ruta), name="vigilante_catalogo", daemon=True)
+            _vigilantes[clave] = hilo
+            hilo.start()
+
+
+def obtener_catalogo(ruta=EXCEL_PATH, firma=None):
+    """
+    Devuelve el catálogo vigente para `ruta` o, con `firma`, esa generación
+    si todavía se conserva (si no, la vigente).
+
+    La primera vez se lee el archivo y se lanza el hilo vigilante; después
+    las recargas ocurren en ese hilo y aquí no se hace E/S (sin vigilante,
+    solo un os.stat si el archivo no cambió). Cuando cambia, se usa el
+    catálogo compilado por catalogo_columnar.py si corresponde al mismo
+    contenido. Lanza FileNotFoundError si el archivo no existe.
+    """
+    clave = os.path.abspath(ruta)
+    actual = _cargados.get(clave)
+    if actual is None or clave not in _vigilantes:
+        catalogo = _revisar(clave, ruta)
+        _iniciar_vigilante(clave, ruta)
+    else:
+        catalogo = actual[1]
+    if firma is not None and firma != catalogo.firma:
+        return _generaciones.get(clave, {}).get(firma, catalogo)
+    return catalogo
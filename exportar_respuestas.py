@@ -0,0 +1,234 @@
+"""
+Exportación de las respuestas a XLSX, CSV o Parquet con memoria constante.
+
+Las respuestas se leen del almacén por lotes (en orden de Numero) y cada
+lote se escribe de inmediato: nunca se arma una tabla con todo el historial.
+El XLSX usa el modo de solo escritura de openpyxl, el CSV se escribe por
+lotes de filas y el Parquet como un grupo de filas por lote (con pyarrow).
+
+    python exportar_respuestas.py [Respuestas.xlsx] [--formato xlsx|csv|parquet]
+                                  [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD] [--version v3 ...]
+
+Las columnas son las del registro de guardar_datos_usuario_excel
+(almacen_respuestas.COLUMNAS). Con --version solo se exportan las columnas
+de esas versiones y las respuestas que eligieron un plano en alguna de ellas.
+Las fechas son inclusivas.
+
+ExportacionTemporal deja la exportación en un archivo temporal para que la
+aplicación la ofrezca como descarga sin cargarla en el estado de la sesión.
+"""
+import argparse
+import csv
+import json
+import os
+import tempfile
+import weakref
+from datetime import date, datetime, timedelta
+
+from almacen_respuestas import ARCHIVO_EXCEL, COLUMNAS, obtener_almacen
+
+FORMATOS = ('xlsx', 'csv', 'parquet')
+VERSIONES = ['v1', 'v2', 'v3', 'v4', 'v5']
+LOTE = 500
+_COLUMNAS_ENTERAS = {'Numero', 'Anos_experiencia'}
+
+
+def formato_de_ruta(ruta):
+    """Formato deducido de la extensión del archivo (xlsx si no se reconoce)"""
+    extension = os.path.splitext(ruta)[1].lower().lstrip('.')
+    return extension if extension in FORMATOS else 'xlsx'
+
+
+def limites_fechas(desde=None, hasta=None):
+    """
+    Convierte un rango inclusivo de fechas (date, datetime o texto) a los
+    límites [desde, hasta) que usa AlmacenRespuestas.iterar.
+    """
+    def instante(valor):
+        """(datetime, True si el valor era un día completo)"""
+        if isinstance(valor, datetime):
+            return valor, False
+        if isinstance(valor, date):
+            return datetime.combine(valor, datetime.min.time()), True
+        return datetime.fromisoformat(str(valor)), len(str(valor)) <= 10
+
+    formato = "%Y-%m-%d %H:%M:%S"
+    desde_fecha = hasta_fecha = None
+    if desde is not None:
+        desde_fecha = instante(desde)[0].strftime(formato)
+    if hasta is not None:
+        fin, dia_completo = instante(hasta)
+        # Timestamp tiene resolución de segundos
+        hasta_fecha = (fin + (timedelta(days=1) if dia_completo else timedelta(seconds=1))).strftime(formato)
+    return desde_fecha, hasta_fecha
+
+
+def columnas_exportadas(versiones=None):
+    """Columnas del archivo; con `versiones`, sin las de las demás versiones"""
+    if not versiones:
+        return list(COLUMNAS)
+    excluidas = {v.upper() for v in VERSIONES} - {v.upper() for v in versiones}
+    return [c for c in COLUMNAS if c not in excluidas]
+
+
+def _eligio(fila, versiones):
+    return any(fila.get(v.upper()) not in (None, '', 'No seleccionado') for v in versiones)
+
+
+def _filtrar_detalle(texto, versiones):
+    try:
+        detalle = json.loads(texto)
+    except (TypeError, ValueError):
+        return texto
+    return json.dumps({v: e for v, e in detalle.items() if v in versiones})
+
+
+def lotes_respuestas(almacen=None, desde=None, hasta=None, versiones=None, lote=LOTE):
+    """Genera listas de hasta `lote` filas (listas en el orden de columnas_exportadas)"""
+    almacen = almacen or obtener_almacen()
+    columnas = columnas_exportadas(versiones)
+    desde_fecha, hasta_fecha = limites_fechas(desde, hasta)
+    actual = []
+    for fila in almacen.iterar(lote=lote, desde_fecha=desde_fecha, hasta_fecha=hasta_fecha):
+        if versiones:
+            if not _eligio(fila, versiones):
+                continue
+            for columna in ('Detalle_Torneos', 'Asignacion_Grupos'):
+                if fila.get(columna):
+                    fila[columna] = _filtrar_detalle(fila[columna], versiones)
+        actual.append([fila.get(c) for c in columnas])
+        if len(actual) >= lote:
+            yield actual
+            actual = []
+    if actual:
+        yield actual
+
+
+def escribir_xlsx(destino, columnas, lotes):
+    from openpyxl import Workbook
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet("Respuestas")
+    hoja.append(columnas)
+    total = 0
+    for filas in lotes:
+        for fila in filas:
+            hoja.append(fila)
+        total += len(filas)
+    libro.save(destino)
+    return total
+
+
+def escribir_csv(destino, columnas, lotes):
+    total = 0
+    with open(destino, 'w', newline='', encoding='utf-8-sig') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(columnas)
+        for filas in lotes:
+            escritor.writerows(filas)
+            total += len(filas)
+    return total
+
+
+def _entero(valor):
+    try:
+        return None if valor is None or valor == '' else int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def escribir_parquet(destino, columnas, lotes):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    esquema = pa.schema([(c, pa.int64() if c in _COLUMNAS_ENTERAS else pa.string()) for c in columnas])
+    total = 0
+    with pq.ParquetWriter(destino, esquema) as escritor:
+        for filas in lotes:
+            datos = {}
+            for i, columna in enumerate(columnas):
+                valores = [fila[i] for fila in filas]
+                if columna in _COLUMNAS_ENTERAS:
+                    datos[columna] = [_entero(v) for v in valores]
+                else:
+                    datos[columna] = [None if v is None else str(v) for v in valores]
+            escritor.write_table(pa.table(datos, schema=esquema))
+            total += len(filas)
+        if total == 0:
+            escritor.write_table(esquema.empty_table())
+    return total
+
+
+_ESCRITORES = {'xlsx': escribir_xlsx, 'csv': escribir_csv, 'parquet': escribir_parquet}
+
+
+def exportar(destino=ARCHIVO_EXCEL, formato=None, desde=None, hasta=None, versiones=None, almacen=None, lote=LOTE):
+    """
+    Exporta las respuestas a `destino` y devuelve la cantidad exportada. El
+    archivo se escribe aparte y se renombra al terminar, así nunca queda a medias.
+    """
+    formato = formato or formato_de_ruta(destino)
+    if formato not in _ESCRITORES:
+        raise ValueError(f"Formato no soportado: {formato} (opciones: {', '.join(FORMATOS)})")
+    temporal = f"{destino}.{os.getpid()}.tmp"
+    try:
+        total = _ESCRITORES[formato](temporal, columnas_exportadas(versiones),
+                                     lotes_respuestas(almacen, desde, hasta, versiones, lote))
+        os.replace(temporal, destino)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    return total
+
+
+def _borrar_archivo(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+
+class ExportacionTemporal:
+    """
+    Exportación escrita en un archivo temporal. El archivo se borra con
+    borrar(), cuando el objeto se descarta (p. ej. al cerrarse la sesión de
+    Streamlit que lo guarda) o al terminar el proceso.
+    """
+
+    def __init__(self, formato, desde=None, hasta=None, versiones=None, almacen=None):
+        descriptor, self.ruta = tempfile.mkstemp(suffix=f".{formato}")
+        os.close(descriptor)
+        self.borrar = weakref.finalize(self, _borrar_archivo, self.ruta)
+        try:
+            self.total = exportar(self.ruta, formato, desde, hasta, versiones, almacen)
+        except BaseException:
+            self.borrar()
+            raise
+
+    def lector(self):
+        """
+        Función sin argumentos que devuelve el contenido del archivo (para
+        st.download_button, que la llama solo cuando se pide la descarga)
+        """
+        ruta = self.ruta
+
+        def leer():
+            with open(ruta, 'rb') as f:
+                return f.read()
+        return leer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta las respuestas de la encuesta")
+    parser.add_argument("destino", nargs="?", default=ARCHIVO_EXCEL, help=f"Archivo de salida (por defecto {ARCHIVO_EXCEL})")
+    parser.add_argument("--formato", choices=FORMATOS, help="Formato (por defecto, según la extensión)")
+    parser.add_argument("--desde", help="Primera fecha incluida (AAAA-MM-DD)")
+    parser.add_argument("--hasta", help="Última fecha incluida (AAAA-MM-DD)")
+    parser.add_argument("--version", dest="versiones", nargs="+", choices=VERSIONES,
+                        help="Solo estas versiones")
+    args = parser.parse_args()
+
+    total = exportar(args.destino, args.formato, args.desde, args.hasta, args.versiones)
+    print(f"{total} respuestas exportadas a {args.destino}")
+
+
+if __name__ == "__main__":
+    main()
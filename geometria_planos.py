@@ -0,0 +1,115 @@
+"""
+Geometría precalculada de todos los planos del catálogo.
+
+Al cargar el catálogo se hace una sola pasada vectorizada con NumPy sobre los
+vértices de todas las habitaciones de todos los planos para obtener:
+
+- por habitación: área (fórmula del área de Gauss), centroide del polígono y
+  caja envolvente;
+- por plano: área total, caja envolvente y área total por Tipo_Funcional.
+
+El dibujo usa estos centroides para ubicar las etiquetas y las tarjetas
+muestran las áreas sin recalcular nada en cada rerun.
+"""
+import numpy as np
+
+
+def aplanar(planos):
+    """
+    Aplana una lista de planos (diccionarios con 'Habitaciones') a arreglos:
+    vertices (V, 2), hab_offsets (H + 1), plano_offsets (P + 1), hab_tipo (H)
+    y la tabla de tipos.
+    """
+    vertices, hab_offsets, plano_offsets = [], [0], [0]
+    hab_tipo, tipos, indices_tipo = [], [], {}
+    for plano in planos:
+        for hab in plano.get('Habitaciones') or []:
+            tipo = hab.get('Tipo_Funcional', 'Desconocido')
+            if tipo not in indices_tipo:
+                indices_tipo[tipo] = len(tipos)
+                tipos.append(tipo)
+            hab_tipo.append(indices_tipo[tipo])
+            vertices.extend(hab.get('Vertices', []) or [])
+            hab_offsets.append(len(vertices))
+        plano_offsets.append(len(hab_tipo))
+    return (np.asarray(vertices, dtype=np.float64).reshape(-1, 2),
+            np.asarray(hab_offsets, dtype=np.int64),
+            np.asarray(plano_offsets, dtype=np.int64),
+            np.asarray(hab_tipo, dtype=np.int64),
+            tipos)
+
+
+class GeometriaCatalogo:
+    """Áreas, centroides y cajas envolventes de todas las habitaciones y planos"""
+
+    def __init__(self, vertices, hab_offsets, plano_offsets, hab_tipo, tipos):
+        self.tipos = list(tipos)
+        self.hab_offsets = hab_offsets
+        self.plano_offsets = plano_offsets
+        num_hab = len(hab_offsets) - 1
+        num_planos = len(plano_offsets) - 1
+
+        conteos = np.diff(hab_offsets)
+        con_vertices = conteos > 0
+        inicios = hab_offsets[:-1][con_vertices]
+        x, y = vertices[:, 0], vertices[:, 1]
+
+        # Índice del vértice siguiente dentro de cada polígono (el último vuelve al primero)
+        siguiente = np.arange(1, len(vertices) + 1)
+        siguiente[hab_offsets[1:][con_vertices] - 1] = inicios
+        xs, ys = x[siguiente], y[siguiente]
+        cruz = x * ys - xs * y
+
+        def sumar(valores):
+            total = np.zeros(num_hab)
+            if inicios.size:
+                total[con_vertices] = np.add.reduceat(valores, inicios)
+            return total
+
+        area_firmada = 0.5 * sumar(cruz)
+        self.hab_area = np.abs(area_firmada)
+
+        # Centroide del polígono; si el área es nula, el promedio de los vértices
+        with np.errstate(divide='ignore', invalid='ignore'):
+            media_x = sumar(x) / conteos
+            media_y = sumar(y) / conteos
+            cx = sumar((x + xs) * cruz) / (6 * area_firmada)
+            cy = sumar((y + ys) * cruz) / (6 * area_firmada)
+        degenerado = np.isclose(area_firmada, 0)
+        self.hab_centroide = np.column_stack((np.where(degenerado, media_x, cx), np.where(degenerado, media_y, cy)))
+
+        self.hab_bbox = np.full((num_hab, 4), np.nan)  # xmin, ymin, xmax, ymax
+        if inicios.size:
+            self.hab_bbox[con_vertices, 0] = np.minimum.reduceat(x, inicios)
+            self.hab_bbox[con_vertices, 1] = np.minimum.reduceat(y, inicios)
+            self.hab_bbox[con_vertices, 2] = np.maximum.reduceat(x, inicios)
+            self.hab_bbox[con_vertices, 3] = np.maximum.reduceat(y, inicios)
+
+        plano_de_hab = np.repeat(np.arange(num_planos), np.diff(plano_offsets))
+        self.plano_area = np.bincount(plano_de_hab, weights=self.hab_area, minlength=num_planos)
+        self.area_por_tipo = np.zeros((num_planos, len(self.tipos)))
+        np.add.at(self.area_por_tipo, (plano_de_hab, hab_tipo), self.hab_area)
+
+        self.plano_bbox = np.full((num_planos, 4), np.nan)
+        for col, funcion in ((0, np.fmin), (1, np.fmin), (2, np.fmax), (3, np.fmax)):
+            funcion.at(self.plano_bbox[:, col], plano_de_hab, self.hab_bbox[:, col])
+
+    def rango_habitaciones(self, indice):
+        """Habitaciones (inicio, fin) del plano en la posición `indice`"""
+        return int(self.plano_offsets[indice]), int(self.plano_offsets[indice + 1])
+
+    def centroides(self, indice):
+        """Centroides de las habitaciones con vértices del plano, en orden"""
+        h0, h1 = self.rango_habitaciones(indice)
+        con_vertices = np.diff(self.hab_offsets[h0:h1 + 1]) > 0
+        return self.hab_centroide[h0:h1][con_vertices]
+
+    def resumen(self, indice):
+        """Datos del plano listos para guardar junto a él (solo tipos nativos de Python)"""
+        areas = self.area_por_tipo[indice]
+        return {
+            'Area_Total': round(float(self.plano_area[indice]), 3),
+            'Areas_Por_Tipo': {self.tipos[t]: round(float(a), 3) for t, a in enumerate(areas) if a > 0},
+            'Caja': [round(float(v), 3) for v in self.plano_bbox[indice]],
+            'Centroides': np.round(self.centroides(indice), 4).tolist()
+        }
@@ -0,0 +1,230 @@
+"""
+Métricas de tiempo y contadores del proceso, en formato de texto de Prometheus.
+
+Los puntos calientes de la aplicación se envuelven con `medir`, que acumula
+la duración en un histograma de cubetas fijas; `contar` suma a un contador.
+Ambos cuestan un par de llamadas a perf_counter y un lock, así que pueden
+quedar activos siempre. Los módulos registran además colectores que
+devuelven valores instantáneos (tamaño de la caché de renders, cola del
+escritor de respuestas, ...).
+
+Las métricas son por proceso. Se pueden leer de dos formas:
+
+- en la página de administración de la aplicación (?admin=<token>, con el
+  token en la variable de entorno MODELACION_ADMIN_TOKEN);
+- en un archivo de texto que se reescribe cada MODELACION_METRICAS_INTERVALO
+  segundos (15 por defecto) si se define MODELACION_METRICAS_ARCHIVO, pensado
+  para el textfile collector de node_exporter. "{pid}" en la ruta se
+  reemplaza por el PID del proceso.
+"""
+import bisect
+import os
+import threading
+import time
+from functools import wraps
+
+PREFIJO = "modelacion"
+CUBETAS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histograma:
+    """Distribución de duraciones en segundos con cubetas fijas"""
+
+    def __init__(self, ayuda="", cubetas=CUBETAS):
+        self.ayuda = ayuda
+        self.cubetas = cubetas
+        self._conteos = [0] * (len(cubetas) + 1)
+        self._suma = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, segundos):
+        indice = bisect.bisect_left(self.cubetas, segundos)
+        with self._lock:
+            self._conteos[indice] += 1
+            self._suma += segundos
+
+    def instantanea(self):
+        """(conteos por cubeta, suma, cantidad) tomados de forma consistente"""
+        with self._lock:
+            conteos = list(self._conteos)
+            suma = self._suma
+        return conteos, suma, sum(conteos)
+
+    def cuantil(self, q):
+        """Cuantil aproximado: límite superior de la cubeta que lo contiene"""
+        conteos, _, total = self.instantanea()
+        if not total:
+            return None
+        objetivo, acumulado = q * total, 0
+        for limite, conteo in zip(self.cubetas + (float('inf'),), conteos):
+            acumulado += conteo
+            if acumulado >= objetivo:
+                return limite
+        return float('inf')
+
+
+class Contador:
+    """Valor que solo crece"""
+
+    def __init__(self, ayuda=""):
+        self.ayuda = ayuda
+        self.valor = 0
+        self._lock = threading.Lock()
+
+    def sumar(self, cantidad=1):
+        with self._lock:
+            self.valor += cantidad
+
+
+class RegistroMetricas:
+    """Histogramas, contadores y colectores de un proceso"""
+
+    def __init__(self, prefijo=PREFIJO):
+        self.prefijo = prefijo
+        self.histogramas = {}
+        self.contadores = {}
+        self.colectores = {}
+        self._lock = threading.Lock()
+
+    def histograma(self, nombre, ayuda=""):
+        histograma = self.histogramas.get(nombre)
+        if histograma is None:
+            with self._lock:
+                histograma = self.histogramas.setdefault(nombre, Histograma(ayuda))
+        return histograma
+
+    def contador(self, nombre, ayuda=""):
+        contador = self.contadores.get(nombre)
+        if contador is None:
+            with self._lock:
+                contador = self.contadores.setdefault(nombre, Contador(ayuda))
+        return contador
+
+    def registrar_colector(self, nombre, funcion):
+        """`funcion()` devuelve {métrica: valor numérico}; se consulta al exportar"""
+        self.colectores[nombre] = funcion
+
+    def valores_colectores(self):
+        """{nombre de métrica: valor} de todos los colectores (se omiten los que fallan)"""
+        valores = {}
+        for nombre, funcion in list(self.colectores.items()):
+            try:
+                datos = funcion()
+            except Exception:
+                continue
+            for metrica, valor in datos.items():
+                if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                    valores[f"{nombre}_{metrica}"] = valor
+        return valores
+
+    def texto(self):
+        """Todas las métricas en el formato de texto de Prometheus"""
+        lineas = []
+        for nombre, histograma in sorted(self.histogramas.items()):
+            completo = f"{self.prefijo}_{nombre}_segundos"
+            conteos, suma, total = histograma.instantanea()
+            lineas.append(f"# HELP {completo} {histograma.ayuda or nombre}")
+            lineas.append(f"# TYPE {completo} histogram")
+            acumulado = 0
+            for limite, conteo in zip(histograma.cubetas, conteos):
+                acumulado += conteo
+                lineas.append(f'{completo}_bucket{{le="{limite}"}} {acumulado}')
+            lineas.append(f'{completo}_bucket{{le="+Inf"}} {total}')
+            lineas.append(f"{completo}_sum {suma:.6f}")
+            lineas.append(f"{completo}_count {total}")
+        for nombre, contador in sorted(self.contadores.items()):
+            completo = f"{self.prefijo}_{nombre}_total"
+            lineas.append(f"# HELP {completo} {contador.ayuda or nombre}")
+            lineas.append(f"# TYPE {completo} counter")
+            lineas.append(f"{completo} {contador.valor}")
+        for nombre, valor in sorted(self.valores_colectores().items()):
+            completo = f"{self.prefijo}_{nombre}"
+            lineas.append(f"# TYPE {completo} gauge")
+            lineas.append(f"{completo} {valor}")
+        return "\n".join(lineas) + "\n"
+
+
+registro = RegistroMetricas()
+
+
+class medir:
+    """
+    Mide la duración de un bloque (`with medir("nombre"):`) o de cada llamada
+    a una función (`@medir("nombre")`) en el histograma `nombre`.
+    """
+
+    def __init__(self, nombre, ayuda=""):
+        self.histograma = registro.histograma(nombre, ayuda)
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histograma.observar(time.perf_counter() - self._inicio)
+        return False
+
+    def __call__(self, funcion):
+        histograma = self.histograma
+
+        @wraps(funcion)
+        def medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                histograma.observar(time.perf_counter() - inicio)
+        return medida
+
+
+def contar(nombre, cantidad=1, ayuda=""):
+    """Suma `cantidad` al contador `nombre`"""
+    registro.contador(nombre, ayuda).sumar(cantidad)
+
+
+def registrar_colector(nombre, funcion):
+    """Agrega un colector de valores instantáneos al registro del proceso"""
+    registro.registrar_colector(nombre, funcion)
+
+
+def texto_prometheus():
+    """Métricas del proceso en formato de texto de Prometheus"""
+    return registro.texto()
+
+
+def escribir_archivo(ruta):
+    """Escribe las métricas en `ruta` de forma atómica"""
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(texto_prometheus())
+    os.replace(temporal, ruta)
+
+
+_exportador = None
+_lock_exportador = threading.Lock()
+
+
+def iniciar_exportacion(ruta=None, intervalo=None):
+    """
+    Inicia (una vez por proceso) el hilo que reescribe el archivo de métricas.
+    Sin ruta ni MODELACION_METRICAS_ARCHIVO no hace nada.
+    """
+    global _exportador
+    ruta = ruta or os.environ.get("MODELACION_METRICAS_ARCHIVO")
+    if not ruta or _exportador is not None:
+        return
+    intervalo = intervalo or float(os.environ.get("MODELACION_METRICAS_INTERVALO", 15))
+    ruta = ruta.replace("{pid}", str(os.getpid()))
+
+    def bucle():
+        while True:
+            try:
+                escribir_archivo(ruta)
+            except OSError:
+                pass
+            time.sleep(intervalo)
+
+    with _lock_exportador:
+        if _exportador is None:
+            _exportador = threading.Thread(target=bucle, name="exportador-metricas", daemon=True)
+            _exportador.start()
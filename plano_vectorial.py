@@ -0,0 +1,81 @@
+"""
+Dibujo de planos en el navegador.
+
+En lugar de rasterizar cada plano con matplotlib en el servidor, se envía al
+componente de componente_plano/ una descripción compacta del plano (polígonos,
+colores, etiquetas y límites de los ejes) y el navegador lo dibuja como SVG.
+La página del componente se descarga una sola vez; por cada tarjeta el
+servidor solo serializa unos cientos de bytes.
+"""
+import os
+
+import streamlit.components.v1 as components
+
+from render_planos import COLORES, COLOR_DEFECTO, habitaciones_plano, limites_ejes
+
+_DIRECTORIO_COMPONENTE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "componente_plano")
+_componente = components.declare_component("plano_vectorial", path=_DIRECTORIO_COMPONENTE)
+
+
+def geometria_compacta(datos_plano, version, decimales=3):
+    """
+    Descripción compacta del plano para el componente.
+
+    {'x': [xmin, xmax], 'y': [ymin, ymax], 'f': tamaño de fuente,
+     'c': [colores], 'h': [[índice de color, etiqueta, [x0, y0, x1, y1, ...], [cx, cy]], ...]}
+
+    El centroide de cada habitación solo se incluye si el catálogo lo precalculó.
+    """
+    colores = []
+    indices_color = {}
+    habitaciones = []
+    xs, ys = [], []
+
+    centroides = datos_plano.get('Centroides')
+    for hab in habitaciones_plano(datos_plano):
+        vertices = hab.get('Vertices', [])
+        if not vertices:
+            continue
+        nombre = hab.get('Nombre', 'Sin nombre')
+        tipo = hab.get('Tipo_Funcional', 'Desconocido')
+
+        color = COLORES.get(tipo, COLOR_DEFECTO)
+        if color not in indices_color:
+            indices_color[color] = len(colores)
+            colores.append(color)
+
+        coordenadas = []
+        for x, y in vertices:
+            coordenadas.append(round(float(x), decimales))
+            coordenadas.append(round(float(y), decimales))
+            xs.append(x)
+            ys.append(y)
+        habitaciones.append([indices_color[color], f"{nombre}\n{tipo}", coordenadas])
+
+    # Centroides precalculados por el catálogo para ubicar las etiquetas
+    if centroides is not None and len(centroides) == len(habitaciones):
+        for hab, (cx, cy) in zip(habitaciones, centroides):
+            hab.append([round(float(cx), decimales), round(float(cy), decimales)])
+
+    limites = limites_ejes(datos_plano, version)
+    if limites is None:
+        # Escala automática con el mismo margen del 5% que usa matplotlib
+        if xs:
+            margen_x = (max(xs) - min(xs)) * 0.05 or 0.5
+            margen_y = (max(ys) - min(ys)) * 0.05 or 0.5
+            limites = ((min(xs) - margen_x, max(xs) + margen_x), (min(ys) - margen_y, max(ys) + margen_y))
+        else:
+            limites = ((0, 1), (0, 1))
+
+    return {
+        'x': [round(float(v), decimales) for v in limites[0]],
+        'y': [round(float(v), decimales) for v in limites[1]],
+        'f': 6 if version in ["v3", "v4", "v5"] else 8,
+        'c': colores,
+        'h': habitaciones
+    }
+
+
+def mostrar_plano_vectorial(datos_plano, version, key=None):
+    """Muestra el plano dibujado en el navegador por el componente"""
+    _componente(plano=geometria_compacta(datos_plano, version), key=key, default=None)
@@ -0,0 +1,59 @@
+"""
+Precarga en segundo plano de las dependencias pesadas.
+
+La página de bienvenida solo necesita Streamlit: pandas, numpy, matplotlib y
+el catálogo de planos recién hacen falta en el visualizador, y entre todos
+tardan alrededor de un segundo en cargarse. Mientras el encuestado completa
+el formulario, un hilo por proceso lee el catálogo y arranca los procesos del
+servicio de render (o importa matplotlib si se dibuja en el propio proceso),
+de modo que al pulsar "Continuar" ya están listos. Si la precarga aún no terminó, el
+visualizador espera lo que falte (los imports y obtener_catalogo son seguros
+entre hilos); si falló, el error se muestra al usarse.
+
+    MODELACION_PRECARGA=0   desactiva la precarga (todo se carga al usarse)
+"""
+import os
+import threading
+
+from metricas import medir
+
+ACTIVA = os.environ.get("MODELACION_PRECARGA", "1") != "0"
+
+_hilo = None
+_lock = threading.Lock()
+
+
+def _precargar(ruta_excel):
+    with medir("precarga", "Precarga en segundo plano de dependencias y catálogo"):
+        try:
+            from render_planos import cargar_dependencias, servicio_render
+            if not servicio_render.en_el_hilo():
+                # Se dibuja en los procesos del servicio de render: este proceso no necesita matplotlib
+                servicio_render.calentar()
+            else:
+                cargar_dependencias()
+            if os.path.exists(ruta_excel):
+                from catalogo_planos import obtener_catalogo
+                obtener_catalogo(ruta_excel)
+        except Exception:
+            pass
+
+
+def iniciar(ruta_excel):
+    """Lanza la precarga (una vez por proceso); no espera a que termine"""
+    global _hilo
+    if not ACTIVA or _hilo is not None:
+        return
+    with _lock:
+        if _hilo is None:
+            _hilo = threading.Thread(target=_precargar, args=(ruta_excel,), name="precarga", daemon=True)
+            _hilo.start()
+
+
+def esperar(timeout=None):
+    """Espera a que termine la precarga; True si terminó o no se había iniciado"""
+    hilo = _hilo
+    if hilo is None:
+        return True
+    hilo.join(timeout)
+    return not hilo.is_alive()
@@ -0,0 +1,140 @@
+"""
+Pre-renderizado de todos los planos del catálogo.
+
+Pensado para ejecutarse al desplegar, antes de levantar la aplicación:
+
+    python prerender_planos.py [--excel planos_ploteo.xlsx] [--procesos N] [--forzar]
+
+Dibuja cada plano de cada versión (v1-v5 y versiones desconocidas, que usan
+Ancho_Casa/Largo_Casa) con el mismo código que la aplicación, reparte el
+trabajo en un pool de procesos y deja las imágenes en la caché de disco de
+render_planos junto con un manifiesto. Se generan los dos niveles de detalle:
+la miniatura de las grillas y el plano completo. Los planos cuyo hash de contenido no
+cambió desde la última ejecución se omiten. Como la aplicación busca las
+imágenes en el mismo directorio, la primera visita a cada plano ya no
+rasteriza nada.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+matplotlib.use("Agg")
+import pandas as pd
+
+from catalogo_planos import EXCEL_PATH, CatalogoPlanos, hash_archivo
+from render_planos import (AJUSTES_MINIATURA, AJUSTES_RENDER, DIRECTORIO_CACHE, DIRECTORIO_MINIATURAS,
+                           CacheRender, clave_render, renderizar_imagen)
+
+NOMBRE_MANIFIESTO = "manifiesto.json"
+# {nivel: (ajustes, subdirectorio de la caché relativo a la de planos completos)}
+NIVELES = {
+    'completo': (AJUSTES_RENDER, ""),
+    'miniatura': (AJUSTES_MINIATURA, os.path.relpath(DIRECTORIO_MINIATURAS, DIRECTORIO_CACHE))
+}
+
+
+def cargar_manifiesto(directorio):
+    """Lee el manifiesto de una ejecución anterior (vacío si no existe o está dañado)"""
+    try:
+        with open(os.path.join(directorio, NOMBRE_MANIFIESTO), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def guardar_manifiesto(directorio, manifiesto):
+    """Escribe el manifiesto de forma atómica"""
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, NOMBRE_MANIFIESTO)
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+
+def renderizar_tarea(directorio, datos_plano, version, clave, nivel='completo'):
+    """Trabajo de un proceso del pool: rasteriza un plano y lo escribe en disco"""
+    ajustes, subdirectorio = NIVELES[nivel]
+    inicio = time.perf_counter()
+    imagen = renderizar_imagen(datos_plano, version, ajustes)
+    ruta = CacheRender(os.path.join(directorio, subdirectorio)).guardar_en_disco(clave, imagen, ajustes['formato'])
+    return os.path.basename(ruta), len(imagen), time.perf_counter() - inicio
+
+
+def prerender(excel=EXCEL_PATH, directorio=DIRECTORIO_CACHE, procesos=None, forzar=False, salida=sys.stdout):
+    """Renderiza todo el catálogo y devuelve el manifiesto resultante"""
+    catalogo = CatalogoPlanos(pd.read_excel(excel), hash_archivo(excel), excel)
+    anterior = cargar_manifiesto(directorio)
+    manifiesto = {}
+    pendientes = []
+
+    for version in catalogo.versiones:
+        for plano_id in catalogo.planos_ids(version):
+            datos_plano = catalogo.obtener(version, plano_id)
+            for nivel, (ajustes, subdirectorio) in NIVELES.items():
+                # Los planos completos conservan el nombre que tenían antes de existir las miniaturas
+                nombre = f"{version}/{plano_id}" + ("" if nivel == 'completo' else f"/{nivel}")
+                try:
+                    clave = clave_render(datos_plano, version, ajustes)
+                except Exception as e:
+                    print(f"{nombre}: ERROR {e}", file=salida)
+                    continue
+
+                previo = anterior.get(nombre)
+                cache = CacheRender(os.path.join(directorio, subdirectorio))
+                if (not forzar and previo and previo.get('clave') == clave
+                        and cache.existe_en_disco(clave, ajustes['formato'])):
+                    manifiesto[nombre] = previo
+                    print(f"{nombre}: sin cambios", file=salida)
+                    continue
+                pendientes.append((nombre, nivel, version, plano_id, datos_plano, clave))
+
+    inicio_total = time.perf_counter()
+    errores = 0
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        futuros = {
+            pool.submit(renderizar_tarea, directorio, datos_plano, version, clave, nivel):
+                (nombre, nivel, version, plano_id, clave)
+            for nombre, nivel, version, plano_id, datos_plano, clave in pendientes
+        }
+        for futuro in as_completed(futuros):
+            nombre, nivel, version, plano_id, clave = futuros[futuro]
+            try:
+                archivo, tamano, segundos = futuro.result()
+            except Exception as e:
+                errores += 1
+                print(f"{nombre}: ERROR {e}", file=salida)
+                continue
+            manifiesto[nombre] = {
+                'version': version,
+                'plano_id': plano_id,
+                'nivel': nivel,
+                'clave': clave,
+                'archivo': archivo,
+                'bytes': tamano,
+                'segundos': round(segundos, 4)
+            }
+            print(f"{nombre}: {segundos * 1000:.1f} ms ({tamano / 1024:.1f} KB)", file=salida)
+
+    guardar_manifiesto(directorio, manifiesto)
+    print(f"{len(pendientes) - errores} renderizados, {len(manifiesto) - len(pendientes) + errores} sin cambios, "
+          f"{errores} errores en {time.perf_counter() - inicio_total:.2f} s", file=salida)
+    return manifiesto
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-renderiza todos los planos del catálogo")
+    parser.add_argument("--excel", default=EXCEL_PATH, help="Archivo Excel con los planos")
+    parser.add_argument("--salida", default=DIRECTORIO_CACHE, help="Directorio de la caché de imágenes")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos del pool (por defecto, uno por núcleo)")
+    parser.add_argument("--forzar", action="store_true", help="Renderizar también los planos sin cambios")
+    args = parser.parse_args(argv)
+    prerender(args.excel, args.salida, args.procesos, args.forzar)
+
+
+if __name__ == "__main__":
+    main()
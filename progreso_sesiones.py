@@ -0,0 +1,192 @@
+"""
+Progreso de cada sesión de la encuesta, para poder retomarla.
+
+Si se corta la conexión con el navegador, Streamlit descarta el
+st.session_state de la sesión. Para no perder lo avanzado, la aplicación
+anota cada cambio (datos del encuestado, elección en un grupo, ganador de una
+versión, ...) como un registro pequeño con solo las claves que cambiaron,
+asociado al token de la sesión que va en la URL (?sesion=<token>). Al
+reconectarse con la misma URL el estado se reconstruye con una sola consulta.
+
+Los registros se guardan en una base SQLite en modo WAL:
+
+    instantaneas(token, seq, estado, actualizado)  estado compactado hasta `seq`
+    cambios(token, seq, cambios)                   cambios posteriores, en orden
+
+Cada COMPACTAR_CADA cambios los de un token se pliegan en su instantánea, y
+un hilo en segundo plano (cada INTERVALO_PURGA segundos, fuera de las
+peticiones) compacta los demás y borra los tokens sin actividad durante
+RETENCION_DIAS.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+RUTA_DB = "progreso_sesiones.db"
+COMPACTAR_CADA = 20
+RETENCION_DIAS = 7
+INTERVALO_PURGA = 3600
+
+_SQL_CREAR = [
+    """CREATE TABLE IF NOT EXISTS instantaneas (
+        token TEXT PRIMARY KEY,
+        seq INTEGER NOT NULL,
+        estado TEXT NOT NULL,
+        actualizado REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS cambios (
+        token TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        cambios TEXT NOT NULL,
+        PRIMARY KEY (token, seq)
+    ) WITHOUT ROWID""",
+]
+_SQL_CARGAR = """
+SELECT estado AS datos, seq FROM instantaneas WHERE token = :token
+UNION ALL
+SELECT cambios, seq FROM cambios
+WHERE token = :token AND seq > COALESCE((SELECT seq FROM instantaneas WHERE token = :token), 0)
+ORDER BY seq
+"""
+
+
+def aplicar(estado, cambios):
+    """Aplica un registro de cambios a un estado; None borra la clave"""
+    for clave, valor in cambios.items():
+        if valor is None:
+            estado.pop(clave, None)
+        else:
+            estado[clave] = valor
+    return estado
+
+
+class ProgresoSesiones:
+    """Registro de cambios por token de sesión, sobre SQLite (una conexión por hilo)"""
+
+    def __init__(self, ruta=RUTA_DB, compactar_cada=COMPACTAR_CADA, retencion_dias=RETENCION_DIAS):
+        self.ruta = ruta
+        self.compactar_cada = compactar_cada
+        self.retencion_dias = retencion_dias
+        self._local = threading.local()
+        conexion = self._conexion()
+        with conexion:
+            for sql in _SQL_CREAR:
+                conexion.execute(sql)
+        self._hilo_purga = threading.Thread(target=self._purgar_periodicamente, name="purga-progreso", daemon=True)
+        self._hilo_purga.start()
+
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            # Perder el último cambio ante un corte de energía es aceptable; no así bloquear la interfaz
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    def guardar(self, token, cambios):
+        """Agrega un registro de cambios para el token; cada tanto compacta los suyos"""
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            fila = conexion.execute(
+                "SELECT MAX(seq) FROM (SELECT seq FROM cambios WHERE token = ?1 "
+                "UNION ALL SELECT seq FROM instantaneas WHERE token = ?1)", (token,)).fetchone()
+            seq = (fila[0] or 0) + 1
+            conexion.execute("INSERT INTO cambios (token, seq, cambios) VALUES (?, ?, ?)",
+                             (token, seq, json.dumps(cambios, ensure_ascii=False, default=str)))
+            if seq % self.compactar_cada == 0:
+                self._compactar(conexion, token)
+            conexion.execute("COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
+        return seq
+
+    def cargar(self, token):
+        """Estado reconstruido del token (instantánea más cambios posteriores), o None si no existe"""
+        filas = self._conexion().execute(_SQL_CARGAR, {'token': token}).fetchall()
+        if not filas:
+            return None
+        estado = {}
+        for datos, _ in filas:
+            aplicar(estado, json.loads(datos))
+        return estado
+
+    def _compactar(self, conexion, token):
+        filas = conexion.execute(_SQL_CARGAR, {'token': token}).fetchall()
+        estado = {}
+        for datos, _ in filas:
+            aplicar(estado, json.loads(datos))
+        seq = filas[-1][1]
+        conexion.execute(
+            "INSERT INTO instantaneas (token, seq, estado, actualizado) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(token) DO UPDATE SET seq = excluded.seq, estado = excluded.estado, "
+            "actualizado = excluded.actualizado",
+            (token, seq, json.dumps(estado, ensure_ascii=False, default=str), time.time()))
+        conexion.execute("DELETE FROM cambios WHERE token = ? AND seq <= ?", (token, seq))
+
+    def compactar(self, token):
+        """Pliega los cambios del token en su instantánea"""
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            self._compactar(conexion, token)
+            conexion.execute("COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
+
+    def borrar(self, token):
+        """Olvida el progreso de un token (p. ej. al empezar una evaluación nueva)"""
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            conexion.execute("DELETE FROM cambios WHERE token = ?", (token,))
+            conexion.execute("DELETE FROM instantaneas WHERE token = ?", (token,))
+            conexion.execute("COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
+
+    def _purgar_periodicamente(self):
+        while True:
+            time.sleep(INTERVALO_PURGA)
+            try:
+                self.purgar()
+            except Exception:
+                pass  # Base ocupada o no disponible: se reintenta en la próxima vuelta
+
+    def purgar(self, dias=None):
+        """
+        Pliega los cambios sueltos de todos los tokens en sus instantáneas y
+        borra los que no tuvieron actividad en `dias` (por defecto, retencion_dias).
+        """
+        dias = self.retencion_dias if dias is None else dias
+        conexion = self._conexion()
+        limite = time.time() - dias * 86400
+        for (token,) in conexion.execute("SELECT DISTINCT token FROM cambios").fetchall():
+            self.compactar(token)
+        with conexion:
+            viejos = conexion.execute("DELETE FROM instantaneas WHERE actualizado < ?", (limite,)).rowcount
+        return viejos
+
+
+_lock = threading.Lock()
+_progresos = {}
+
+
+def obtener_progreso(ruta=RUTA_DB):
+    """Registro de progreso compartido por todo el proceso para `ruta`"""
+    clave = os.path.abspath(ruta)
+    progreso = _progresos.get(clave)
+    if progreso is None:
+        with _lock:
+            progreso = _progresos.get(clave)
+            if progreso is None:
+                progreso = ProgresoSesiones(ruta)
+                _progresos[clave] = progreso
+    return progreso
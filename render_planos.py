@@ -0,0 +1,639 @@
+"""
+Dibujo de planos y caché de imágenes renderizadas.
+
+La imagen de un plano solo depende de su versión, de la geometría de sus
+habitaciones y de los ajustes de dibujo, así que se identifica con un hash de
+esos datos. Las imágenes se guardan en una caché LRU en memoria (con límite
+en bytes) respaldada por una caché en disco de archivos PNG.
+
+Hay dos niveles de detalle: las miniaturas (AJUSTES_MINIATURA: figura chica,
+poca resolución, solo el tipo de cada habitación y sin ejes) para las
+grillas, y el plano completo (AJUSTES_RENDER) que solo se dibuja cuando el
+encuestado lo amplía. Cada nivel tiene su propia caché, así las imágenes
+grandes no desalojan a las miniaturas.
+
+Lo que falta en caché lo rasteriza ServicioRender, compartido por todas las
+sesiones del proceso: un pool de procesos (la rasterización no compite por
+el GIL con los hilos de Streamlit) en el que los pedidos simultáneos del
+mismo plano se unen a un único trabajo. Configuración por variables de entorno:
+
+    MODELACION_RENDER_PROCESOS  procesos del pool (hasta 4, uno por núcleo; 0 = en el hilo que pide)
+    MODELACION_RENDER_COLA      trabajos distintos en curso o en espera como máximo (64)
+    MODELACION_RENDER_TIMEOUT   segundos máximos de espera por una imagen (30)
+
+matplotlib y numpy se importan al dibujar el primer plano (ver
+cargar_dependencias), no al importar el módulo: la página de bienvenida no
+los necesita.
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metricas import medir, registrar_colector
+
+# Colores para diferentes tipos de habitaciones
+COLORES = {
+    'Baño': 'lightblue',
+    'Dor': 'lightgreen',
+    'Cocina - Comedor': 'lightyellow',
+    'Estar': 'lightyellow',
+    'Recibidor': 'lightyellow',
+    'Cocina': 'lightyellow',
+    'Comedor': 'lightyellow'
+}
+COLOR_DEFECTO = 'lightgray'
+
+# Ajustes que afectan a la imagen final. Subir 'estilo' al cambiar el dibujo
+# invalida todas las imágenes guardadas en disco.
+AJUSTES_RENDER = {
+    'estilo': 3,
+    'figsize': (5, 4),
+    'dpi': 200,
+    'formato': 'png'
+}
+AJUSTES_MINIATURA = {
+    'estilo': 3,
+    'figsize': (3, 2.4),
+    'dpi': 100,
+    'formato': 'png',
+    'detalle': 'miniatura'
+}
+
+DIRECTORIO_CACHE = ".cache_planos"
+DIRECTORIO_MINIATURAS = os.path.join(DIRECTORIO_CACHE, "miniaturas")
+LIMITE_BYTES_MEMORIA = 64 * 1024 * 1024
+LIMITE_BYTES_MINIATURAS = 16 * 1024 * 1024
+
+PROCESOS_RENDER = int(os.environ.get("MODELACION_RENDER_PROCESOS", min(4, os.cpu_count() or 1)))
+COLA_RENDER = int(os.environ.get("MODELACION_RENDER_COLA", 64))
+TIMEOUT_RENDER = float(os.environ.get("MODELACION_RENDER_TIMEOUT", 30))
+
+
+def es_miniatura(ajustes):
+    return ajustes.get('detalle') == 'miniatura'
+
+
+def dimensiones_casa(datos_plano, version):
+    """Largo y ancho de la casa según la versión (o según el Excel si es desconocida)"""
+    if version == "v1":
+        return 2.440 * 2, 2.440 * 3
+    elif version == "v2":
+        return 2 * 2.440, 4 * 2.440
+    elif version == "v3":
+        return 2.440 * 2, 2.440 * 6
+    elif version == "v4":
+        return 2.440 * 3, 2.440 * 6
+    elif version == "v5":
+        return 2.440 * 4, 2.440 * 6
+    # Si no coincide con ninguna versión conocida, usar valores del Excel o valores por defecto
+    ancho_casa = datos_plano.get('Ancho_Casa', datos_plano.get('ancho_casa', 7.32))
+    largo_casa = datos_plano.get('Largo_Casa', datos_plano.get('largo_casa', 4.88))
+    return largo_casa, ancho_casa
+
+
+def limites_ejes(datos_plano, version):
+    """Límites (xlim, ylim) de los ejes, o None si se deja la escala automática"""
+    largo_casa, ancho_casa = dimensiones_casa(datos_plano, version)
+    if version in ("v1", "v2", "v3"):
+        return (0, largo_casa), (0, ancho_casa)
+    elif version == "v4":
+        return (-2.440, 2.440*2), (0, ancho_casa)
+    elif version == "v5":
+        return (-2.440*2, 2.440*2), (0, ancho_casa)
+    return None
+
+
+def habitaciones_plano(datos_plano):
+    """Habitaciones del plano, usando las ya decodificadas por el catálogo si existen"""
+    habitaciones = datos_plano.get('Habitaciones')
+    if habitaciones is None:
+        habitaciones = json.loads(datos_plano.get('Datos_Habitaciones', '[]'))
+    return habitaciones
+
+
+def cargar_dependencias():
+    """Importa (una vez por proceso) lo necesario para dibujar: Figure, FigureCanvasAgg y PolyCollection"""
+    import numpy  # noqa: F401
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import PolyCollection
+    from matplotlib.figure import Figure
+    return Figure, FigureCanvasAgg, PolyCollection
+
+
+def _geometria_habitaciones(habitaciones, miniatura=False):
+    """Vértices, etiquetas y tipos de las habitaciones que tienen vértices"""
+    import numpy as np
+    poligonos, etiquetas, tipos = [], [], []
+    for hab in habitaciones:
+        vertices = hab.get('Vertices', [])
+        # Si no hay vértices, continuar al siguiente
+        if not vertices:
+            continue
+        nombre = hab.get('Nombre', 'Sin nombre')
+        tipo = hab.get('Tipo_Funcional', 'Desconocido')
+        poligonos.append(np.asarray(vertices, dtype=float))
+        etiquetas.append(tipo if miniatura else f"{nombre}\n{tipo}")
+        tipos.append(tipo)
+    return poligonos, etiquetas, tipos
+
+
+def dibujar_plano(datos_plano, version, fig=None, miniatura=False):
+    """
+    Dibuja el plano y devuelve la figura.
+
+    Usa la API orientada a objetos (Figure + lienzo Agg) sin pasar por pyplot,
+    así que no queda nada registrado en estado global y es seguro llamarla
+    desde varios hilos siempre que cada uno use su propia figura. Si se pasa
+    `fig` se limpia y se reutiliza. Con `miniatura` las etiquetas se reducen al
+    tipo de habitación y se omiten ejes y grilla.
+    """
+    import numpy as np
+    Figure, FigureCanvasAgg, PolyCollection = cargar_dependencias()
+    habitaciones = habitaciones_plano(datos_plano)
+
+    if fig is None:
+        fig = Figure(figsize=AJUSTES_RENDER['figsize'])
+        FigureCanvasAgg(fig)
+    else:
+        fig.clear()
+    ax = fig.add_subplot()
+
+    poligonos, etiquetas, tipos = _geometria_habitaciones(habitaciones, miniatura)
+    if poligonos:
+        # Todas las habitaciones en una sola colección, con los colores resueltos de una vez
+        colores = [COLORES.get(tipo, COLOR_DEFECTO) for tipo in tipos]
+        ax.add_collection(PolyCollection(poligonos, closed=True, facecolors=colores,
+                                         edgecolors='black', linewidths=0.8 if miniatura else 1.5, alpha=0.7))
+
+        # Centroides precalculados por el catálogo (geometria_planos); si no
+        # están, el promedio de los vértices calculado en bloque
+        centros = datos_plano.get('Centroides')
+        if centros is None or len(centros) != len(poligonos):
+            longitudes = np.fromiter((len(p) for p in poligonos), dtype=np.intp, count=len(poligonos))
+            inicios = np.concatenate(([0], np.cumsum(longitudes)[:-1]))
+            centros = np.add.reduceat(np.concatenate(poligonos), inicios, axis=0) / longitudes[:, None]
+
+        # Ajustar tamaño de fuente según la versión
+        font_size = 6 if version in ["v3", "v4", "v5"] else 8
+        if miniatura:
+            font_size -= 1
+        for (cx, cy), etiqueta in zip(centros, etiquetas):
+            ax.text(cx, cy, etiqueta, ha='center', va='center',
+                    fontsize=font_size, fontweight='normal' if miniatura else 'bold')
+
+    limites = limites_ejes(datos_plano, version)
+    if limites is not None:
+        ax.set_xlim(*limites[0])
+        ax.set_ylim(*limites[1])
+    else:
+        ax.autoscale_view()
+
+    ax.set_aspect('equal')
+    if miniatura:
+        ax.set_axis_off()
+    else:
+        ax.set_xlabel('Largo (m)', fontsize=8)
+        ax.set_ylabel('Ancho (m)', fontsize=8)
+        ax.grid(True, linestyle='--', alpha=0.5)
+    fig.tight_layout()
+
+    return fig
+
+
+def clave_render(datos_plano, version, ajustes=None):
+    """Hash del contenido que determina la imagen de un plano"""
+    ajustes = AJUSTES_RENDER if ajustes is None else ajustes
+    geometria = [
+        [hab.get('Nombre', 'Sin nombre'), hab.get('Tipo_Funcional', 'Desconocido'), hab.get('Vertices', [])]
+        for hab in habitaciones_plano(datos_plano)
+    ]
+    contenido = {'version': version, 'geometria': geometria, 'ajustes': ajustes}
+    if limites_ejes(datos_plano, version) is None:
+        contenido['dimensiones'] = dimensiones_casa(datos_plano, version)
+    texto = json.dumps(contenido, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+_figuras_hilo = threading.local()
+
+
+@medir("rasterizar_plano", "Rasterización de un plano con matplotlib")
+def renderizar_imagen(datos_plano, version, ajustes=None):
+    """
+    Rasteriza el plano y devuelve la imagen codificada en bytes.
+
+    Cada hilo reutiliza una única figura, que se vacía al terminar para no
+    retener los artistas del último plano.
+    """
+    ajustes = AJUSTES_RENDER if ajustes is None else ajustes
+    fig = getattr(_figuras_hilo, 'figura', None)
+    if fig is None:
+        Figure, FigureCanvasAgg, _ = cargar_dependencias()
+        fig = Figure(figsize=ajustes['figsize'])
+        FigureCanvasAgg(fig)
+        _figuras_hilo.figura = fig
+    fig.set_size_inches(ajustes['figsize'])
+
+    buffer = io.BytesIO()
+    try:
+        dibujar_plano(datos_plano, version, fig, es_miniatura(ajustes))
+        fig.savefig(buffer, format=ajustes['formato'], dpi=ajustes['dpi'], bbox_inches='tight')
+    finally:
+        fig.clear()
+    return buffer.getvalue()
+
+
+class CacheRender:
+    """Caché de imágenes en dos niveles: LRU en memoria limitada en bytes y archivos en disco"""
+
+    def __init__(self, directorio=DIRECTORIO_CACHE, limite_bytes=LIMITE_BYTES_MEMORIA):
+        self.directorio = directorio
+        self.limite_bytes = limite_bytes
+        self._memoria = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+
+    def _ruta(self, clave, formato):
+        return os.path.join(self.directorio, f"{clave}.{formato}")
+
+    def _guardar_memoria(self, clave, imagen):
+        with self._lock:
+            anterior = self._memoria.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            if len(imagen) > self.limite_bytes:
+                return
+            self._memoria[clave] = imagen
+            self._bytes += len(imagen)
+            while self._bytes > self.limite_bytes:
+                _, descartada = self._memoria.popitem(last=False)
+                self._bytes -= len(descartada)
+
+    def obtener(self, clave, formato='png'):
+        """Imagen guardada para `clave`, o None si no está en ningún nivel"""
+        with self._lock:
+            imagen = self._memoria.get(clave)
+            if imagen is not None:
+                self._memoria.move_to_end(clave)
+                self.aciertos += 1
+                return imagen
+
+        try:
+            with open(self._ruta(clave, formato), 'rb') as f:
+                imagen = f.read()
+        except OSError:
+            self.fallos += 1
+            return None
+        self.aciertos_disco += 1
+        self._guardar_memoria(clave, imagen)
+        return imagen
+
+    def contiene(self, clave, formato='png'):
+        """Indica si la imagen está en algún nivel, sin contarlo como acceso"""
+        with self._lock:
+            if clave in self._memoria:
+                return True
+        return self.existe_en_disco(clave, formato)
+
+    def existe_en_disco(self, clave, formato='png'):
+        """Indica si la imagen ya está guardada en disco"""
+        return os.path.exists(self._ruta(clave, formato))
+
+    def guardar_en_disco(self, clave, imagen, formato='png'):
+        """Escribe la imagen en disco de forma atómica y devuelve su ruta"""
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta = self._ruta(clave, formato)
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(imagen)
+        os.replace(temporal, ruta)
+        return ruta
+
+    def guardar(self, clave, imagen, formato='png'):
+        """Guarda la imagen en memoria y en disco"""
+        self._guardar_memoria(clave, imagen)
+        try:
+            self.guardar_en_disco(clave, imagen, formato)
+        except OSError:
+            # Sin disco escribible la caché sigue funcionando solo en memoria
+            pass
+
+    def descartar(self, clave, formato='png'):
+        """Borra la imagen de `clave` de los dos niveles; devuelve True si estaba en alguno"""
+        with self._lock:
+            imagen = self._memoria.pop(clave, None)
+            if imagen is not None:
+                self._bytes -= len(imagen)
+        try:
+            os.remove(self._ruta(clave, formato))
+        except OSError:
+            return imagen is not None
+        return True
+
+    def estadisticas(self):
+        """Resumen del estado de la caché"""
+        with self._lock:
+            return {
+                'imagenes_en_memoria': len(self._memoria),
+                'bytes_en_memoria': self._bytes,
+                'limite_bytes': self.limite_bytes,
+                'aciertos': self.aciertos,
+                'aciertos_disco': self.aciertos_disco,
+                'fallos': self.fallos
+            }
+
+
+cache_render = CacheRender()
+cache_miniaturas = CacheRender(DIRECTORIO_MINIATURAS, LIMITE_BYTES_MINIATURAS)
+registrar_colector("cache_render", cache_render.estadisticas)
+registrar_colector("cache_miniaturas", cache_miniaturas.estadisticas)
+
+
+def cache_de(ajustes):
+    """Caché del nivel de detalle de `ajustes`"""
+    return cache_miniaturas if es_miniatura(ajustes) else cache_render
+
+
+def descartar_planos(planos):
+    """
+    Borra de las dos cachés las imágenes de `planos` (diccionarios del
+    catálogo, con 'Version'); pensado para catalogo_planos.al_descartar_planos
+    """
+    descartadas = 0
+    for plano in planos:
+        for ajustes in (AJUSTES_RENDER, AJUSTES_MINIATURA):
+            clave = clave_render(plano, plano['Version'], ajustes)
+            descartadas += cache_de(ajustes).descartar(clave, ajustes['formato'])
+    return descartadas
+
+
+# Claves de un plano que usa dibujar_plano: es lo único que viaja a los procesos del pool
+_CLAVES_DIBUJO = ('Habitaciones', 'Datos_Habitaciones', 'Centroides', 'Ancho_Casa', 'ancho_casa',
+                  'Largo_Casa', 'largo_casa')
+
+
+def _renderizar_en_proceso(datos_dibujo, version, ajustes):
+    return renderizar_imagen(datos_dibujo, version, ajustes)
+
+
+def _iniciar_proceso():
+    cargar_dependencias()
+
+
+@contextmanager
+def _main_neutro():
+    """
+    Mientras corre un script, Streamlit lo instala como __main__, y con
+    forkserver o spawn multiprocessing volvería a ejecutarlo (la aplicación
+    entera) en cada proceso nuevo. Al crear procesos se deja un __main__ sin
+    archivo, que los hijos no intentan importar.
+    """
+    anterior = sys.modules.get('__main__')
+    neutro = types.ModuleType('__main__')
+    sys.modules['__main__'] = neutro
+    try:
+        yield
+    finally:
+        # Si Streamlit empezó otro rerun mientras tanto, se respeta su __main__
+        if sys.modules.get('__main__') is neutro:
+            sys.modules['__main__'] = anterior
+
+
+class ServicioRender:
+    """
+    Rasterización compartida por todas las sesiones del proceso.
+
+    Los trabajos se envían a un pool de procesos creado al primer uso. Un
+    pedido por una clave que ya se está rasterizando espera ese mismo trabajo
+    en lugar de lanzar otro. Como mucho hay `max_pendientes` trabajos distintos
+    en curso o en espera: un pedido nuevo aguarda un lugar hasta `timeout`
+    segundos y, si no lo consigue, falla con TimeoutError. Lo mismo pasa si la
+    imagen no llega a tiempo, aunque el trabajo sigue y su resultado se guarda
+    en caché igual. Con `procesos=0`, y dentro de los procesos del pool (que
+    nunca abren otro), se rasteriza en el hilo que pide, también con coalescencia.
+    """
+
+    def __init__(self, procesos=PROCESOS_RENDER, max_pendientes=COLA_RENDER, timeout=TIMEOUT_RENDER):
+        self.procesos = procesos
+        self.max_pendientes = max_pendientes
+        self.timeout = timeout
+        self._pool = None
+        self._en_curso = {}  # {clave: futuro}
+        self._condicion = threading.Condition()
+        self.completados = 0
+        self.coalescidos = 0
+        self.rechazados = 0
+        self.vencidos = 0
+        self.errores = 0
+
+    def _obtener_pool(self):
+        if self._pool is None:
+            # Sin fork: el servidor de Streamlit tiene muchos hilos
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                contexto = multiprocessing.get_context("forkserver")
+                contexto.set_forkserver_preload([__name__, 'matplotlib.figure', 'matplotlib.backends.backend_agg'])
+            else:
+                contexto = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(max_workers=self.procesos, initializer=_iniciar_proceso,
+                                             mp_context=contexto)
+        return self._pool
+
+    def _enviar(self, *args):
+        """pool.submit, que es donde el pool crea sus procesos; devuelve (pool, futuro)"""
+        with _main_neutro():
+            pool = self._obtener_pool()
+            return pool, pool.submit(*args)
+
+    def _descartar_pool(self, roto):
+        """Cierra un pool roto (con el lock tomado); solo lo olvida si sigue siendo el vigente"""
+        if roto is None:
+            return
+        if self._pool is roto:
+            self._pool = None
+        # Libera su hilo de gestión, sus colas y los procesos que queden
+        roto.shutdown(wait=False, cancel_futures=True)
+
+    def en_el_hilo(self):
+        """Indica si se rasteriza en el hilo que pide (sin pool, o dentro de un proceso del pool)"""
+        return self.procesos <= 0 or multiprocessing.parent_process() is not None
+
+    def calentar(self):
+        """Arranca los procesos del pool (cada uno importa matplotlib) sin esperarlos"""
+        if self.en_el_hilo():
+            return
+        with self._condicion:
+            for _ in range(self.procesos):
+                self._enviar(cargar_dependencias)
+
+    def _lanzar(self, clave, datos_plano, version, ajustes):
+        """
+        Crea el trabajo de `clave` (con el lock tomado); devuelve (futuro, pool
+        que lo ejecuta, o None si lo ejecuta quien pide)
+        """
+        if self.en_el_hilo():
+            futuro = Future()
+            futuro.set_running_or_notify_cancel()
+            return futuro, None
+        datos_dibujo = {k: datos_plano[k] for k in _CLAVES_DIBUJO if k in datos_plano}
+        try:
+            pool, futuro = self._enviar(_renderizar_en_proceso, datos_dibujo, version, ajustes)
+        except BrokenProcessPool:
+            # Un proceso murió: se descarta el pool y se crea otro
+            self._descartar_pool(self._pool)
+            pool, futuro = self._enviar(_renderizar_en_proceso, datos_dibujo, version, ajustes)
+        return futuro, pool
+
+    def _terminado(self, clave, ajustes, pool, futuro):
+        error = futuro.exception() if not futuro.cancelled() else None
+        if not futuro.cancelled() and error is None:
+            # En caché antes de dejar de figurar en curso, para que nadie lo vuelva a pedir
+            cache_de(ajustes).guardar(clave, futuro.result(), ajustes['formato'])
+        with self._condicion:
+            self._en_curso.pop(clave, None)
+            if error is None:
+                self.completados += 1
+            else:
+                self.errores += 1
+                if isinstance(error, BrokenProcessPool):
+                    self._descartar_pool(pool)
+            self._condicion.notify_all()
+
+    @medir("servicio_render", "Espera de una imagen en el servicio de render (incluye la rasterización)")
+    def renderizar(self, clave, datos_plano, version, ajustes=None, timeout=None):
+        """Imagen de `clave`, rasterizada en el pool (o unida a un trabajo en curso) y guardada en caché"""
+        ajustes = AJUSTES_RENDER if ajustes is None else ajustes
+        timeout = self.timeout if timeout is None else timeout
+        limite = time.monotonic() + timeout
+        ejecutar_aqui = False
+        with self._condicion:
+            while True:
+                futuro = self._en_curso.get(clave)
+                if futuro is not None:
+                    self.coalescidos += 1
+                    break
+                if len(self._en_curso) < self.max_pendientes:
+                    futuro, pool = self._lanzar(clave, datos_plano, version, ajustes)
+                    ejecutar_aqui = pool is None
+                    self._en_curso[clave] = futuro
+                    if not ejecutar_aqui:
+                        futuro.add_done_callback(lambda f: self._terminado(clave, ajustes, pool, f))
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self.rechazados += 1
+                    raise TimeoutError(f"El servicio de render tiene {self.max_pendientes} trabajos pendientes")
+                self._condicion.wait(restante)
+
+        if ejecutar_aqui:
+            try:
+                futuro.set_result(renderizar_imagen(datos_plano, version, ajustes))
+            except Exception as e:
+                futuro.set_exception(e)
+            self._terminado(clave, ajustes, None, futuro)
+        try:
+            return futuro.result(max(0.0, limite - time.monotonic()))
+        except TimeoutError:
+            with self._condicion:
+                self.vencidos += 1
+            raise TimeoutError(f"La imagen del plano no estuvo lista en {timeout:g} s") from None
+
+    def estadisticas(self):
+        with self._condicion:
+            return {
+                'procesos': self.procesos,
+                'en_curso': len(self._en_curso),
+                'max_pendientes': self.max_pendientes,
+                'completados': self.completados,
+                'coalescidos': self.coalescidos,
+                'rechazados': self.rechazados,
+                'vencidos': self.vencidos,
+                'errores': self.errores
+            }
+
+
+servicio_render = ServicioRender()
+registrar_colector("servicio_render", servicio_render.estadisticas)
+
+
+def imagen_plano(datos_plano, version, ajustes=None, timeout=None):
+    """Imagen codificada del plano, renderizándola (en el servicio de render) solo si no está en caché"""
+    ajustes = AJUSTES_RENDER if ajustes is None else ajustes
+    clave = clave_render(datos_plano, version, ajustes)
+    imagen = cache_de(ajustes).obtener(clave, ajustes['formato'])
+    if imagen is None:
+        imagen = servicio_render.renderizar(clave, datos_plano, version, ajustes, timeout)
+    return imagen
+
+
+def _prefetch_plano(datos_plano, version, ajustes):
+    try:
+        imagen_plano(datos_plano, version, ajustes)
+    except Exception:
+        # El error se mostrará cuando la tarjeta intente dibujar el plano
+        pass
+
+
+class PrefetchRender:
+    """
+    Renderiza en segundo plano planos que probablemente se verán a continuación.
+
+    Un pool de hilos por proceso limita la concurrencia y `max_pendientes`
+    acota el trabajo encolado. Cada sesión tiene a lo sumo un lote programado:
+    programar uno nuevo, o llamar a `cancelar`, descarta los renders de esa
+    sesión que aún no empezaron.
+    """
+
+    def __init__(self, max_hilos=2, max_pendientes=64):
+        self.max_hilos = max_hilos
+        self.max_pendientes = max_pendientes
+        self._pool = None
+        self._lock = threading.Lock()
+        self._por_sesion = {}  # {sesion: [futuros]}
+
+    def programar(self, sesion, planos, ajustes=None):
+        """Programa el render de [(datos_plano, version)] para la sesión"""
+        ajustes = AJUSTES_RENDER if ajustes is None else ajustes
+        self.cancelar(sesion)
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_hilos, thread_name_prefix="prefetch-planos")
+            for clave_sesion in [s for s, f in self._por_sesion.items() if all(x.done() for x in f)]:
+                del self._por_sesion[clave_sesion]
+            en_curso = sum(not f.done() for futuros in self._por_sesion.values() for f in futuros)
+
+            futuros = []
+            for datos_plano, version in planos:
+                if en_curso + len(futuros) >= self.max_pendientes:
+                    break
+                try:
+                    if cache_de(ajustes).contiene(clave_render(datos_plano, version, ajustes), ajustes['formato']):
+                        continue
+                except Exception:
+                    continue
+                futuros.append(self._pool.submit(_prefetch_plano, datos_plano, version, ajustes))
+            if futuros:
+                self._por_sesion[sesion] = futuros
+        return len(futuros)
+
+    def cancelar(self, sesion):
+        """Descarta los renders programados por la sesión que todavía no empezaron"""
+        with self._lock:
+            futuros = self._por_sesion.pop(sesion, [])
+        for futuro in futuros:
+            futuro.cancel()
+
+
+prefetch_render = PrefetchRender()
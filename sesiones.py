@@ -0,0 +1,118 @@
+"""
+Registro de las sesiones de Streamlit del proceso y desalojo de las inactivas.
+
+Cada sesión guarda en st.session_state solo IDs de planos y la firma del
+catálogo, pero Streamlit conserva el estado de las sesiones (y sus tareas de
+prefetch) mientras el servidor no las cierre. Aquí se anota en cada rerun la
+última actividad y el tamaño aproximado del estado de cada sesión; cuando el
+total supera el presupuesto se cierran las sesiones inactivas, de la más
+antigua a la más reciente.
+
+Configuración por variables de entorno:
+
+    MODELACION_SESIONES_MB           presupuesto para el estado de todas las sesiones (64)
+    MODELACION_SESIONES_INACTIVIDAD  segundos sin actividad para poder desalojar una sesión (900)
+"""
+import os
+import sys
+import threading
+import time
+
+from metricas import registrar_colector
+from render_planos import prefetch_render
+
+PRESUPUESTO_BYTES = int(float(os.environ.get("MODELACION_SESIONES_MB", 64)) * 1024 * 1024)
+INACTIVIDAD_MINIMA = float(os.environ.get("MODELACION_SESIONES_INACTIVIDAD", 900))
+INTERVALO_REVISION = 30
+
+
+def tamano_aproximado(objeto, _vistos=None):
+    """Bytes aproximados de un objeto y de lo que contiene (dict, list, tuple, set)"""
+    vistos = set() if _vistos is None else _vistos
+    if id(objeto) in vistos:
+        return 0
+    vistos.add(id(objeto))
+    tamano = sys.getsizeof(objeto)
+    if isinstance(objeto, dict):
+        tamano += sum(tamano_aproximado(k, vistos) + tamano_aproximado(v, vistos) for k, v in objeto.items())
+    elif isinstance(objeto, (list, tuple, set, frozenset)):
+        tamano += sum(tamano_aproximado(v, vistos) for v in objeto)
+    return tamano
+
+
+def _cerrar_sesion_streamlit(id_runtime):
+    """Pide al runtime de Streamlit que cierre la sesión (no hace nada fuera del servidor)"""
+    try:
+        from streamlit.runtime import Runtime
+        if id_runtime and Runtime.exists():
+            Runtime.instance().close_session(id_runtime)
+    except Exception:
+        pass
+
+
+class RegistroSesiones:
+    """Última actividad y tamaño del estado de cada sesión, con desalojo por presupuesto"""
+
+    def __init__(self, presupuesto_bytes=PRESUPUESTO_BYTES, inactividad_minima=INACTIVIDAD_MINIMA,
+                 al_desalojar=None):
+        self.presupuesto_bytes = presupuesto_bytes
+        self.inactividad_minima = inactividad_minima
+        self.al_desalojar = al_desalojar  # funcion(id_sesion), p. ej. para cancelar su prefetch
+        self.desalojadas = 0
+        self._sesiones = {}  # {id_sesion: [ultima actividad, bytes, id de sesión de Streamlit]}
+        self._lock = threading.Lock()
+        self._ultima_revision = 0.0
+
+    def tocar(self, id_sesion, estado, id_runtime=None):
+        """Anota actividad de la sesión y el tamaño de su estado; cada tanto revisa el presupuesto"""
+        tamano = tamano_aproximado(dict(estado))
+        ahora = time.monotonic()
+        with self._lock:
+            self._sesiones[id_sesion] = [ahora, tamano, id_runtime]
+            revisar = ahora - self._ultima_revision >= INTERVALO_REVISION
+            if revisar:
+                self._ultima_revision = ahora
+        if revisar:
+            self.desalojar()
+
+    def olvidar(self, id_sesion):
+        """Deja de contar la sesión (p. ej. cuando ya entregó sus respuestas)"""
+        with self._lock:
+            self._sesiones.pop(id_sesion, None)
+
+    def desalojar(self, ahora=None):
+        """Cierra sesiones inactivas (las más antiguas primero) hasta volver al presupuesto"""
+        ahora = time.monotonic() if ahora is None else ahora
+        with self._lock:
+            total = sum(tamano for _, tamano, _ in self._sesiones.values())
+            if total <= self.presupuesto_bytes:
+                return []
+            inactivas = sorted((actividad, id_sesion) for id_sesion, (actividad, _, _) in self._sesiones.items()
+                               if ahora - actividad >= self.inactividad_minima)
+            elegidas = []
+            for _, id_sesion in inactivas:
+                if total <= self.presupuesto_bytes:
+                    break
+                _, tamano, id_runtime = self._sesiones.pop(id_sesion)
+                total -= tamano
+                elegidas.append((id_sesion, id_runtime))
+            self.desalojadas += len(elegidas)
+
+        for id_sesion, id_runtime in elegidas:
+            if self.al_desalojar is not None:
+                self.al_desalojar(id_sesion)
+            _cerrar_sesion_streamlit(id_runtime)
+        return [id_sesion for id_sesion, _ in elegidas]
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'sesiones': len(self._sesiones),
+                'bytes': sum(tamano for _, tamano, _ in self._sesiones.values()),
+                'presupuesto_bytes': self.presupuesto_bytes,
+                'desalojadas': self.desalojadas
+            }
+
+
+registro_sesiones = RegistroSesiones(al_desalojar=prefetch_render.cancelar)
+registrar_colector("sesiones", registro_sesiones.estadisticas)
@@ -0,0 +1,46 @@
+import json
+import os
+
+from almacen_respuestas import AlmacenRespuestas, EscritorRespuestas, archivo_de_proceso
+
+
+def registro(nombre):
+    return {'Timestamp': '2026-01-01 00:00:00', 'Nombre_completo': nombre, 'V3': 5}
+
+
+def test_clave_envio_repetida_no_duplica(tmp_path):
+    almacen = AlmacenRespuestas(str(tmp_path / "r.db"), excel_previo=None)
+    primero = almacen.agregar_lote([('a', registro("Ana")), ('a', registro("Ana"))])
+    segundo = almacen.agregar_lote([('a', registro("Ana")), ('b', registro("Beto"))])
+    assert primero == {'a': 1}
+    assert segundo == {'a': 1, 'b': 2}
+    assert almacen.contar() == 2
+    assert almacen.numero_envio('a') == 1
+    assert almacen.numero_envio('c') is None
+
+
+def test_escritor_no_reencola_una_clave_guardada(tmp_path):
+    almacen = AlmacenRespuestas(str(tmp_path / "r.db"), excel_previo=None)
+    escritor = EscritorRespuestas(almacen, str(tmp_path / "pendientes.jsonl"))
+    escritor.encolar('a', registro("Ana"))
+    escritor.encolar('a', registro("Ana"))
+    assert escritor.esperar(10)
+    assert escritor.encolar('a', registro("Ana")) == {'estado': 'guardado', 'numero': 1}
+    assert almacen.contar() == 1
+    assert [f['Nombre_completo'] for f in almacen.iterar()] == ["Ana"]
+
+
+def test_recupera_pendientes_de_procesos_terminados(tmp_path):
+    base = str(tmp_path / "pendientes.jsonl")
+    almacen = AlmacenRespuestas(str(tmp_path / "r.db"), excel_previo=None)
+    almacen.agregar_lote([('ya', registro("Guardado"))])
+    # Un proceso que ya no existe dejó envíos anotados, uno de ellos ya guardado
+    with open(archivo_de_proceso(base, 2 ** 22 + 1), 'w', encoding='utf-8') as f:
+        for clave in ('ya', 'nuevo'):
+            f.write(json.dumps({'clave': clave, 'registro': registro(clave)}) + "\n")
+
+    escritor = EscritorRespuestas(almacen, base)
+    assert escritor.esperar(10)
+    assert almacen.contar() == 2
+    assert almacen.numero_envio('nuevo') == 2
+    assert not os.path.exists(archivo_de_proceso(base, 2 ** 22 + 1))
@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from analitica_votos import AgregadoVersion, AnaliticaVotos, bradley_terry
+
+# Victorias esperadas exactas para fuerzas 1, 2 y 4: el estimador de máxima
+# verosimilitud (sin previa) las recupera, normalizadas a suma 1
+PARES_CONOCIDOS = {
+    (1, 2): 100, (2, 1): 200,
+    (1, 3): 60, (3, 1): 240,
+    (2, 3): 100, (3, 2): 200,
+}
+
+
+def test_bradley_terry_recupera_fuerzas_conocidas():
+    fuerzas = bradley_terry(PARES_CONOCIDOS, [1, 2, 3], previa=0)
+    assert fuerzas[1] == pytest.approx(1 / 7, rel=1e-5)
+    assert fuerzas[2] == pytest.approx(2 / 7, rel=1e-5)
+    assert fuerzas[3] == pytest.approx(4 / 7, rel=1e-5)
+
+
+def test_previa_acerca_las_fuerzas_sin_cambiar_el_orden():
+    sin_previa = bradley_terry(PARES_CONOCIDOS, [1, 2, 3], previa=0)
+    con_previa = bradley_terry(PARES_CONOCIDOS, [1, 2, 3])
+    assert con_previa[1] < con_previa[2] < con_previa[3]
+    assert con_previa[3] / con_previa[1] < sin_previa[3] / sin_previa[1]
+
+
+def test_actualizar_fuerzas_con_enfrentamientos():
+    agregado = AgregadoVersion()
+    for mostrados, elegidos, veces in (([1, 2, 3, 4], [4], 6), ([1, 2, 3, 4], [3], 3), ([1, 2], [2], 2)):
+        for _ in range(veces):
+            agregado.registrar_enfrentamiento(mostrados, elegidos)
+    assert agregado.pares[(4, 1)] == 6
+    assert agregado.apariciones[1] == 11
+    fuerzas = agregado.actualizar_fuerzas()
+    assert sum(fuerzas.values()) == pytest.approx(1)
+    assert fuerzas[4] > fuerzas[3] > fuerzas[2] > fuerzas[1]
+    assert [f['Plano_ID'] for f in agregado.filas()] == [4, 3, 2, 1]
+
+
+def test_fuerzas_se_recalculan_solo_con_datos_nuevos():
+    agregado = AgregadoVersion()
+    agregado.registrar_enfrentamiento([1, 2], [1])
+    primeras = agregado.actualizar_fuerzas()
+    assert agregado.actualizar_fuerzas() is primeras
+    agregado.registrar_enfrentamiento([1, 2], [2])
+    assert agregado.actualizar_fuerzas() is not primeras
+
+
+def test_ida_y_vuelta_por_dict():
+    agregado = AgregadoVersion()
+    agregado.registrar_ganador(2)
+    agregado.registrar_enfrentamiento([1, 2, 3], [2])
+    agregado.actualizar_fuerzas()
+    copia = AgregadoVersion.desde_dict(agregado.a_dict())
+    assert copia.pares == agregado.pares
+    assert copia.ganadores == agregado.ganadores
+    assert copia.actualizar_fuerzas() == agregado.fuerzas
+
+
+class AlmacenFalso:
+    """Lo mínimo de AlmacenRespuestas que usa AnaliticaVotos; cuenta las consultas"""
+
+    def __init__(self):
+        self.filas = []
+        self.consultas = 0
+
+    def contar(self):
+        self.consultas += 1
+        return len(self.filas)
+
+    def iterar(self, desde_numero=0):
+        self.consultas += 1
+        return [f for f in self.filas if f['Numero'] > desde_numero]
+
+
+def test_estadisticas_leen_la_instantanea_sin_consultar_la_base(tmp_path):
+    almacen = AlmacenFalso()
+    analitica = AnaliticaVotos(almacen, str(tmp_path / "agregado.json"))
+    almacen.filas.append({'Numero': 1, 'V3': 2, 'Detalle_Torneos': json.dumps({'v3': [[[1, 2, 3], [2]]]})})
+    assert analitica.estadisticas('v3') == {}
+
+    assert analitica.actualizar(forzar=True) == 1
+    consultas = almacen.consultas
+    estadisticas = analitica.estadisticas('v3')
+    assert almacen.consultas == consultas
+    assert estadisticas['apariciones'] == {1: 1, 2: 1, 3: 1}
+    assert estadisticas['pares'] == {(2, 1): 1, (2, 3): 1}
+    assert max(estadisticas['fuerzas'], key=estadisticas['fuerzas'].get) == 2
+
+    # Un agregado nuevo parte de lo guardado
+    assert AnaliticaVotos(almacen, str(tmp_path / "agregado.json")).estadisticas('v3') == estadisticas
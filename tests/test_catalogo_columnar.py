@@ -0,0 +1,76 @@
+import json
+
+import pandas as pd
+import pytest
+
+from catalogo_columnar import CatalogoColumnar, abrir_si_vigente, compilar
+from catalogo_planos import CatalogoPlanos
+
+
+def habitacion(nombre, tipo, x0, y0, x1, y1, **extra):
+    # Vértices float, como en el Excel: el formato compilado los guarda como float64
+    x0, y0, x1, y1 = float(x0), float(y0), float(x1), float(y1)
+    return dict({'Nombre': nombre, 'Tipo_Funcional': tipo,
+                 'Vertices': [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]}, **extra)
+
+
+@pytest.fixture
+def catalogo(tmp_path):
+    filas = [
+        {'Version': 'v1', 'Plano_ID': 2, 'Num_Habitaciones': 2, 'Ancho_Casa': 6.0,
+         'Datos_Habitaciones': json.dumps([habitacion("Baño", "Baño", 0, 0, 2, 2, Ancho=2.0),
+                                           habitacion("Dor 1", "Dor", 2, 0, 6, 3)])},
+        {'Version': 'v1', 'Plano_ID': 1, 'Num_Habitaciones': 1, 'Ancho_Casa': 4.0,
+         'Datos_Habitaciones': json.dumps([habitacion("Estar", "Estar", 0, 0, 4, 5, Altura=2.4)])},
+        {'Version': 'v3', 'Plano_ID': 7, 'Num_Habitaciones': 0, 'Ancho_Casa': None,
+         'Datos_Habitaciones': "{no es json"},
+    ]
+    return CatalogoPlanos(pd.DataFrame(filas), "firma-1", str(tmp_path / "planos.xlsx"))
+
+
+def test_ida_y_vuelta(tmp_path, catalogo):
+    ruta = compilar(str(tmp_path / "planos.xlsx"), catalogo=catalogo)
+    columnar = CatalogoColumnar(ruta, str(tmp_path / "planos.xlsx"))
+
+    assert columnar.firma == "firma-1"
+    assert len(columnar) == len(catalogo) == 3
+    assert columnar.versiones == catalogo.versiones == ['v1', 'v3']
+    assert columnar.planos_ids('v1') == [1, 2]
+    for version in catalogo.versiones:
+        for plano_id in catalogo.planos_ids(version):
+            original, leido = catalogo.obtener(version, plano_id), columnar.obtener(version, plano_id)
+            for clave in ('Version', 'Plano_ID', 'Num_Habitaciones', 'Ancho_Casa', 'Habitaciones',
+                          'Area_Total', 'Areas_Por_Tipo', 'Caja', 'Centroides'):
+                # Por JSON: la caja de un plano sin habitaciones es NaN
+                assert json.dumps(leido[clave]) == json.dumps(original[clave]), (version, plano_id, clave)
+    assert columnar.obtener('v1', 2)['Area_Total'] == pytest.approx(16.0)
+    assert columnar.obtener('v3', 7)['Datos_Habitaciones'] == "{no es json"
+    assert columnar.obtener('v2', 1) is None
+
+
+def test_abrir_si_vigente_comprueba_la_firma(tmp_path, catalogo):
+    excel = str(tmp_path / "planos.xlsx")
+    assert abrir_si_vigente(excel, "firma-1") is None
+    compilar(excel, catalogo=catalogo)
+    assert abrir_si_vigente(excel, "firma-1") is not None
+    assert abrir_si_vigente(excel, "otra") is None
+
+
+def test_archivo_ajeno(tmp_path):
+    ruta = tmp_path / "planos.planos"
+    ruta.write_bytes(b"no es un catalogo")
+    with pytest.raises(ValueError):
+        CatalogoColumnar(str(ruta))
+
+
+def test_recarga_desde_el_compilado_reutiliza_los_planos_sin_cambios(tmp_path, catalogo):
+    excel = str(tmp_path / "planos.xlsx")
+    columnar = CatalogoColumnar(compilar(excel, catalogo=catalogo), excel)
+    assert columnar.hash_plano('v1', 2) == catalogo.hash_plano('v1', 2)
+
+    filas = pd.DataFrame([{k: v for k, v in p.items() if k in catalogo.columnas} for p in catalogo])
+    filas.loc[(filas['Version'] == 'v1') & (filas['Plano_ID'] == 1), 'Ancho_Casa'] = 5.0
+    nuevo = CatalogoPlanos(filas, "firma-2", excel, anterior=columnar)
+    assert nuevo.reutilizados == 2
+    assert nuevo.obtener('v1', 2) is columnar.obtener('v1', 2)
+    assert nuevo.obtener('v1', 1)['Ancho_Casa'] == 5.0
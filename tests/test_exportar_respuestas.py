@@ -0,0 +1,30 @@
+import gc
+import os
+
+from almacen_respuestas import AlmacenRespuestas
+from exportar_respuestas import ExportacionTemporal
+
+
+def almacen_con_respuestas(tmp_path):
+    almacen = AlmacenRespuestas(str(tmp_path / "r.db"), excel_previo=None)
+    almacen.agregar_lote([(str(i), {'Timestamp': '2026-01-01 00:00:00', 'Nombre_completo': f"N{i}", 'V3': i})
+                          for i in range(3)])
+    return almacen
+
+
+def test_exportacion_temporal_se_lee_al_descargar_y_se_borra(tmp_path):
+    exportacion = ExportacionTemporal('csv', almacen=almacen_con_respuestas(tmp_path))
+    assert exportacion.total == 3
+    leer = exportacion.lector()
+    assert len(leer().decode('utf-8-sig').splitlines()) == 4
+    exportacion.borrar()
+    assert not os.path.exists(exportacion.ruta)
+
+
+def test_exportacion_temporal_se_borra_al_descartarla(tmp_path):
+    exportacion = ExportacionTemporal('csv', almacen=almacen_con_respuestas(tmp_path))
+    ruta = exportacion.ruta
+    assert os.path.exists(ruta)
+    del exportacion
+    gc.collect()
+    assert not os.path.exists(ruta)
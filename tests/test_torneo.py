@@ -0,0 +1,106 @@
+import random
+
+from torneo import CONFIG_TORNEOS, Torneo, componer_grupos, nuevo_estado
+
+
+def jugar(torneo, estado, elegir=min):
+    """Elige en cada grupo con `elegir` hasta tener ganador; devuelve el ganador"""
+    while estado['ganador'] is None:
+        grupo = torneo.planos_grupo(estado)
+        restantes = [p for p in grupo if p not in torneo.elegidos_grupo(estado)]
+        torneo.seleccionar(estado, elegir(restantes))
+    return estado['ganador']
+
+
+def test_grupos_consecutivos_de_la_primera_ronda():
+    torneo = Torneo(list(range(1, 13)), CONFIG_TORNEOS['v3'])
+    estado = torneo.iniciar(nuevo_estado())
+    assert not estado['final']
+    assert torneo.numero_grupos(estado) == 3
+    assert torneo.planos_grupo(estado) == [1, 2, 3, 4]
+    assert torneo.planos_grupo(estado, grupo=2) == [9, 10, 11, 12]
+    assert torneo.planos_siguientes(estado) == [5, 6, 7, 8]
+
+
+def test_limite_de_planos():
+    torneo = Torneo(list(range(1, 49)), CONFIG_TORNEOS['v4'])
+    assert torneo.planos == list(range(1, 13))
+
+
+def test_seleccion_avanza_de_grupo_y_llega_a_la_final():
+    torneo = Torneo(list(range(1, 13)), CONFIG_TORNEOS['v3'])
+    estado = torneo.iniciar(nuevo_estado())
+    assert torneo.seleccionar(estado, 3) is False
+    assert estado['grupo'] == 1
+    torneo.seleccionar(estado, 6)
+    torneo.seleccionar(estado, 12)
+    assert estado['final']
+    assert torneo.planos_grupo(estado) == [3, 6, 12]
+    assert torneo.seleccionar(estado, 6) is True
+    assert estado['ganador'] == 6
+    assert torneo.enfrentamientos(estado) == [
+        [[1, 2, 3, 4], [3]], [[5, 6, 7, 8], [6]], [[9, 10, 11, 12], [12]], [[3, 6, 12], [6]]
+    ]
+
+
+def test_seleccion_fuera_del_grupo_se_ignora():
+    torneo = Torneo(list(range(1, 13)), CONFIG_TORNEOS['v3'])
+    estado = torneo.iniciar(nuevo_estado())
+    assert torneo.seleccionar(estado, 7) is False
+    assert estado['grupo'] == 0
+    assert torneo.elegidos_grupo(estado) == []
+
+
+def test_varias_rondas_hasta_la_final():
+    config = {'tamano_grupo': 4, 'finalistas_por_grupo': 2, 'tamano_final': 4}
+    torneo = Torneo(list(range(1, 17)), config)
+    estado = torneo.iniciar(nuevo_estado())
+    # Ronda 1: 4 grupos de 4, pasan 2 por grupo (8); ronda 2: 2 grupos, pasan 4; final
+    for _ in range(8):
+        torneo.seleccionar(estado, min(p for p in torneo.planos_grupo(estado)
+                                       if p not in torneo.elegidos_grupo(estado)))
+    assert estado['ronda'] == 1
+    assert torneo.candidatos(estado) == [1, 2, 5, 6, 9, 10, 13, 14]
+    assert jugar(torneo, estado) == 1
+    assert torneo.candidatos(estado) == [1, 2, 9, 10]
+
+
+def test_quitar_y_volver_atras():
+    torneo = Torneo(list(range(1, 13)), CONFIG_TORNEOS['v3'])
+    estado = torneo.iniciar(nuevo_estado())
+    torneo.seleccionar(estado, 1)
+    torneo.anterior(estado)
+    assert estado['grupo'] == 0
+    assert torneo.elegidos_grupo(estado) == [1]
+    torneo.quitar(estado, 1)
+    assert torneo.elegidos_grupo(estado) == []
+    assert not torneo.grupo_completo(estado)
+
+
+def test_reiniciar_descarta_las_elecciones():
+    torneo = Torneo(list(range(1, 13)), CONFIG_TORNEOS['v3'])
+    estado = torneo.iniciar(nuevo_estado())
+    jugar(torneo, estado)
+    torneo.reiniciar(estado)
+    assert estado == torneo.iniciar(nuevo_estado())
+
+
+def test_pocos_planos_van_directo_a_la_final():
+    torneo = Torneo([1, 2, 3], CONFIG_TORNEOS['v3'])
+    estado = torneo.iniciar(nuevo_estado())
+    assert estado['final']
+    assert jugar(torneo, estado, max) == 3
+
+
+def test_componer_grupos_empieza_por_los_menos_mostrados():
+    planos = list(range(1, 9))
+    estadisticas = {'apariciones': {p: 10 for p in planos if p not in (3, 7)}, 'pares': {}, 'fuerzas': {}}
+    orden = componer_grupos(planos, 8, 4, estadisticas, random.Random(0))
+    assert sorted(orden) == planos
+    assert orden[0] in (3, 7)
+
+
+def test_componer_grupos_junta_los_pares_menos_comparados():
+    # 1 y 2 ya se compararon muchas veces: el grupo de 1 se completa con 3
+    estadisticas = {'apariciones': {1: 0, 2: 5, 3: 5}, 'pares': {(1, 2): 20, (2, 1): 20}, 'fuerzas': {}}
+    assert componer_grupos([1, 2, 3], 3, 2, estadisticas, random.Random(0))[:2] == [1, 3]
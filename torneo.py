@@ -0,0 +1,300 @@
+"""
+Motor de torneos por grupos para elegir un plano ganador por versión.
+
+Los planos de una versión se reparten en grupos consecutivos; de cada grupo
+el usuario elige `finalistas_por_grupo` planos, que pasan a la ronda
+siguiente. Las rondas se repiten hasta que quedan `tamano_final` planos o
+menos (o hasta completar `rondas` rondas de grupos), y entonces se juega la
+final, donde se elige un único ganador.
+
+El estado de cada torneo es un diccionario pequeño con solo IDs de planos,
+pensado para guardarse en st.session_state:
+
+    {'ronda': 0, 'grupo': 0, 'final': False, 'ganador': None,
+     'candidatos': [[ids ronda 1], ...],    # rondas posteriores a la primera
+     'elegidos': [[[ids grupo 0], ...], ...]}  # elegidos por ronda y grupo
+
+Los candidatos de la primera ronda no se guardan: son los planos de la
+versión. Cada transición solo toca el grupo actual, salvo al cerrar una
+ronda, donde se arma una vez la lista de candidatos de la siguiente.
+
+Con 'composicion': 'adaptativa' los grupos de la primera ronda no son tramos
+fijos de los planos ordenados: al iniciar, componer_grupos los arma con las
+estadísticas de votos acumuladas (ver analitica_votos.py), favoreciendo los
+planos poco mostrados y los pares poco comparados o de resultado incierto.
+La asignación se guarda en el estado como 'orden' (los candidatos de la
+primera ronda, grupo tras grupo). La composición por defecto se elige con
+
+    MODELACION_COMPOSICION_GRUPOS=fija|adaptativa
+"""
+import os
+import random
+
+CONFIG_DEFECTO = {
+    'tamano_grupo': 4,
+    'finalistas_por_grupo': 1,
+    'tamano_final': 4,
+    'rondas': None,
+    'limite_planos': None,
+    'composicion': os.environ.get("MODELACION_COMPOSICION_GRUPOS", "fija")
+}
+
+CONFIG_TORNEOS = {
+    # 12 planos en 3 grupos de 4 y final entre los 3 ganadores
+    'v3': {'tamano_grupo': 4, 'finalistas_por_grupo': 1, 'tamano_final': 4, 'rondas': 1, 'limite_planos': 12},
+    'v4': {'tamano_grupo': 4, 'finalistas_por_grupo': 1, 'tamano_final': 4, 'rondas': 1, 'limite_planos': 12},
+    # 24 planos en 6 grupos de 4 y final entre los 6 ganadores
+    'v5': {'tamano_grupo': 4, 'finalistas_por_grupo': 1, 'tamano_final': 6, 'rondas': 1, 'limite_planos': 24},
+}
+
+
+def componer_grupos(planos, cantidad, tamano_grupo, estadisticas=None, azar=None):
+    """
+    Elige `cantidad` de `planos` y los ordena de modo que cada tramo de
+    `tamano_grupo` sea un grupo informativo.
+
+    `estadisticas` es {'apariciones': {plano: veces mostrado}, 'pares':
+    {(ganador, perdedor): veces}, 'fuerzas': {plano: fuerza de Bradley-Terry}}
+    (ver AnaliticaVotos.estadisticas); sin datos, los grupos salen al azar.
+    Los planos se sortean con probabilidad inversa a sus apariciones. Cada
+    grupo empieza por el plano menos mostrado y se completa con el que más
+    información aporta frente a los ya elegidos: p(1 - p) / (1 + comparaciones
+    del par), con p la probabilidad de victoria según las fuerzas.
+    """
+    azar = azar or random.Random()
+    estadisticas = estadisticas or {}
+    apariciones = estadisticas.get('apariciones', {})
+    pares = estadisticas.get('pares', {})
+    fuerzas = estadisticas.get('fuerzas', {})
+    fuerza_media = sum(fuerzas.values()) / len(fuerzas) if fuerzas else 1.0
+
+    # Muestreo ponderado sin reemplazo: clave u^(1/peso), con peso 1 / (1 + apariciones)
+    claves = {p: azar.random() ** (1 + apariciones.get(p, 0)) for p in planos}
+    restantes = sorted(planos, key=claves.get, reverse=True)[:cantidad]
+    restantes.sort(key=lambda p: (apariciones.get(p, 0), azar.random()))
+
+    def informacion(a, b):
+        fa, fb = fuerzas.get(a, fuerza_media), fuerzas.get(b, fuerza_media)
+        probabilidad = fa / (fa + fb)
+        comparaciones = pares.get((a, b), 0) + pares.get((b, a), 0)
+        return probabilidad * (1 - probabilidad) / (1 + comparaciones)
+
+    orden = []
+    while restantes:
+        grupo = [restantes.pop(0)]
+        while restantes and len(grupo) < tamano_grupo:
+            mejor = max(restantes, key=lambda p: (sum(informacion(p, q) for q in grupo), azar.random()))
+            restantes.remove(mejor)
+            grupo.append(mejor)
+        orden.extend(grupo)
+    return orden
+
+
+def nuevo_estado():
+    """Estado inicial de un torneo"""
+    return {'ronda': 0, 'grupo': 0, 'final': False, 'ganador': None, 'candidatos': [], 'elegidos': []}
+
+
+class Torneo:
+    """Reglas de un torneo sobre una lista de planos; el estado se guarda aparte"""
+
+    def __init__(self, planos_ids, config=None):
+        self.config = dict(CONFIG_DEFECTO, **(config or {}))
+        limite = self.config['limite_planos']
+        self.todos = list(planos_ids)
+        self.planos = self.todos if limite is None else self.todos[:limite]
+
+    # --- Consultas ---
+
+    def candidatos(self, estado, ronda=None):
+        """Planos que compiten en una ronda (por defecto, la actual)"""
+        ronda = estado['ronda'] if ronda is None else ronda
+        if ronda == 0:
+            return estado.get('orden') or self.planos
+        return estado['candidatos'][ronda - 1]
+
+    def numero_grupos(self, estado, ronda=None):
+        """Cantidad de grupos de una ronda"""
+        tamano = self.config['tamano_grupo']
+        return (len(self.candidatos(estado, ronda)) + tamano - 1) // tamano
+
+    def planos_grupo(self, estado, ronda=None, grupo=None):
+        """Planos de un grupo (por defecto, el actual); en la final, todos los finalistas"""
+        ronda = estado['ronda'] if ronda is None else ronda
+        candidatos = self.candidatos(estado, ronda)
+        if estado['final'] and ronda == estado['ronda']:
+            return candidatos
+        grupo = estado['grupo'] if grupo is None else grupo
+        tamano = self.config['tamano_grupo']
+        return candidatos[grupo * tamano:(grupo + 1) * tamano]
+
+    def requeridos(self, estado, ronda=None, grupo=None):
+        """Cantidad de planos a elegir en un grupo"""
+        return min(self.config['finalistas_por_grupo'], len(self.planos_grupo(estado, ronda, grupo)))
+
+    def elegidos_grupo(self, estado, ronda=None, grupo=None):
+        """Planos ya elegidos en un grupo (por defecto, el actual)"""
+        ronda = estado['ronda'] if ronda is None else ronda
+        grupo = estado['grupo'] if grupo is None else grupo
+        if ronda >= len(estado['elegidos']):
+            return []
+        return estado['elegidos'][ronda][grupo] or []
+
+    def grupo_completo(self, estado, ronda=None, grupo=None):
+        """Indica si ya se eligieron todos los planos requeridos del grupo"""
+        return len(self.elegidos_grupo(estado, ronda, grupo)) >= self.requeridos(estado, ronda, grupo)
+
+    def es_final(self, estado, ronda):
+        """Indica si la ronda `ronda` es la final"""
+        rondas = self.config['rondas']
+        return (len(self.candidatos(estado, ronda)) <= self.config['tamano_final']
+                or (rondas is not None and ronda >= rondas))
+
+    def planos_siguientes(self, estado):
+        """
+        Planos que se mostrarán después del grupo actual: los del grupo
+        siguiente o, si este es el último de la ronda, los ya clasificados.
+        """
+        if estado['final']:
+            return []
+        ronda = estado['ronda']
+        if estado['grupo'] + 1 < self.numero_grupos(estado):
+            return self.planos_grupo(estado, ronda, estado['grupo'] + 1)
+        return [p for grupo in estado['elegidos'][ronda] if grupo for p in grupo]
+
+    # --- Transiciones ---
+
+    def _asegurar_ronda(self, estado, ronda):
+        while len(estado['elegidos']) <= ronda:
+            estado['elegidos'].append([None] * self.numero_grupos(estado, len(estado['elegidos'])))
+
+    def _invalidar_desde(self, estado, ronda):
+        """Descarta todo lo que depende de las elecciones de `ronda`"""
+        del estado['candidatos'][ronda:]
+        del estado['elegidos'][ronda + 1:]
+        estado['ganador'] = None
+
+    def iniciar(self, estado, estadisticas=None, azar=None):
+        """
+        Coloca el torneo en la primera ronda (o directamente en la final). Con
+        composición adaptativa, arma antes los grupos con `estadisticas`
+        (ver componer_grupos) si el estado aún no tiene asignación.
+        """
+        if self.config['composicion'] == 'adaptativa' and not estado.get('orden'):
+            estado['orden'] = componer_grupos(self.todos, len(self.planos), self.config['tamano_grupo'],
+                                              estadisticas, azar)
+        estado['final'] = self.es_final(estado, 0)
+        if not estado['final']:
+            self._asegurar_ronda(estado, 0)
+        return estado
+
+    def _avanzar(self, estado):
+        ronda = estado['ronda']
+        elegidos = estado['elegidos'][ronda]
+        siguiente = estado['grupo'] + 1
+        if siguiente < len(elegidos) and not self.grupo_completo(estado, ronda, siguiente):
+            # Caso habitual: el grupo siguiente aún no tiene elecciones
+            estado['grupo'] = siguiente
+            return
+
+        pendientes = [g for g in range(len(elegidos)) if not self.grupo_completo(estado, ronda, g)]
+        if pendientes:
+            siguientes = [g for g in pendientes if g > estado['grupo']]
+            estado['grupo'] = (siguientes or pendientes)[0]
+            return
+
+        # Ronda terminada: sus elegidos son los candidatos de la siguiente
+        del estado['candidatos'][ronda:]
+        estado['candidatos'].append([p for grupo in elegidos for p in grupo])
+        estado['ronda'] = ronda + 1
+        estado['grupo'] = 0
+        estado['final'] = self.es_final(estado, ronda + 1)
+        if not estado['final']:
+            self._asegurar_ronda(estado, ronda + 1)
+
+    def seleccionar(self, estado, plano_id):
+        """
+        Elige un plano del grupo actual (o el ganador, en la final).
+
+        Devuelve True si con esta elección se decidió el ganador del torneo.
+        """
+        if estado['final']:
+            estado['ganador'] = plano_id
+            return True
+
+        self._asegurar_ronda(estado, estado['ronda'])
+        if (plano_id not in self.planos_grupo(estado) or plano_id in self.elegidos_grupo(estado)
+                or self.grupo_completo(estado)):
+            return False
+        grupo = estado['elegidos'][estado['ronda']]
+        grupo[estado['grupo']] = self.elegidos_grupo(estado) + [plano_id]
+        if self.grupo_completo(estado):
+            self._avanzar(estado)
+        return False
+
+    def quitar(self, estado, plano_id=None):
+        """Deshace la elección de un plano (o de todo el grupo actual)"""
+        if estado['final']:
+            estado['ganador'] = None
+            return
+        ronda, grupo = estado['ronda'], estado['grupo']
+        actuales = self.elegidos_grupo(estado)
+        restantes = [] if plano_id is None else [p for p in actuales if p != plano_id]
+        if ronda < len(estado['elegidos']):
+            estado['elegidos'][ronda][grupo] = restantes or None
+        self._invalidar_desde(estado, ronda)
+
+    def anterior(self, estado):
+        """Vuelve al grupo anterior conservando sus elecciones"""
+        estado['ganador'] = None
+        if estado['final']:
+            if estado['ronda'] == 0:
+                return
+            estado['final'] = False
+            estado['ronda'] -= 1
+            estado['grupo'] = self.numero_grupos(estado) - 1
+        elif estado['grupo'] > 0:
+            estado['grupo'] -= 1
+        elif estado['ronda'] > 0:
+            estado['ronda'] -= 1
+            estado['grupo'] = self.numero_grupos(estado) - 1
+
+    def reiniciar(self, estado):
+        """Vuelve al comienzo del torneo descartando todas las elecciones (no la asignación de grupos)"""
+        orden = estado.get('orden')
+        estado.clear()
+        estado.update(nuevo_estado())
+        if orden:
+            estado['orden'] = orden
+        return self.iniciar(estado)
+
+    def ganadores_por_grupo(self, estado):
+        """Elecciones hechas, como {(ronda, grupo): [ids]}"""
+        return {
+            (ronda, grupo): elegidos
+            for ronda, grupos in enumerate(estado['elegidos'])
+            for grupo, elegidos in enumerate(grupos) if elegidos
+        }
+
+    def enfrentamientos(self, estado):
+        """
+        Elecciones hechas como [[planos mostrados], [planos elegidos]]: una por
+        grupo con elecciones y, si ya hay ganador, la final.
+        """
+        resultado = [
+            [list(self.planos_grupo(estado, ronda, grupo)), list(elegidos)]
+            for (ronda, grupo), elegidos in sorted(self.ganadores_por_grupo(estado).items())
+        ]
+        if estado['ganador'] is not None:
+            resultado.append([list(self.candidatos(estado)), [estado['ganador']]])
+        return resultado
+
+    def asignacion(self, estado):
+        """Grupos de la primera ronda que recibió el encuestado, con la composición usada"""
+        candidatos = list(self.candidatos(estado, 0))
+        tamano = self.config['tamano_grupo']
+        if self.es_final(estado, 0):
+            grupos = [candidatos]
+        else:
+            grupos = [candidatos[i:i + tamano] for i in range(0, len(candidatos), tamano)]
+        return {'composicion': 'adaptativa' if estado.get('orden') else 'fija', 'grupos': grupos}